@@ -1,6 +1,13 @@
-from .app import app
 from .config import settings  # import کامل با مشخص کردن آبجکت مورد نظر
-from .database import Base, engine, SessionLocal
+from .database import Base, get_engine, SessionLocal
 from .models import *
 from .schemas import *
 from .utils import *
+
+def __getattr__(name):
+    # برنامه FastAPI فقط در صورت نیاز ایمپورت می‌شود تا ایمپورت backend.models
+    # و ابزارهای خط فرمان کل برنامه و routerها را بارگذاری نکند
+    if name == "app":
+        from .app import app
+        return app
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
@@ -3,9 +3,10 @@ from fastapi.security import OAuth2PasswordBearer, OAuth2PasswordRequestForm
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.staticfiles import StaticFiles
 from fastapi.templating import Jinja2Templates
-from fastapi.responses import HTMLResponse, RedirectResponse, JSONResponse
+from fastapi.responses import HTMLResponse, RedirectResponse, JSONResponse, StreamingResponse
 from sqlalchemy.orm import Session
-from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy import text, select, func
 from datetime import datetime, timedelta
 from pathlib import Path
 import logging
@@ -14,35 +15,55 @@ import psutil
 import asyncio
 import subprocess
 import json
-from typing import Dict, Any, List
+from typing import Dict, Any, List, Callable, Iterator
 from pydantic import BaseModel
 
 PROJECT_ROOT = Path(__file__).resolve().parent.parent
 sys.path.insert(0, str(PROJECT_ROOT))
 from backend import schemas, models, utils
-from backend.database import get_db, engine, Base
+from backend.database import (
+    get_db, get_async_db, get_async_read_db, get_engine, check_connection,
+    open_read_session, AsyncSessionLocal, init_engines
+)
 from backend.config import settings
+from backend.migrations import check_schema_version, SchemaVersionError
 from backend.xray_config.xray_manager import XrayManager
-from backend.xray_config import get_xray_manager
+from backend.xray_config import xray_manager_scope
 from backend.users.user_manager import UserManager
+from backend.users.user_listing import PageStream, build_user_page_query, DEFAULT_PAGE_SIZE
+from backend.users.user_page import get_user_page
 from backend.domains.domain_manager import DomainManager
 from backend.dashboard.dashboard_manager import DashboardManager
+from backend.dashboard.dashboard_manager import router as dashboard_router
+from backend.dashboard.metrics_history import router as metrics_history_router, periodic_metrics_sampling
 from backend.routers import user_routes
 from backend.routers.domain_router import router as domain_router
+from backend.routers.metrics import router as metrics_router
+from backend.routers.subscription import router as subscription_router
+from backend.routers.qr import router as qr_router
+from backend.qr_cache import periodic_qr_cache_prune
+from backend.routers.nodes import router as nodes_router
+from backend.hashing import password_hasher, PasswordHasherBusy
+from backend.rate_limit import client_ip, login_limiter
+from backend.db_pool import periodic_leak_scan
+from backend.partitions import periodic_partition_maintenance
+from backend.nodes.distributor import distribute_config
+from backend.nodes.health import active_node_count, periodic_node_health
+
+LOG_DIR = Path('/opt/zhina/logs')
+
+def setup_logging() -> None:
+    """ایجاد دایرکتوری لاگ و تنظیم logging (در startup، نه هنگام ایمپورت)"""
+    LOG_DIR.mkdir(parents=True, exist_ok=True)
+    logging.basicConfig(
+        level=logging.INFO,
+        format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
+        handlers=[
+            logging.FileHandler(LOG_DIR / 'panel.log'),
+            logging.StreamHandler()
+        ]
+    )
 
-xray_manager = get_xray_manager()
-
-# ایجاد دایرکتوری لاگ اگر وجود نداشته باشد
-log_dir = Path('/opt/zhina/logs')
-log_dir.mkdir(parents=True, exist_ok=True)
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
-    handlers=[
-        logging.FileHandler('/opt/zhina/logs/panel.log'),
-        logging.StreamHandler()
-    ]
-)
 logger = logging.getLogger(__name__)
 
 app = FastAPI(
@@ -57,10 +78,22 @@ app.include_router(user_routes.router)
 
 app.include_router(domain_router)
 
+app.include_router(dashboard_router)
+
+app.include_router(metrics_history_router)
+
+app.include_router(metrics_router)
+
+app.include_router(subscription_router)
+
+app.include_router(qr_router)
+
+app.include_router(nodes_router)
+
 TEMPLATE_DIR = "/opt/zhina/frontend/templates"
 STATIC_DIR = "/opt/zhina/frontend/static"
 templates = Jinja2Templates(directory=TEMPLATE_DIR)
-app.mount("/static", StaticFiles(directory=STATIC_DIR), name="static")
+app.mount("/static", StaticFiles(directory=STATIC_DIR, check_dir=False), name="static")
 
 app.add_middleware(
     CORSMiddleware,
@@ -85,64 +118,84 @@ class XrayConfigResponse(BaseModel):
 @app.on_event("startup")
 async def startup():
     """اجرای عملیات‌های اولیه هنگام راه‌اندازی برنامه"""
-    Base.metadata.create_all(bind=engine)
+    setup_logging()
+    if not await asyncio.to_thread(check_connection):
+        raise RuntimeError("Database connection failed")
+    # موتورهای async و رپلیکا هم اینجا ساخته می‌شوند تا SHOW max_connections در event loop اجرا نشود
+    await asyncio.to_thread(init_engines)
+    # schema توسط `python -m backend.migrations upgrade` ساخته می‌شود؛ اینجا فقط نسخه بررسی می‌شود
     try:
-        with next(get_db()) as db:
-            XrayManager(db).update_xray_config()
-            logger.info("Xray configuration initialized")
+        await asyncio.to_thread(check_schema_version, get_engine())
+    except SchemaVersionError as e:
+        logger.critical(str(e))
+        raise
+    try:
+        await asyncio.to_thread(sync_xray_config)
+        logger.info("Xray configuration initialized")
     except Exception as e:
         logger.error(f"Xray init error: {str(e)}")
     
     # شروع وظایف دوره‌ای
     asyncio.create_task(periodic_xray_sync())
+    asyncio.create_task(periodic_metrics_sampling())
+    asyncio.create_task(periodic_leak_scan())
+    asyncio.create_task(periodic_partition_maintenance())
+    asyncio.create_task(periodic_node_health())
+    asyncio.create_task(periodic_qr_cache_prune())
     logger.info("Application started successfully")
 
+@app.on_event("shutdown")
+async def shutdown():
+    """آزادسازی منابع هنگام خاموش شدن برنامه"""
+    password_hasher.shutdown()
+
 @app.websocket("/ws/status")
 async def websocket_endpoint(websocket: WebSocket):
     """WebSocket برای ارسال وضعیت سرور به صورت بلادرنگ"""
     await websocket.accept()
     while True:
         try:
-            # گرفتن وضعیت Xray از سیستم
-            xray_status = subprocess.run(
-                ["systemctl", "is-active", "xray"],
-                capture_output=True,
-                text=True,
-                check=True
-            )
-            # بررسی وضعیت پایگاه داده
-            with next(get_db()) as db:
-                db_status = "online" if validate_db_connection(db) else "offline"
-            
+            # گرفتن وضعیت Xray از سیستم (خارج از event loop)
+            try:
+                xray_status = (await asyncio.to_thread(
+                    subprocess.run,
+                    ["systemctl", "is-active", "xray"],
+                    capture_output=True,
+                    text=True,
+                    check=True
+                )).stdout.strip()
+            except subprocess.CalledProcessError as e:
+                logger.error(f"Systemctl command failed: {e}")
+                xray_status = "inactive"
+
+            # وضعیت پایگاه داده و کاربران آنلاین با یک session
+            async with AsyncSessionLocal() as db:
+                db_status = "online" if await validate_db_connection_async(db) else "offline"
+                users_online = await get_online_users_count_async(db)
+
             # ارسال وضعیت به کلاینت
             await websocket.send_json({
-                "xray": xray_status.stdout.strip(),
+                "xray": xray_status,
                 "database": db_status,
                 "timestamp": datetime.now().isoformat(),
-                "users_online": get_online_users_count()
+                "users_online": users_online
             })
             # تاخیر برای ارسال بعدی
             await asyncio.sleep(5)
-        except subprocess.CalledProcessError as e:
-            logger.error(f"Systemctl command failed: {e}")
-            xray_status = "inactive"
-            await websocket.send_json({
-                "xray": xray_status,
-                "database": db_status,
-                "timestamp": datetime.now().isoformat(),
-                "users_online": get_online_users_count()
-            })
         except Exception as e:
             logger.error(f"WebSocket error: {str(e)}")
             break
 
-def authenticate_user(username: str, password: str, db: Session):
-    """اعتبارسنجی کاربر"""
+async def authenticate_user(username: str, password: str, db: AsyncSession):
+    """اعتبارسنجی کاربر (bcrypt در process pool اجرا می‌شود تا event loop مسدود نشود)"""
     try:
-        user = db.query(models.User).filter(models.User.username == username).first()
-        if not user or not utils.verify_password(password, user.hashed_password):
+        result = await db.execute(select(models.User).where(models.User.username == username))
+        user = result.scalars().first()
+        if not user or not await password_hasher.verify(password, user.hashed_password):
             return False
         return user
+    except PasswordHasherBusy:
+        raise
     except Exception as e:
         logger.error(f"Database query error in authenticate_user: {str(e)}")
         raise HTTPException(status_code=500, detail="Internal server error")
@@ -157,6 +210,15 @@ def validate_db_connection(db: Session):
         logger.error(f"Database connection error: {str(e)}")
         return False
 
+async def validate_db_connection_async(db: AsyncSession) -> bool:
+    """بررسی اتصال به پایگاه داده (async)"""
+    try:
+        await db.execute(text("SELECT 1"))
+        return True
+    except Exception as e:
+        logger.error(f"Database connection error: {str(e)}")
+        return False
+
 @app.get("/login", response_class=HTMLResponse)
 async def show_login(request: Request):
     """نمایش صفحه ورود"""
@@ -167,10 +229,24 @@ async def process_login(
     request: Request,
     username: str = Form(...),
     password: str = Form(...),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """پردازش ورود کاربر"""
-    user = authenticate_user(username, password, db)
+    ip = client_ip(request)
+    if login_limiter.acquire(ip) is not None:
+        logger.warning(f"Login rate limit exceeded for {ip}")
+        return templates.TemplateResponse("login.html", {
+            "request": request,
+            "error": "Too many login attempts, please try again later"
+        }, status_code=429)
+    try:
+        user = await authenticate_user(username, password, db)
+    except PasswordHasherBusy:
+        logger.warning("Login rejected: password hashing queue is full")
+        return templates.TemplateResponse("login.html", {
+            "request": request,
+            "error": "Server is busy, please try again"
+        }, status_code=503)
     if not user:
         return templates.TemplateResponse("login.html", {
             "request": request,
@@ -182,12 +258,21 @@ async def process_login(
     return response
 
 @app.get("/dashboard", response_class=HTMLResponse)
-async def dashboard(request: Request, db: Session = Depends(get_db)):
+async def dashboard(request: Request, db: AsyncSession = Depends(get_async_read_db)):
     """صفحه داشبورد"""
+    # تعداد نودهای فعال از وضعیت بررسی سلامت؛ فقط اگر تازه نباشد از دیتابیس شمرده می‌شود
+    active_nodes = active_node_count()
+    columns = [
+        select(func.count(models.User.id)).scalar_subquery(),
+        select(func.count(models.Domain.id)).scalar_subquery()
+    ]
+    if active_nodes is None:
+        columns.append(select(func.count(models.Node.id)).where(models.Node.is_active == True).scalar_subquery())
+    counts = (await db.execute(select(*columns))).one()
     stats = {
-        "users": db.query(models.User).count(),
-        "domains": db.query(models.Domain).count(),
-        "active_nodes": db.query(models.Node).filter(models.Node.is_active == True).count(),
+        "users": counts[0],
+        "domains": counts[1],
+        "active_nodes": counts[2] if active_nodes is None else active_nodes,
         "traffic": utils.get_total_traffic()
     }
     return templates.TemplateResponse("dashboard.html", {
@@ -195,20 +280,52 @@ async def dashboard(request: Request, db: Session = Depends(get_db)):
         "stats": stats
     })
 
+# تعداد ردیف‌هایی که در هر رفت‌وبرگشت از cursor سمت سرور خوانده می‌شود
+STREAM_BATCH_SIZE = 500
+
+def stream_rows(build_query: Callable) -> Iterator:
+    """
+    خواندن ردیف‌ها با cursor سمت سرور در session اختصاصی
+
+    session تا پایان پیمایش باز می‌ماند و پس از آن (یا قطع اتصال کلاینت) بسته می‌شود؛
+    حافظه مصرفی به اندازه یک دسته است نه کل جدول. خواندن از رپلیکا انجام می‌شود
+    اگر تنظیم شده و سالم باشد.
+    """
+    db = open_read_session()
+    try:
+        stmt = build_query().execution_options(stream_results=True, yield_per=STREAM_BATCH_SIZE)
+        for row in db.execute(stmt).scalars():
+            yield row
+    finally:
+        db.close()
+
+def stream_template(name: str, context: Dict[str, Any]) -> StreamingResponse:
+    """رندر تدریجی قالب با generate() جینجا تا اولین بایت‌ها فوراً ارسال شوند"""
+    template = templates.get_template(name)
+    return StreamingResponse(template.generate(**context), media_type="text/html; charset=utf-8")
+
 @app.get("/users", response_class=HTMLResponse)
-async def users_page(request: Request, db: Session = Depends(get_db)):
-    users = db.query(models.User).all()
-    return templates.TemplateResponse("users.html", {
+async def users_page(request: Request):
+    # فقط صفحه اول (همان صفحه‌بندی keyset لیست کاربران)؛ صفحات بعد با next_cursor از API خوانده می‌شوند
+    return stream_template("users.html", {
         "request": request,
-        "users": users
+        "users": PageStream(stream_rows(lambda: build_user_page_query(DEFAULT_PAGE_SIZE)), DEFAULT_PAGE_SIZE)
+    })
+
+@app.get("/users/{user_id}/page", response_class=HTMLResponse, dependencies=[Depends(utils.get_current_user)])
+def user_page(request: Request, user_id: int, db: Session = Depends(get_db)):
+    """صفحه کاربر؛ تصاویر QR از /qr/... و در اولین درخواست هر تصویر رندر می‌شوند"""
+    return templates.TemplateResponse("user_page.html", {
+        "request": request,
+        "page": get_user_page(db, user_id)
     })
 
 @app.get("/domains", response_class=HTMLResponse)
-async def domains_page(request: Request, db: Session = Depends(get_db)):
-    domains = db.query(models.Domain).all()
-    return templates.TemplateResponse("domains.html", {
+async def domains_page(request: Request):
+    # همه دامنه‌ها؛ صفحه لینک صفحه بعد ندارد و stream_rows جدول را دسته‌دسته از cursor می‌خواند
+    return stream_template("domains.html", {
         "request": request,
-        "domains": domains
+        "domains": stream_rows(lambda: select(models.Domain).order_by(models.Domain.id))
     })
 
 @app.get("/settings", response_class=HTMLResponse)
@@ -218,13 +335,14 @@ async def settings_page(request: Request):
     })
 
 @app.get("/api/v1/server-stats", response_model=ServerStatsResponse)
-async def server_stats(db: Session = Depends(get_db)):
+async def server_stats(db: AsyncSession = Depends(get_async_read_db)):
     """دریافت آمار سرور"""
     stats = {
-        "cpu": psutil.cpu_percent(interval=1),
+        # نمونه‌برداری یک ثانیه‌ای CPU در ترد جداگانه تا event loop مسدود نشود
+        "cpu": await asyncio.to_thread(psutil.cpu_percent, 1),
         "memory": dict(psutil.virtual_memory()._asdict()),
         "disk": dict(psutil.disk_usage('/')._asdict()),
-        "users_online": get_online_users_count()
+        "users_online": await get_online_users_count_async(db)
     }
     return stats
 
@@ -263,26 +381,30 @@ async def get_xray_config(db: Session = Depends(get_db)):
         "status": "active"
     }
 
+def sync_xray_config() -> bool:
+    """به‌روزرسانی کانفیگ Xray با session کوتاه‌مدت (اجرا در ترد جداگانه)"""
+    with xray_manager_scope() as manager:
+        return manager.update_xray_config()
+
 async def periodic_xray_sync():
     """وظیفه دوره‌ای برای به‌روزرسانی تنظیمات Xray"""
     while True:
         try:
-            with next(get_db()) as db:
-                manager = XrayManager(db)
-                if asyncio.iscoroutinefunction(manager.update_xray_config):
-                    await manager.update_xray_config()
-                else:
-                    manager.update_xray_config()
-                logger.info("Periodic Xray sync completed")
+            await asyncio.to_thread(sync_xray_config)
+            # نودهای خروجی؛ نودهای به‌روز فقط یک درخواست سبک (یا diff) دریافت می‌کنند
+            await distribute_config()
+            logger.info("Periodic Xray sync completed")
         except Exception as e:
             logger.error(f"Sync failed: {str(e)}")
         await asyncio.sleep(300)
 
-def get_online_users_count() -> int:
-    """محاسبه تعداد کاربران آنلاین"""
+async def get_online_users_count_async(db: AsyncSession) -> int:
+    """محاسبه تعداد کاربران آنلاین (async)"""
     try:
-        with next(get_db()) as db:
-            return db.query(models.User).filter(models.User.is_online == True).count()
+        result = await db.execute(
+            select(func.count(models.User.id)).where(models.User.is_online == True)
+        )
+        return result.scalar_one()
     except Exception as e:
         logger.error(f"Error calculating online users: {str(e)}")
         return 0
@@ -0,0 +1 @@
+"""ابزارهای اندازه‌گیری کارایی پنل (اجرا با python -m backend.benchmarks.<name>)"""
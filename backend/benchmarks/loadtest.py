@@ -0,0 +1,408 @@
+"""
+تست بار endpointهای عمومی پنل (سابسکریپشن، ورود و داشبورد)
+
+درخواست‌ها با httpx و مجموعه‌ای از AsyncClientها ارسال می‌شوند؛ به صورت پیش‌فرض برنامه
+در همین پروسه از طریق ASGITransport اجرا می‌شود (بدون شبکه و uvicorn) و با --base-url
+می‌توان یک سرور در حال اجرا را هدف گرفت. در اجرای درون‌پردازه‌ای startup و shutdown برنامه
+(lifespan) مانند uvicorn اجرا می‌شوند؛ سناریوهای داشبورد با ورود از /login (پیش‌فرض کاربر
+تست اول) و توکن همان کوکی access_token احراز هویت می‌شوند. برای هر endpoint توان عملیاتی و صدک‌های
+p50/p95/p99 گزارش می‌شود و در صورت وجود با baseline ذخیره شده مقایسه می‌شود؛ اگر
+افت از آستانه بیشتر باشد خروجی با کد ۱ است.
+
+    python -m backend.benchmarks.loadtest --seed-users 2000
+    python -m backend.benchmarks.loadtest --duration 10 --concurrency 64 --save-baseline /tmp/baseline.json
+    python -m backend.benchmarks.loadtest --baseline /tmp/baseline.json --max-regression 20
+
+دیتابیس با --seed-users پر می‌شود (فقط SQLite یا Postgres روی localhost)؛ کاربران تست با
+پیشوند loadtest- ساخته می‌شوند و اجرای دوباره فقط کاربران کم را اضافه می‌کند.
+"""
+import argparse
+import asyncio
+import importlib
+import itertools
+import json
+import math
+import sys
+import time
+from collections import Counter
+from contextlib import AsyncExitStack
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional
+
+import httpx
+from sqlalchemy.engine import make_url
+
+PROJECT_ROOT = Path(__file__).resolve().parent.parent.parent
+
+DEFAULT_APP = "backend.app:app"
+SEED_PREFIX = "loadtest-"
+SEED_PASSWORD = "loadtest-password"
+LOCAL_HOSTS = (None, "", "localhost", "127.0.0.1", "::1")
+SEED_BATCH_SIZE = 1000
+
+@dataclass
+class Scenario:
+    """یک endpoint؛ build با شماره درخواست، آرگومان‌های client.request را برمی‌گرداند"""
+    name: str
+    build: Callable[[int], Dict]
+
+@dataclass
+class EndpointResult:
+    name: str
+    latencies: List[float] = field(default_factory=list)
+    statuses: Counter = field(default_factory=Counter)
+    errors: int = 0
+    elapsed: float = 0.0
+
+    def summary(self) -> Dict:
+        ordered = sorted(self.latencies)
+
+        def percentile(p: float) -> Optional[float]:
+            if not ordered:
+                return None
+            index = min(len(ordered) - 1, max(0, math.ceil(p / 100 * len(ordered)) - 1))
+            return round(ordered[index] * 1000, 2)
+
+        return {
+            "requests": len(ordered),
+            "errors": self.errors,
+            "statuses": {str(code): count for code, count in sorted(self.statuses.items())},
+            "rps": round(len(ordered) / self.elapsed, 1) if self.elapsed else 0.0,
+            "p50_ms": percentile(50),
+            "p95_ms": percentile(95),
+            "p99_ms": percentile(99),
+            "max_ms": round(ordered[-1] * 1000, 2) if ordered else None
+        }
+
+# -------------------- داده تست --------------------
+def _check_local_database(url: str) -> None:
+    parsed = make_url(url)
+    if parsed.get_backend_name() != "sqlite" and parsed.host not in LOCAL_HOSTS:
+        raise SystemExit(f"Refusing to seed non-local database {parsed.host!r}")
+
+def seed(users: int) -> None:
+    """ساخت کاربران، سابسکریپشن‌ها و یک اینباند تست (idempotent)"""
+    from sqlalchemy import func, insert, select
+
+    from backend.config import settings
+    from backend.database import SessionLocal, get_engine
+    from backend.hashing import _hash
+    from backend.migrations import upgrade
+    from backend.models import Inbound, Subscription, User
+
+    _check_local_database(settings.DATABASE_URL)
+    upgrade(get_engine())
+    hashed_password = _hash(SEED_PASSWORD)
+    expiry = datetime.utcnow() + timedelta(days=30)
+
+    with SessionLocal() as db:
+        if db.execute(select(func.count(Inbound.id))).scalar() == 0:
+            db.add(Inbound(
+                name=f"{SEED_PREFIX}ws",
+                tag="ws",
+                port=2083,
+                protocol="vless",
+                settings={"network": "ws", "security": "tls", "path": "/ws"}
+            ))
+        existing = db.execute(
+            select(func.count(User.id)).where(User.username.like(f"{SEED_PREFIX}%"))
+        ).scalar()
+        for start in range(existing, users, SEED_BATCH_SIZE):
+            rows = [
+                {
+                    "username": f"{SEED_PREFIX}{i}",
+                    "email": f"{SEED_PREFIX}{i}@example.com",
+                    "hashed_password": hashed_password,
+                    "uuid": f"{SEED_PREFIX}{i:08d}",
+                    "traffic_limit": 50 * 1024 ** 3,
+                    "traffic_used": i * 1024 ** 2,
+                    "is_active": True,
+                    "expiry_date": expiry
+                }
+                for i in range(start, min(start + SEED_BATCH_SIZE, users))
+            ]
+            ids = db.execute(insert(User).returning(User.id), rows).scalars().all()
+            db.execute(insert(Subscription), [
+                {"uuid": f"{SEED_PREFIX}s{user_id:08d}", "user_id": user_id, "expiry_date": expiry}
+                for user_id in ids
+            ])
+        db.commit()
+    print(f"Seeded {max(users - existing, 0)} users ({users} total)")
+
+def seeded_uuids(limit: int) -> List[str]:
+    from sqlalchemy import select
+
+    from backend.database import SessionLocal
+    from backend.models import User
+
+    with SessionLocal() as db:
+        return db.execute(
+            select(User.uuid).where(User.username.like(f"{SEED_PREFIX}%")).order_by(User.id).limit(limit)
+        ).scalars().all()
+
+# -------------------- سناریوها --------------------
+def _client_ip(i: int) -> Dict[str, str]:
+    # nginx محلی IP واقعی را در X-Real-IP می‌فرستد؛ کلاینت‌های مجازی IPهای متفاوت دارند
+    return {"X-Real-IP": f"10.{(i >> 16) & 255}.{(i >> 8) & 255}.{i & 255}"}
+
+def build_scenarios(uuids: List[str], etags: Dict[str, str], auth: Optional[Dict[str, str]] = None) -> Dict[str, Scenario]:
+    """auth: هدر احراز هویت برای سناریوهای داشبورد"""
+    def sub(i: int) -> Dict:
+        return {"method": "GET", "url": f"/sub/{uuids[i % len(uuids)]}", "headers": _client_ip(i)}
+
+    def sub_format(fmt: str) -> Callable[[int], Dict]:
+        def build(i: int) -> Dict:
+            return {**sub(i), "params": {"format": fmt}}
+        return build
+
+    primed = list(etags) or uuids
+
+    def sub_304(i: int) -> Dict:
+        uuid = primed[i % len(primed)]
+        return {
+            "method": "GET",
+            "url": f"/sub/{uuid}",
+            "headers": {**_client_ip(i), "If-None-Match": etags.get(uuid, '"none"')}
+        }
+
+    def sub_head(i: int) -> Dict:
+        return {**sub(i), "method": "HEAD"}
+
+    def login(i: int) -> Dict:
+        return {
+            "method": "POST",
+            "url": "/login",
+            "headers": _client_ip(i),
+            "data": {"username": f"{SEED_PREFIX}{i % len(uuids)}", "password": SEED_PASSWORD}
+        }
+
+    def dashboard_users(i: int) -> Dict:
+        return {
+            "method": "GET",
+            "url": "/api/dashboard/users",
+            "params": {"limit": 50},
+            "headers": {**_client_ip(i), **(auth or {})}
+        }
+
+    def dashboard_report(i: int) -> Dict:
+        return {"method": "GET", "url": "/api/dashboard/full-report", "headers": {**_client_ip(i), **(auth or {})}}
+
+    scenarios = [
+        Scenario("subscription", sub),
+        Scenario("subscription_304", sub_304),
+        Scenario("subscription_head", sub_head),
+        Scenario("subscription_clash", sub_format("clash")),
+        Scenario("subscription_singbox", sub_format("singbox")),
+        Scenario("login", login),
+        Scenario("dashboard_users", dashboard_users),
+        Scenario("dashboard_report", dashboard_report),
+    ]
+    return {scenario.name: scenario for scenario in scenarios}
+
+# -------------------- اجرا --------------------
+def load_app(app_path: str) -> Any:
+    module_name, _, attribute = app_path.partition(":")
+    return getattr(importlib.import_module(module_name), attribute or "app")
+
+def make_clients(count: int, concurrency: int, base_url: Optional[str], app: Any = None) -> List[httpx.AsyncClient]:
+    per_client = max(1, math.ceil(concurrency / count))
+    limits = httpx.Limits(max_connections=per_client, max_keepalive_connections=per_client)
+    if base_url:
+        return [httpx.AsyncClient(base_url=base_url, limits=limits, timeout=30.0) for _ in range(count)]
+    # ASGITransport اتصال را از 127.0.0.1 نشان می‌دهد، پس X-Real-IP مانند پشت nginx پذیرفته می‌شود
+    transport = httpx.ASGITransport(app=app, client=("127.0.0.1", 50000))
+    return [
+        httpx.AsyncClient(transport=transport, base_url="http://loadtest", limits=limits, timeout=30.0)
+        for _ in range(count)
+    ]
+
+async def run_scenario(
+    scenario: Scenario,
+    clients: List[httpx.AsyncClient],
+    concurrency: int,
+    duration: float,
+    max_requests: Optional[int]
+) -> EndpointResult:
+    result = EndpointResult(scenario.name)
+    counter = itertools.count()
+    deadline = time.perf_counter() + duration
+
+    async def worker(worker_id: int) -> None:
+        client = clients[worker_id % len(clients)]
+        while time.perf_counter() < deadline:
+            i = next(counter)
+            if max_requests is not None and i >= max_requests:
+                return
+            started = time.perf_counter()
+            try:
+                response = await client.request(**scenario.build(i))
+            except httpx.HTTPError:
+                result.errors += 1
+                continue
+            result.latencies.append(time.perf_counter() - started)
+            result.statuses[response.status_code] += 1
+            if response.status_code >= 500:
+                result.errors += 1
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker(n) for n in range(concurrency)))
+    result.elapsed = time.perf_counter() - started
+    return result
+
+async def _prime_etags(client: httpx.AsyncClient, uuids: List[str]) -> Dict[str, str]:
+    """ETag هر سابسکریپشن برای سناریوی 304 (و گرم کردن فایل مشترک)"""
+    etags = {}
+    for i, uuid in enumerate(uuids):
+        response = await client.get(f"/sub/{uuid}", headers=_client_ip(i))
+        if "etag" in response.headers:
+            etags[uuid] = response.headers["etag"]
+    return etags
+
+async def _login(client: httpx.AsyncClient, username: str, password: str) -> Dict[str, str]:
+    """ورود از مسیر /login پنل؛ هدر Authorization از کوکی access_token پاسخ"""
+    response = await client.post("/login", data={"username": username, "password": password}, headers=_client_ip(0))
+    # مقدار کوکی "Bearer <token>" است و به خاطر فاصله داخل کوتیشن ارسال می‌شود
+    token = (response.cookies.get("access_token") or "").strip('"')
+    if not token:
+        raise SystemExit(
+            f"Login as {username!r} failed (HTTP {response.status_code}); "
+            "dashboard scenarios need --username/--password of a panel user"
+        )
+    return {"Authorization": token}
+
+def _relax_rate_limits() -> None:
+    """بدون این کار محدودیت نرخ به جای کارایی اندازه‌گیری می‌شود (فقط در اجرای درون‌پردازه‌ای)"""
+    from backend.rate_limit import ip_limiter, login_limiter, subscription_limiter
+
+    for limiter in (ip_limiter, login_limiter, subscription_limiter):
+        limiter.rate = 1e9
+        limiter.burst = 10 ** 9
+
+async def run(args) -> Dict:
+    if not args.base_url and not args.keep_rate_limits:
+        _relax_rate_limits()
+    uuids = seeded_uuids(args.users)
+    if not uuids:
+        raise SystemExit("No seeded users found; run with --seed-users first")
+
+    available = list(build_scenarios(uuids, {}))
+    selected = args.endpoints or available
+    unknown = [name for name in selected if name not in available]
+    if unknown:
+        raise SystemExit(f"Unknown endpoints: {', '.join(unknown)} (available: {', '.join(available)})")
+
+    app = None if args.base_url else load_app(args.app)
+    async with AsyncExitStack() as stack:
+        if app is not None:
+            # ASGITransport رویدادهای lifespan را نمی‌فرستد؛ startup (موتورها، کش‌ها و وظایف دوره‌ای)
+            # و shutdown برنامه مانند uvicorn اینجا اجرا می‌شوند
+            await stack.enter_async_context(app.router.lifespan_context(app))
+        clients = make_clients(args.clients, args.concurrency, args.base_url, app)
+        for client in clients:
+            await stack.enter_async_context(client)
+
+        etags = await _prime_etags(clients[0], uuids[:args.prime])
+        auth = None
+        if any(name.startswith("dashboard") for name in selected):
+            auth = await _login(clients[0], args.username or f"{SEED_PREFIX}0", args.password)
+        scenarios = build_scenarios(uuids, etags, auth)
+
+        results = {}
+        for name in selected:
+            result = await run_scenario(scenarios[name], clients, args.concurrency, args.duration, args.requests)
+            results[name] = result.summary()
+
+    return {
+        "target": args.base_url or args.app,
+        "concurrency": args.concurrency,
+        "clients": args.clients,
+        "duration_s": args.duration,
+        "users": len(uuids),
+        "timestamp": int(time.time()),
+        "endpoints": results
+    }
+
+# -------------------- مقایسه با baseline --------------------
+def compare(report: Dict, baseline: Dict, max_regression: float) -> List[str]:
+    """
+    مقایسه توان عملیاتی و p95 هر endpoint با baseline
+
+    Returns:
+        لیست پسرفت‌هایی که از max_regression (درصد) بیشتر هستند
+    """
+    regressions = []
+    for name, current in report["endpoints"].items():
+        previous = baseline.get("endpoints", {}).get(name)
+        if not previous:
+            continue
+        if previous["rps"] and current["rps"] < previous["rps"] * (1 - max_regression / 100):
+            regressions.append(f"{name}: throughput {previous['rps']} -> {current['rps']} req/s")
+        if previous["p95_ms"] and current["p95_ms"] and current["p95_ms"] > previous["p95_ms"] * (1 + max_regression / 100):
+            regressions.append(f"{name}: p95 {previous['p95_ms']} -> {current['p95_ms']} ms")
+    return regressions
+
+def _change(current: Optional[float], previous: Optional[float]) -> str:
+    if not current or not previous:
+        return ""
+    return f" ({(current - previous) / previous * 100:+.0f}%)"
+
+def print_report(report: Dict, baseline: Optional[Dict]) -> None:
+    print(f"{report['target']}: {report['users']} users, concurrency {report['concurrency']}, "
+          f"{report['clients']} clients, {report['duration_s']} s per endpoint")
+    previous_endpoints = (baseline or {}).get("endpoints", {})
+    for name, result in report["endpoints"].items():
+        previous = previous_endpoints.get(name, {})
+        statuses = ", ".join(f"{code}x{count}" for code, count in result["statuses"].items())
+        print(f"  {name:<22} {result['rps']:>9.1f} req/s{_change(result['rps'], previous.get('rps'))}  "
+              f"p50 {result['p50_ms']} ms  p95 {result['p95_ms']} ms{_change(result['p95_ms'], previous.get('p95_ms'))}  "
+              f"p99 {result['p99_ms']} ms  [{statuses}]"
+              + (f"  errors {result['errors']}" if result["errors"] else ""))
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Load test the panel's subscription, login and dashboard endpoints")
+    parser.add_argument("--app", default=DEFAULT_APP, help="ASGI app to run in-process (module:attribute)")
+    parser.add_argument("--base-url", help="test a running server instead of the in-process app")
+    parser.add_argument("--seed-users", type=int, help="seed the local database with this many users and exit")
+    parser.add_argument("--users", type=int, default=1000, help="number of seeded users to spread requests over")
+    parser.add_argument("--prime", type=int, default=200, help="subscriptions fetched up front for the 304 scenario")
+    parser.add_argument("--endpoints", nargs="+", help="scenarios to run (default: all)")
+    parser.add_argument("--concurrency", type=int, default=32, help="concurrent requests")
+    parser.add_argument("--clients", type=int, default=4, help="AsyncClients in the pool")
+    parser.add_argument("--duration", type=float, default=5.0, help="seconds per endpoint")
+    parser.add_argument("--requests", type=int, help="stop each endpoint after this many requests")
+    parser.add_argument("--username", help="panel user for the dashboard scenarios (default: the first seeded user)")
+    parser.add_argument("--password", default=SEED_PASSWORD, help="password of --username")
+    parser.add_argument("--keep-rate-limits", action="store_true",
+                        help="keep the rate limiters active when running in-process")
+    parser.add_argument("--baseline", type=Path, help="compare against a saved report")
+    parser.add_argument("--save-baseline", type=Path, help="write the report to this file")
+    parser.add_argument("--max-regression", type=float, default=20.0,
+                        help="fail if throughput drops or p95 grows by more than this percentage")
+    parser.add_argument("--json", action="store_true", help="print the report as JSON")
+    args = parser.parse_args(argv)
+
+    sys.path.insert(0, str(PROJECT_ROOT))
+    if args.seed_users is not None:
+        seed(args.seed_users)
+        return 0
+
+    report = asyncio.run(run(args))
+    baseline = json.loads(args.baseline.read_text()) if args.baseline and args.baseline.exists() else None
+    regressions = compare(report, baseline, args.max_regression) if baseline else []
+    report["regressions"] = regressions
+
+    if args.json:
+        print(json.dumps(report, indent=2))
+    else:
+        print_report(report, baseline)
+        for regression in regressions:
+            print(f"Regression: {regression}")
+    if args.save_baseline:
+        args.save_baseline.write_text(json.dumps(report, indent=2))
+
+    return 1 if regressions else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,12 +1,15 @@
-from fastapi import APIRouter
+from fastapi import APIRouter, Depends
+from backend.utils import get_current_user
 from .dashboard_manager import router as manager_router
 from .server_stats import router as server_stats_router
 from .traffic_stats import router as traffic_stats_router
 from .user_stats import router as user_stats_router
+from .metrics_history import router as metrics_history_router
 
 router = APIRouter(
     prefix="/dashboard",
     tags=["Dashboard Analytics"],
+    dependencies=[Depends(get_current_user)],
     responses={
         404: {"description": "Resource not found"},
         500: {"description": "Internal server error"}
@@ -18,11 +21,13 @@ router.include_router(manager_router)
 router.include_router(server_stats_router)
 router.include_router(traffic_stats_router)
 router.include_router(user_stats_router)
+router.include_router(metrics_history_router)
 
 __all__ = [
     "router",
     "manager_router",
     "server_stats_router",
     "traffic_stats_router",
-    "user_stats_router"
+    "user_stats_router",
+    "metrics_history_router"
 ]
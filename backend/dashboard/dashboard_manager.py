@@ -1,14 +1,32 @@
-from fastapi import APIRouter, Depends
+from fastapi import APIRouter, Depends, HTTPException, Query
 from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
 import psutil
-from typing import Dict, List
+import asyncio
+import logging
+import time
+from typing import Awaitable, Callable, Dict, List, Optional
 from datetime import datetime
-from backend.database import get_db
+from backend.database import get_db, get_read_db, get_async_read_db, open_read_session
 from backend.models import User
-from backend.utils import calculate_remaining_days
+from backend.utils import calculate_remaining_days, get_current_user
+from backend.users.user_listing import (
+    paginate_users,
+    paginate_users_async,
+    DEFAULT_PAGE_SIZE,
+    MAX_PAGE_SIZE
+)
 from backend import schemas
 
-router = APIRouter(prefix="/api/dashboard", tags=["Dashboard"])
+# لیست کاربران شامل UUID (تنها اعتبارنامه /sub/{uuid}) است؛ همه مسیرها فقط برای ادمین
+router = APIRouter(prefix="/api/dashboard", tags=["Dashboard"], dependencies=[Depends(get_current_user)])
+
+logger = logging.getLogger(__name__)
+
+# گزارش تا این مدت تازه حساب می‌شود و بدون محاسبه مجدد برگردانده می‌شود
+REPORT_FRESH_SECONDS = 5
+# تا این مدت نسخه قدیمی برگردانده و در پس‌زمینه به‌روزرسانی می‌شود
+REPORT_STALE_SECONDS = 60
 
 class DashboardManager:
     def __init__(self, db: Session):
@@ -100,63 +118,154 @@ class DashboardManager:
         }
 
     # --- لیست کاربران ---
-    def get_user_list(self, detailed: bool = False) -> List[Dict]:
-        """دریافت لیست کاربران"""
-        users = self.db.query(User).all()
-        
+    def get_user_list(
+        self,
+        detailed: bool = False,
+        limit: int = DEFAULT_PAGE_SIZE,
+        cursor: Optional[str] = None,
+        status: Optional[str] = None,
+        sort: str = "id",
+        order: str = "asc"
+    ) -> Dict:
+        """دریافت یک صفحه از لیست کاربران (صفحه‌بندی cursor)"""
+        users, next_cursor = paginate_users(self.db, limit, cursor, status, sort, order)
+        return self.serialize_user_list(users, next_cursor, limit, detailed)
+
+    @staticmethod
+    def serialize_user_list(users: List[User], next_cursor: Optional[str], limit: int, detailed: bool = False) -> Dict:
+        """تبدیل یک صفحه از کاربران به خروجی لیست داشبورد"""
         if not detailed:
-            return [{
+            items = [{
                 "id": u.id,
-                "name": u.name,
+                "name": u.username,
                 "status": "online" if u.is_online else "offline"
             } for u in users]
-        
-        return [{
-            "id": u.id,
-            "name": u.name,
-            "uuid": u.uuid,
-            "traffic": {
-                "limit": u.traffic_limit,
-                "used": u.traffic_used,
-                "remaining": max(0, u.traffic_limit - u.traffic_used)
-            },
-            "duration": {
-                "total": u.usage_duration,
-                "remaining": calculate_remaining_days(u.expiry_date)
-            },
-            "connections": u.simultaneous_connections,
-            "status": {
-                "active": u.is_active,
-                "online": u.is_online
-            },
-            "last_activity": u.last_activity.isoformat() if u.last_activity else None
-        } for u in users]
+        else:
+            items = [{
+                "id": u.id,
+                "name": u.username,
+                "uuid": u.uuid,
+                "traffic": {
+                    "limit": u.traffic_limit,
+                    "used": u.traffic_used,
+                    "remaining": max(0, u.traffic_limit - u.traffic_used)
+                },
+                "duration": {
+                    "total": u.usage_duration,
+                    "remaining": calculate_remaining_days(u.expiry_date)
+                },
+                "connections": u.simultaneous_connections,
+                "status": {
+                    "active": u.is_active,
+                    "online": u.is_online
+                },
+                "last_activity": u.last_activity.isoformat() if u.last_activity else None
+            } for u in users]
+
+        return {"users": items, "next_cursor": next_cursor, "limit": limit}
+
+class ReportCache:
+    """
+    کش گزارش با سیاست stale-while-revalidate
+
+    - تا REPORT_FRESH_SECONDS مقدار کش بدون محاسبه برگردانده می‌شود
+    - تا REPORT_STALE_SECONDS مقدار قدیمی برگردانده و محاسبه جدید در پس‌زمینه شروع می‌شود
+    - درخواست‌های همزمان یک محاسبه در جریان را به اشتراک می‌گذارند
+    """
+
+    def __init__(self, fresh_seconds: float = REPORT_FRESH_SECONDS, stale_seconds: float = REPORT_STALE_SECONDS):
+        self.fresh_seconds = fresh_seconds
+        self.stale_seconds = stale_seconds
+        self._value: Optional[Dict] = None
+        self._updated_at = 0.0
+        self._task: Optional[asyncio.Task] = None
+
+    async def get(self, compute: Callable[[], Awaitable[Dict]]) -> Dict:
+        age = time.monotonic() - self._updated_at
+        if self._value is not None and age < self.fresh_seconds:
+            return self._value
+        if self._value is not None and age < self.stale_seconds:
+            self._refresh(compute)
+            return self._value
+        # shield: لغو شدن یک درخواست نباید محاسبه مشترک را لغو کند
+        return await asyncio.shield(self._refresh(compute))
+
+    def _refresh(self, compute: Callable[[], Awaitable[Dict]]) -> asyncio.Task:
+        if self._task is None or self._task.done():
+            self._task = asyncio.ensure_future(self._run(compute))
+            # جلوگیری از هشدار "exception was never retrieved" در به‌روزرسانی پس‌زمینه
+            self._task.add_done_callback(lambda t: t.cancelled() or t.exception())
+        return self._task
+
+    async def _run(self, compute: Callable[[], Awaitable[Dict]]) -> Dict:
+        try:
+            value = await compute()
+        except Exception as e:
+            logger.error(f"Full report computation failed: {str(e)}")
+            raise
+        self._value = value
+        self._updated_at = time.monotonic()
+        return value
+
+def _run_section(section: str) -> Dict:
+    """اجرای یک بخش گزارش در ترد جداگانه با session اختصاصی (رپلیکا در صورت وجود)"""
+    db = open_read_session()
+    try:
+        return getattr(DashboardManager(db), section)()
+    finally:
+        db.close()
+
+async def build_full_report() -> Dict:
+    """محاسبه همزمان بخش‌های گزارش خارج از event loop"""
+    server, traffic, users = await asyncio.gather(
+        asyncio.to_thread(_run_section, "get_server_stats"),
+        asyncio.to_thread(_run_section, "get_traffic_stats"),
+        asyncio.to_thread(_run_section, "get_user_stats"),
+    )
+    return {
+        "server": server,
+        "traffic": traffic,
+        "users": users,
+        "timestamp": int(datetime.now().timestamp())
+    }
+
+report_cache = ReportCache()
 
 # Endpointهای FastAPI
+# مسیرهای همگام (def) در threadpool اجرا می‌شوند و event loop را مسدود نمی‌کنند
 @router.get("/server-stats", response_model=Dict)
-async def server_stats(db: Session = Depends(get_db)):
+def server_stats(db: Session = Depends(get_read_db)):
     """آمار لحظه‌ای سرور"""
     return DashboardManager(db).get_server_stats()
 
 @router.get("/traffic-stats", response_model=Dict)
-async def traffic_stats(db: Session = Depends(get_db)):
+def traffic_stats(db: Session = Depends(get_read_db)):
     """آمار ترافیک"""
     return DashboardManager(db).get_traffic_stats()
 
 @router.get("/user-stats", response_model=Dict)
-async def user_stats(db: Session = Depends(get_db)):
+def user_stats(db: Session = Depends(get_read_db)):
     """آمار کاربران"""
     return DashboardManager(db).get_user_stats()
 
 @router.get("/full-report", response_model=Dict)
-async def full_report(db: Session = Depends(get_db)):
-    """گزارش کامل"""
-    return DashboardManager(db).get_full_report()
+async def full_report():
+    """گزارش کامل (محاسبه موازی و کش stale-while-revalidate)"""
+    return await report_cache.get(build_full_report)
 
-@router.get("/users", response_model=List[Dict])
+@router.get("/users", response_model=Dict)
 async def user_list(
     detailed: bool = False,
-    db: Session = Depends(get_db)
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    cursor: Optional[str] = None,
+    status: Optional[str] = None,
+    sort: str = "id",
+    order: str = "asc",
+    db: AsyncSession = Depends(get_async_read_db)
 ):
-    """لیست کاربران"""
-    return DashboardManager(db).get_user_list(detailed)
+    """لیست کاربران (صفحه‌بندی cursor)"""
+    try:
+        users, next_cursor = await paginate_users_async(db, limit, cursor, status, sort, order)
+        return DashboardManager.serialize_user_list(users, next_cursor, limit, detailed)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
@@ -0,0 +1,249 @@
+import asyncio
+import fcntl
+import logging
+import mmap
+import os
+import re
+import struct
+import time
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+from fastapi import APIRouter, Depends, HTTPException, Query, status
+
+from backend.config import settings
+from backend.utils import get_current_user, repeat_every
+from .server_stats import sample_metrics
+
+logger = logging.getLogger(__name__)
+
+router = APIRouter(prefix="/api/dashboard", tags=["Dashboard"], dependencies=[Depends(get_current_user)])
+
+# ترتیب ستون‌ها در هر رکورد فایل (پس از timestamp)
+METRIC_FIELDS = ("cpu", "memory", "disk", "net_sent", "net_recv")
+# متریک‌هایی که شمارنده تجمعی هستند و به نرخ بر ثانیه تبدیل می‌شوند
+COUNTER_METRICS = {"net_sent", "net_recv"}
+
+_MAGIC = b"ZHMETR01"
+_HEADER = struct.Struct("<8sIIQ8x")  # magic, version, capacity, total_written
+_RECORD = struct.Struct("<d" + "d" * len(METRIC_FIELDS))
+_TS = struct.Struct("<d")
+_VERSION = 1
+
+_RANGE_PATTERN = re.compile(r"^(\d+)([smhdw])$")
+_RANGE_UNITS = {"s": 1, "m": 60, "h": 3600, "d": 86400, "w": 604800}
+
+class MetricsRing:
+    """
+    فایل حلقوی با اندازه ثابت برای تاریخچه متریک‌ها
+
+    - فایل memory-mapped است و پس از ری‌استارت باقی می‌ماند
+    - نوشتن با flock انجام می‌شود تا چند worker بتوانند همزمان از آن استفاده کنند
+    - نمونه‌هایی که زودتر از min_gap پس از نمونه قبلی برسند نادیده گرفته می‌شوند
+      (هر worker نمونه‌برداری می‌کند ولی فقط یکی ثبت می‌شود)
+    """
+
+    def __init__(self, path: Path, capacity: int):
+        self.path = Path(path)
+        self.capacity = capacity
+        self._fd: Optional[int] = None
+        self._mm: Optional[mmap.mmap] = None
+
+    def _open(self) -> mmap.mmap:
+        if self._mm is not None:
+            return self._mm
+
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o640)
+        fcntl.flock(fd, fcntl.LOCK_EX)
+        try:
+            size = os.fstat(fd).st_size
+            header = os.pread(fd, _HEADER.size, 0) if size >= _HEADER.size else b""
+            if header and header[:8] == _MAGIC:
+                _, version, capacity, _ = _HEADER.unpack(header)
+                if version != _VERSION or size != _HEADER.size + capacity * _RECORD.size:
+                    header = b""
+                else:
+                    if capacity != self.capacity:
+                        logger.warning(
+                            f"Metrics ring capacity {capacity} differs from configured {self.capacity}; "
+                            f"keeping existing file"
+                        )
+                    self.capacity = capacity
+            if not header or header[:8] != _MAGIC:
+                os.ftruncate(fd, 0)
+                os.ftruncate(fd, _HEADER.size + self.capacity * _RECORD.size)
+                os.pwrite(fd, _HEADER.pack(_MAGIC, _VERSION, self.capacity, 0), 0)
+        finally:
+            fcntl.flock(fd, fcntl.LOCK_UN)
+
+        self._fd = fd
+        self._mm = mmap.mmap(fd, 0)
+        return self._mm
+
+    def close(self) -> None:
+        if self._mm is not None:
+            self._mm.close()
+            self._mm = None
+        if self._fd is not None:
+            os.close(self._fd)
+            self._fd = None
+
+    def _total(self, mm: mmap.mmap) -> int:
+        return _HEADER.unpack_from(mm, 0)[3]
+
+    def _offset(self, logical_index: int) -> int:
+        return _HEADER.size + (logical_index % self.capacity) * _RECORD.size
+
+    def append(self, timestamp: float, values: Dict[str, float], min_gap: float = 0.0) -> bool:
+        """افزودن یک نمونه؛ False اگر به دلیل نزدیکی به نمونه قبلی ثبت نشد"""
+        mm = self._open()
+        fcntl.flock(self._fd, fcntl.LOCK_EX)
+        try:
+            total = self._total(mm)
+            if total and min_gap:
+                last_ts = _TS.unpack_from(mm, self._offset(total - 1))[0]
+                if timestamp - last_ts < min_gap:
+                    return False
+            _RECORD.pack_into(
+                mm,
+                self._offset(total),
+                timestamp,
+                *(float(values.get(field, 0.0)) for field in METRIC_FIELDS)
+            )
+            _HEADER.pack_into(mm, 0, _MAGIC, _VERSION, self.capacity, total + 1)
+            return True
+        finally:
+            fcntl.flock(self._fd, fcntl.LOCK_UN)
+
+    def read(self, metric: str, since: float) -> List[Tuple[float, float]]:
+        """خواندن نقاط (timestamp, value) یک متریک از زمان since به بعد به ترتیب زمانی"""
+        column = METRIC_FIELDS.index(metric) + 1
+        mm = self._open()
+        fcntl.flock(self._fd, fcntl.LOCK_SH)
+        try:
+            total = self._total(mm)
+            first = max(0, total - self.capacity)
+
+            # رکوردها به ترتیب زمانی هستند؛ جستجوی دودویی برای اولین نقطه بازه
+            lo, hi = first, total
+            while lo < hi:
+                mid = (lo + hi) // 2
+                if _TS.unpack_from(mm, self._offset(mid))[0] < since:
+                    lo = mid + 1
+                else:
+                    hi = mid
+
+            points = []
+            for index in range(lo, total):
+                record = _RECORD.unpack_from(mm, self._offset(index))
+                points.append((record[0], record[column]))
+        finally:
+            fcntl.flock(self._fd, fcntl.LOCK_UN)
+
+        if metric in COUNTER_METRICS:
+            return _counter_to_rate(points)
+        return points
+
+def _counter_to_rate(points: List[Tuple[float, float]]) -> List[Tuple[float, float]]:
+    """تبدیل شمارنده تجمعی به نرخ بر ثانیه (ریست شدن شمارنده نادیده گرفته می‌شود)"""
+    rates = []
+    for (prev_ts, prev_value), (ts, value) in zip(points, points[1:]):
+        elapsed = ts - prev_ts
+        if elapsed <= 0 or value < prev_value:
+            continue
+        rates.append((ts, (value - prev_value) / elapsed))
+    return rates
+
+def lttb(points: List[Tuple[float, float]], threshold: int) -> List[Tuple[float, float]]:
+    """
+    کاهش نقاط با الگوریتم Largest-Triangle-Three-Buckets
+
+    اولین و آخرین نقطه حفظ می‌شوند و از هر سطل نقطه‌ای انتخاب می‌شود که
+    بزرگ‌ترین مثلث را با نقطه انتخابی قبلی و میانگین سطل بعدی بسازد.
+    """
+    length = len(points)
+    if threshold >= length or threshold < 3:
+        return list(points)
+
+    sampled = [points[0]]
+    bucket_size = (length - 2) / (threshold - 2)
+    a = 0
+
+    for i in range(threshold - 2):
+        # میانگین سطل بعدی
+        next_start = int((i + 1) * bucket_size) + 1
+        next_end = min(int((i + 2) * bucket_size) + 1, length)
+        next_bucket = points[next_start:next_end] or [points[-1]]
+        avg_x = sum(p[0] for p in next_bucket) / len(next_bucket)
+        avg_y = sum(p[1] for p in next_bucket) / len(next_bucket)
+
+        # انتخاب نقطه با بیشترین مساحت مثلث در سطل فعلی
+        start = int(i * bucket_size) + 1
+        end = int((i + 1) * bucket_size) + 1
+        ax, ay = points[a]
+        max_area = -1.0
+        chosen = start
+        for j in range(start, end):
+            px, py = points[j]
+            area = abs((ax - avg_x) * (py - ay) - (ax - px) * (avg_y - ay))
+            if area > max_area:
+                max_area = area
+                chosen = j
+
+        sampled.append(points[chosen])
+        a = chosen
+
+    sampled.append(points[-1])
+    return sampled
+
+def parse_range(value: str) -> int:
+    """تبدیل بازه‌ای مثل 30m، 24h یا 7d به ثانیه"""
+    match = _RANGE_PATTERN.match(value)
+    if not match:
+        raise ValueError(f"Invalid range: {value}")
+    return int(match.group(1)) * _RANGE_UNITS[match.group(2)]
+
+metrics_ring = MetricsRing(settings.METRICS_HISTORY_PATH, settings.METRICS_HISTORY_CAPACITY)
+
+def record_sample() -> bool:
+    """ثبت یک نمونه از متریک‌های فعلی سرور در فایل تاریخچه"""
+    return metrics_ring.append(
+        time.time(),
+        sample_metrics(),
+        min_gap=settings.METRICS_SAMPLE_INTERVAL * 0.9
+    )
+
+@repeat_every(seconds=settings.METRICS_SAMPLE_INTERVAL)
+async def periodic_metrics_sampling():
+    """وظیفه دوره‌ای نمونه‌برداری متریک‌ها"""
+    await asyncio.to_thread(record_sample)
+
+@router.get("/history", response_model=Dict)
+async def metrics_history(
+    metric: str = Query("cpu", description="یکی از: " + ", ".join(METRIC_FIELDS)),
+    range_: str = Query("24h", alias="range", description="بازه زمانی مثل 30m، 24h، 7d"),
+    points: int = Query(300, ge=3, le=5000, description="حداکثر تعداد نقاط خروجی")
+):
+    """تاریخچه یک متریک سرور با کاهش نقاط به روش LTTB"""
+    if metric not in METRIC_FIELDS:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"متریک نامعتبر. باید یکی از این موارد باشد: {', '.join(METRIC_FIELDS)}"
+        )
+    try:
+        seconds = parse_range(range_)
+    except ValueError:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="فرمت بازه نامعتبر است (مثال: 30m، 24h، 7d)"
+        )
+
+    raw = await asyncio.to_thread(metrics_ring.read, metric, time.time() - seconds)
+    sampled = lttb(raw, points)
+    return {
+        "metric": metric,
+        "range": range_,
+        "source_points": len(raw),
+        "points": [[int(ts), round(value, 3)] for ts, value in sampled]
+    }
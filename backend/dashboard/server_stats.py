@@ -32,7 +32,23 @@ def get_server_stats() -> Dict:
     }
     return stats
 
+def sample_metrics() -> Dict:
+    """
+    نمونه‌برداری سبک از متریک‌های سرور برای ذخیره در تاریخچه
+    (بدون interval تا event loop مسدود نشود؛ درصد CPU نسبت به فراخوانی قبلی محاسبه می‌شود)
+    """
+    memory_info = psutil.virtual_memory()
+    disk_usage = psutil.disk_usage("/")
+    network_io = psutil.net_io_counters()
+    return {
+        "cpu": psutil.cpu_percent(interval=None),
+        "memory": memory_info.percent,
+        "disk": disk_usage.percent,
+        "net_sent": float(network_io.bytes_sent),
+        "net_recv": float(network_io.bytes_recv)
+    }
+
 # اضافه کردن route برای دریافت آمار سرور
 @router.get("/stats", response_model=Dict)
-async def fetch_server_stats():
+def fetch_server_stats():
     return get_server_stats()
@@ -1,21 +1,30 @@
 from fastapi import APIRouter, Depends
 from typing import Dict
-from backend.database import get_db
+from backend.database import get_db, get_async_read_db
 from backend.models import User
+from sqlalchemy import select, func
 from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
 
 router = APIRouter()
 
 @router.get("/traffic")
-async def traffic_stats_endpoint(db: Session = Depends(get_db)):
-    """Endpoint برای دریافت آمار ترافیک"""
-    return get_traffic_stats(db)
+async def traffic_stats_endpoint(db: AsyncSession = Depends(get_async_read_db)):
+    """Endpoint برای دریافت آمار ترافیک (جمع در دیتابیس)"""
+    total_traffic_limit, total_traffic_used = (await db.execute(select(
+        func.coalesce(func.sum(User.traffic_limit), 0),
+        func.coalesce(func.sum(User.traffic_used), 0)
+    ))).one()
+    return _build_traffic_stats(int(total_traffic_limit), int(total_traffic_used))
 
 def get_traffic_stats(db: Session) -> Dict:
     """ دریافت آمار ترافیک مصرفی """
     users = db.query(User).all()
     total_traffic_limit = sum(user.traffic_limit for user in users)
     total_traffic_used = sum(user.traffic_used for user in users)
+    return _build_traffic_stats(total_traffic_limit, total_traffic_used)
+
+def _build_traffic_stats(total_traffic_limit: int, total_traffic_used: int) -> Dict:
     total_traffic_remaining = total_traffic_limit - total_traffic_used
 
     stats = {
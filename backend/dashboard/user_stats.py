@@ -1,10 +1,13 @@
-from fastapi import APIRouter, Depends
-from typing import Dict, List
+from fastapi import APIRouter, Depends, HTTPException, Query
+from typing import Dict, List, Optional
 from datetime import datetime
-from backend.database import get_db
+from backend.database import get_db, get_async_read_db
 from backend.models import User
+from sqlalchemy import select, func, and_
 from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
 from pydantic import BaseModel
+from backend.users.user_listing import paginate_users_async, DEFAULT_PAGE_SIZE, MAX_PAGE_SIZE
 
 router = APIRouter()
 
@@ -27,6 +30,11 @@ class UserListItem(BaseModel):
     is_active: bool
     is_online: bool
 
+class UserListPage(BaseModel):
+    users: List[UserListItem]
+    next_cursor: Optional[str] = None
+    limit: int
+
 def calculate_remaining_days(expiry_date: datetime) -> int:
     """محاسبه روزهای باقیمانده تا انقضا"""
     if not expiry_date:
@@ -35,34 +43,52 @@ def calculate_remaining_days(expiry_date: datetime) -> int:
     return remaining.days if remaining.days > 0 else 0
 
 @router.get("/stats", response_model=UserStatsResponse)
-async def user_stats_endpoint(db: Session = Depends(get_db)):
-    """Endpoint برای دریافت آمار کاربران"""
-    users = db.query(User).all()
-    stats = {
-        "total_users": len(users),
-        "online_users": len([user for user in users if user.is_online]),
-        "offline_users": len([user for user in users if not user.is_online and user.is_active]),
-        "inactive_users": len([user for user in users if not user.is_active])
-    }
-    return UserStatsResponse(**stats)
+async def user_stats_endpoint(db: AsyncSession = Depends(get_async_read_db)):
+    """Endpoint برای دریافت آمار کاربران (شمارش در دیتابیس)"""
+    total, online, offline, inactive = (await db.execute(select(
+        func.count(User.id),
+        func.count(User.id).filter(User.is_online == True),
+        func.count(User.id).filter(and_(User.is_online != True, User.is_active == True)),
+        func.count(User.id).filter(User.is_active != True)
+    ))).one()
+    return UserStatsResponse(
+        total_users=total,
+        online_users=online,
+        offline_users=offline,
+        inactive_users=inactive
+    )
 
-@router.get("/list", response_model=List[UserListItem])
-async def user_list_endpoint(db: Session = Depends(get_db)):
-    """Endpoint برای دریافت لیست کاربران"""
-    users = db.query(User).all()
+@router.get("/list", response_model=UserListPage)
+async def user_list_endpoint(
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    cursor: Optional[str] = None,
+    status: Optional[str] = None,
+    sort: str = "id",
+    order: str = "asc",
+    db: AsyncSession = Depends(get_async_read_db)
+):
+    """Endpoint برای دریافت لیست کاربران (صفحه‌بندی cursor)"""
+    try:
+        users, next_cursor = await paginate_users_async(db, limit, cursor, status, sort, order)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     user_list = [
         {
             "id": user.id,
-            "name": user.name,
+            "name": user.username,
             "uuid": user.uuid,
-            "traffic_limit": user.traffic_limit,
-            "traffic_used": user.traffic_used,
+            "traffic_limit": user.traffic_limit or 0,
+            "traffic_used": user.traffic_used or 0,
             "usage_duration": user.usage_duration,
             "remaining_days": calculate_remaining_days(user.expiry_date),
             "simultaneous_connections": user.simultaneous_connections,
             "is_active": user.is_active,
-            "is_online": user.is_online
+            "is_online": user.is_online or False
         }
         for user in users
     ]
-    return [UserListItem(**user) for user in user_list]
+    return UserListPage(
+        users=[UserListItem(**user) for user in user_list],
+        next_cursor=next_cursor,
+        limit=limit
+    )
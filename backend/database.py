@@ -1,39 +1,299 @@
 # فایل: backend/database.py
 import logging
-from sqlalchemy import create_engine
+import threading
+import time
+from typing import Any, Callable, Dict, Optional
+from sqlalchemy import create_engine, text
 from sqlalchemy.orm import sessionmaker, declarative_base
 from sqlalchemy.exc import SQLAlchemyError
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker, AsyncSession
 from backend.config import settings
+from backend.db_pool import instrumented_pool_class, attach_leak_detector, compute_pool_size
 
 logger = logging.getLogger(__name__)
 
 # تنظیمات اتصال به دیتابیس
 SQLALCHEMY_DATABASE_URL = settings.DATABASE_URL
 
-# ایجاد موتور دیتابیس با تنظیمات پیشرفته
-engine = create_engine(
-    SQLALCHEMY_DATABASE_URL,
-    pool_size=20,
-    max_overflow=0,
-    pool_pre_ping=True,
-    pool_recycle=3600,
-    connect_args={
+def to_async_url(url: str) -> str:
+    """تبدیل آدرس sync به درایور async (postgresql:// → postgresql+asyncpg://)"""
+    if url.startswith("postgresql+asyncpg://"):
+        return url
+    if url.startswith("postgresql://") or url.startswith("postgresql+psycopg2://"):
+        return "postgresql+asyncpg://" + url.split("://", 1)[1]
+    if url.startswith("sqlite://"):
+        return "sqlite+aiosqlite://" + url.split("://", 1)[1]
+    return url
+
+ASYNC_DATABASE_URL = to_async_url(SQLALCHEMY_DATABASE_URL)
+
+# موتورها در اولین استفاده ساخته می‌شوند تا ایمپورت ماژول نه درایور را بارگذاری کند
+# و نه به دیتابیس زنده نیاز داشته باشد
+_engine = None
+_async_engine = None
+_replica_engine = None
+_async_replica_engine = None
+_engine_lock = threading.RLock()
+
+def _create_sync_engine(url: str, name: str):
+    # تنظیمات keepalive مخصوص psycopg2 است (دیتابیس‌های محلی تست مثل SQLite آن را نمی‌پذیرند)
+    connect_args = {
         "keepalives": 1,
         "keepalives_idle": 30,
         "keepalives_interval": 10,
         "keepalives_count": 5
-    }
-)
+    } if url.startswith("postgresql") else {}
+    engine = create_engine(
+        url,
+        poolclass=instrumented_pool_class(name, is_async=False),
+        pool_size=compute_pool_size(url),
+        max_overflow=settings.DB_MAX_OVERFLOW,
+        pool_timeout=settings.DB_POOL_TIMEOUT,
+        pool_pre_ping=True,
+        pool_recycle=3600,
+        connect_args=connect_args
+    )
+    attach_leak_detector(engine, name)
+    return engine
+
+def _create_async_engine(url: str, sync_url: str, name: str):
+    # aiosqlite از NullPool استفاده می‌کند و تنظیمات اندازه pool را نمی‌پذیرد
+    pool_args = {
+        "poolclass": instrumented_pool_class(name, is_async=True),
+        "pool_size": compute_pool_size(sync_url),
+        "max_overflow": settings.DB_MAX_OVERFLOW,
+        "pool_timeout": settings.DB_POOL_TIMEOUT
+    } if not url.startswith("sqlite") else {}
+    engine = create_async_engine(
+        url,
+        pool_pre_ping=True,
+        pool_recycle=3600,
+        **pool_args
+    )
+    attach_leak_detector(engine.sync_engine, name)
+    return engine
+
+def get_engine():
+    """موتور sync دیتابیس (ساخت در اولین فراخوانی)"""
+    global _engine
+    if _engine is None:
+        with _engine_lock:
+            if _engine is None:
+                _engine = _create_sync_engine(SQLALCHEMY_DATABASE_URL, "primary")
+    return _engine
+
+def get_async_engine():
+    """موتور async برای route handlerهای async (ساخت در اولین فراخوانی)"""
+    global _async_engine
+    if _async_engine is None:
+        with _engine_lock:
+            if _async_engine is None:
+                _async_engine = _create_async_engine(ASYNC_DATABASE_URL, SQLALCHEMY_DATABASE_URL, "primary_async")
+    return _async_engine
+
+def get_replica_engine():
+    """موتور sync رپلیکا؛ None اگر DATABASE_REPLICA_URL تنظیم نشده باشد"""
+    global _replica_engine
+    if _replica_engine is None and settings.DATABASE_REPLICA_URL:
+        with _engine_lock:
+            if _replica_engine is None:
+                _replica_engine = _create_sync_engine(settings.DATABASE_REPLICA_URL, "replica")
+    return _replica_engine
+
+def get_async_replica_engine():
+    """موتور async رپلیکا؛ None اگر DATABASE_REPLICA_URL تنظیم نشده باشد"""
+    global _async_replica_engine
+    if _async_replica_engine is None and settings.DATABASE_REPLICA_URL:
+        with _engine_lock:
+            if _async_replica_engine is None:
+                _async_replica_engine = _create_async_engine(
+                    to_async_url(settings.DATABASE_REPLICA_URL),
+                    settings.DATABASE_REPLICA_URL,
+                    "replica_async"
+                )
+    return _async_replica_engine
+
+def init_engines() -> None:
+    """
+    ساخت همه موتورها پیش از سرویس‌دهی (در startup داخل to_thread)
+
+    اندازه pool هر موتور به max_connections سرور بستگی دارد که با یک اتصال مسدودکننده
+    خوانده می‌شود؛ اگر اولین موتور async یا رپلیکا داخل یک درخواست ساخته شود این کار
+    event loop را متوقف می‌کند.
+    """
+    get_engine()
+    get_async_engine()
+    get_replica_engine()
+    get_async_replica_engine()
+
+class _LazySessionFactory:
+    """
+    جایگزین sessionmaker که factory واقعی را در اولین فراخوانی می‌سازد
+
+    رابط آن با sessionmaker یکسان است (SessionLocal() و SessionLocal.configure و ...).
+    """
+
+    def __init__(self, build: Callable[[], Any]):
+        self._build = build
+        self._factory = None
+
+    def _get(self):
+        if self._factory is None:
+            with _engine_lock:
+                if self._factory is None:
+                    self._factory = self._build()
+        return self._factory
+
+    def __call__(self, **kwargs):
+        return self._get()(**kwargs)
+
+    def __getattr__(self, name: str):
+        return getattr(self._get(), name)
+
+def _sync_factory(bind):
+    return sessionmaker(
+        autocommit=False,
+        autoflush=False,
+        bind=bind,
+        expire_on_commit=False,
+        twophase=False,
+        query_cls=None
+    )
+
+def _async_factory(bind):
+    return async_sessionmaker(
+        bind=bind,
+        class_=AsyncSession,
+        autoflush=False,
+        expire_on_commit=False
+    )
 
 # ساخت session factory با تنظیمات بهینه
-SessionLocal = sessionmaker(
-    autocommit=False,
-    autoflush=False,
-    bind=engine,
-    expire_on_commit=False,
-    twophase=False,
-    query_cls=None
-)
+SessionLocal = _LazySessionFactory(lambda: _sync_factory(get_engine()))
+AsyncSessionLocal = _LazySessionFactory(lambda: _async_factory(get_async_engine()))
+
+# session factoryهای رپلیکا (فقط وقتی DATABASE_REPLICA_URL تنظیم شده استفاده می‌شوند)
+ReplicaSessionLocal = _LazySessionFactory(lambda: _sync_factory(get_replica_engine()))
+AsyncReplicaSessionLocal = _LazySessionFactory(lambda: _async_factory(get_async_replica_engine()))
+
+# تأخیر رپلیکا؛ اگر تمام WAL دریافتی اعمال شده باشد تأخیر صفر است
+# (در غیر این صورت now() - pg_last_xact_replay_timestamp() روی دیتابیس بی‌تغییر مدام رشد می‌کند)
+REPLICA_LAG_QUERY = text("""
+    SELECT CASE
+        WHEN NOT pg_is_in_recovery() THEN 0
+        WHEN pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0
+        ELSE COALESCE(EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()), 0)
+    END
+""")
+
+class ReplicaRouter:
+    """
+    تصمیم‌گیری استفاده از رپلیکا برای کوئری‌های فقط‌خواندنی
+
+    تأخیر رپلیکا حداکثر هر check_interval ثانیه یک بار بررسی و نتیجه کش می‌شود.
+    اگر رپلیکا در دسترس نباشد یا تأخیر آن از max_lag بیشتر باشد، کوئری‌ها به primary می‌روند.
+    """
+
+    def __init__(self, max_lag: float, check_interval: float):
+        self.max_lag = max_lag
+        self.check_interval = check_interval
+        self._lock = threading.Lock()
+        self._usable = False
+        self._lag: Optional[float] = None
+        self._checked_at = 0.0
+        self._error: Optional[str] = None
+
+    @property
+    def configured(self) -> bool:
+        return bool(settings.DATABASE_REPLICA_URL)
+
+    def _claim_check(self) -> bool:
+        """آیا زمان بررسی مجدد رسیده است (فقط یک فراخواننده بررسی را انجام می‌دهد)"""
+        with self._lock:
+            now = time.monotonic()
+            if now - self._checked_at < self.check_interval:
+                return False
+            self._checked_at = now
+            return True
+
+    def _record(self, lag: Optional[float], error: Optional[str] = None) -> None:
+        usable = lag is not None and lag <= self.max_lag
+        if usable != self._usable:
+            if usable:
+                logger.info(f"Replica in use (lag {lag:.1f}s)")
+            else:
+                logger.warning(f"Replica disabled, reading from primary (lag={lag}, error={error})")
+        self._usable, self._lag, self._error = usable, lag, error
+
+    def _lag_query(self, dialect: str):
+        # دیتابیس‌های غیر Postgres (مثلاً SQLite در تست‌ها) مفهوم تأخیر رپلیکیشن ندارند
+        return REPLICA_LAG_QUERY if dialect == "postgresql" else text("SELECT 0")
+
+    def replica_usable(self) -> bool:
+        """بررسی sync (برای sessionهای sync و تردها)"""
+        if not self.configured:
+            return False
+        if self._claim_check():
+            try:
+                engine = get_replica_engine()
+                with engine.connect() as conn:
+                    lag = conn.execute(self._lag_query(engine.dialect.name)).scalar()
+                self._record(float(lag or 0))
+            except Exception as e:
+                self._record(None, str(e))
+        return self._usable
+
+    async def replica_usable_async(self) -> bool:
+        """بررسی async (بدون مسدود کردن event loop)"""
+        if not self.configured:
+            return False
+        if self._claim_check():
+            try:
+                engine = get_async_replica_engine()
+                async with engine.connect() as conn:
+                    lag = (await conn.execute(self._lag_query(engine.dialect.name))).scalar()
+                self._record(float(lag or 0))
+            except Exception as e:
+                self._record(None, str(e))
+        return self._usable
+
+    def status(self) -> Dict[str, Any]:
+        return {
+            "configured": self.configured,
+            "in_use": self._usable,
+            "lag_seconds": self._lag,
+            "max_lag_seconds": self.max_lag,
+            "error": self._error
+        }
+
+replica_router = ReplicaRouter(settings.REPLICA_MAX_LAG_SECONDS, settings.REPLICA_LAG_CHECK_INTERVAL)
+
+def open_read_session():
+    """Session فقط‌خواندنی: رپلیکا در صورت سالم بودن، در غیر این صورت primary"""
+    if replica_router.replica_usable():
+        return ReplicaSessionLocal()
+    return SessionLocal()
+
+def __getattr__(name: str):
+    """سازگاری با کدهایی که engine و async_engine را مستقیم ایمپورت می‌کنند"""
+    if name == "engine":
+        return get_engine()
+    if name == "async_engine":
+        return get_async_engine()
+    if name == "replica_engine":
+        return get_replica_engine()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+def check_connection() -> bool:
+    """تست اتصال به دیتابیس (در startup برنامه، نه هنگام ایمپورت)"""
+    try:
+        with get_engine().connect():
+            pass
+        logger.info("اتصال به دیتابیس با موفقیت برقرار شد")
+        return True
+    except Exception as e:
+        logger.critical(f"خطا در اتصال به دیتابیس: {str(e)}")
+        return False
 
 # پایه مدل‌های دیتابیس
 Base = declarative_base()
@@ -50,15 +310,50 @@ def get_db():
     finally:
         db.close()
 
+async def get_async_db():
+    """ژنراتور AsyncSession برای وابستگی‌های FastAPI در مسیرهای async"""
+    async with AsyncSessionLocal() as db:
+        try:
+            yield db
+        except SQLAlchemyError as e:
+            logger.error(f"خطای دیتابیس: {str(e)}")
+            await db.rollback()
+            raise
+
+def get_read_db():
+    """ژنراتور session برای endpointهای فقط‌خواندنی (رپلیکا با fallback به primary)"""
+    db = open_read_session()
+    try:
+        yield db
+    except SQLAlchemyError as e:
+        logger.error(f"خطای دیتابیس: {str(e)}")
+        db.rollback()
+        raise
+    finally:
+        db.close()
+
+async def get_async_read_db():
+    """نسخه async از get_read_db"""
+    factory = AsyncReplicaSessionLocal if await replica_router.replica_usable_async() else AsyncSessionLocal
+    async with factory() as db:
+        try:
+            yield db
+        except SQLAlchemyError as e:
+            logger.error(f"خطای دیتابیس: {str(e)}")
+            await db.rollback()
+            raise
+
 def init_db():
     """تابع مقداردهی اولیه دیتابیس"""
     try:
-        # ایجاد تمام جداول
-        Base.metadata.create_all(bind=engine)
+        # ایجاد/به‌روزرسانی جداول با migrationها
+        from backend.migrations import upgrade
+        upgrade(get_engine())
         
         # ایجاد ادمین پیش‌فرض اگر وجود نداشت
         from backend.users.user_manager import UserManager
         from backend.schemas import UserCreate
+        from backend.models import User
         
         with SessionLocal() as db:
             if not db.query(User).filter(User.username == "admin").first():
@@ -78,12 +373,3 @@ def init_db():
     except Exception as e:
         logger.critical(f"خطای بحرانی در مقداردهی دیتابیس: {str(e)}")
         raise
-
-# تست اتصال هنگام ایمپورت
-try:
-    connection = engine.connect()
-    connection.close()
-    logger.info("اتصال به دیتابیس با موفقیت برقرار شد")
-except Exception as e:
-    logger.critical(f"خطا در اتصال به دیتابیس: {str(e)}")
-    raise
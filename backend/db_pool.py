@@ -0,0 +1,243 @@
+"""
+ابزار دقیق connection pool دیتابیس
+
+- زمان انتظار برای گرفتن اتصال از pool و تعداد دفعاتی که pool پر بوده است
+- تشخیص sessionهایی که اتصال را بیش از حد نگه داشته‌اند (نشت اتصال)
+- محاسبه اندازه pool هر worker از تعداد workerها و max_connections سرور Postgres
+"""
+import logging
+import threading
+import time
+import traceback
+from collections import deque
+from typing import Deque, Dict, List, Optional, Type
+
+from sqlalchemy import create_engine, event, text
+from sqlalchemy.engine import Engine
+from sqlalchemy.pool import AsyncAdaptedQueuePool, NullPool, QueuePool
+
+from backend.config import settings
+from backend.utils import repeat_every
+
+logger = logging.getLogger(__name__)
+
+# تعداد نمونه‌های اخیر برای محاسبه صدک‌های زمان انتظار
+LATENCY_WINDOW = 2048
+# هر worker یک موتور sync و یک موتور async روی هر دیتابیس دارد
+ENGINES_PER_WORKER = 2
+MAX_POOL_SIZE = 20
+MIN_POOL_SIZE = 2
+# مقدار پیش‌فرض Postgres وقتی max_connections قابل خواندن نیست
+DEFAULT_MAX_CONNECTIONS = 100
+
+class PoolMetrics:
+    """آمار یک pool: زمان انتظار checkout، تعداد انتظارها و اتصال‌های در دست"""
+
+    def __init__(self, name: str):
+        self.name = name
+        self._lock = threading.Lock()
+        self.checkouts = 0
+        self.waits = 0
+        self.failures = 0
+        self.total_wait = 0.0
+        self.max_wait = 0.0
+        self._latencies: Deque[float] = deque(maxlen=LATENCY_WINDOW)
+        # اتصال‌های در دست: id رکورد اتصال → (زمان checkout، محل فراخوانی)
+        self._held: Dict[int, tuple] = {}
+        self.leaks_reported = 0
+        self.pool = None
+
+    def record_checkout(self, elapsed: float, waited: bool, failed: bool = False) -> None:
+        with self._lock:
+            if failed:
+                self.failures += 1
+                return
+            self.checkouts += 1
+            self.total_wait += elapsed
+            self.max_wait = max(self.max_wait, elapsed)
+            self._latencies.append(elapsed)
+            if waited:
+                self.waits += 1
+
+    def hold(self, key: int, stack: Optional[str]) -> None:
+        with self._lock:
+            self._held[key] = (time.monotonic(), stack)
+
+    def release(self, key: int) -> None:
+        with self._lock:
+            self._held.pop(key, None)
+
+    def long_held(self, threshold: float, include_stacks: bool = True) -> List[Dict]:
+        """
+        اتصال‌هایی که بیش از threshold ثانیه از pool بیرون هستند
+
+        محل checkout (مسیر فایل‌های سرور) فقط برای لاگ است و در خروجی API حذف می‌شود.
+        """
+        now = time.monotonic()
+        with self._lock:
+            held = list(self._held.values())
+        return [
+            {"held_seconds": round(now - started, 1), **({"checked_out_at": stack} if include_stacks else {})}
+            for started, stack in held
+            if now - started >= threshold
+        ]
+
+    def snapshot(self) -> Dict:
+        with self._lock:
+            latencies = sorted(self._latencies)
+            data = {
+                "checkouts": self.checkouts,
+                "waits": self.waits,
+                "failures": self.failures,
+                "avg_wait_ms": round(self.total_wait / self.checkouts * 1000, 3) if self.checkouts else 0.0,
+                "max_wait_ms": round(self.max_wait * 1000, 3),
+                "held": len(self._held),
+                "leaks_reported": self.leaks_reported
+            }
+
+        def percentile(p: float) -> Optional[float]:
+            if not latencies:
+                return None
+            return round(latencies[min(len(latencies) - 1, int(round(p * (len(latencies) - 1))))] * 1000, 3)
+
+        data["wait_ms"] = {"p50": percentile(0.50), "p95": percentile(0.95), "p99": percentile(0.99)}
+        pool = self.pool
+        if pool is not None and hasattr(pool, "size"):
+            data.update({
+                "size": pool.size(),
+                "checked_out": pool.checkedout(),
+                "overflow": pool.overflow(),
+                "idle": pool.checkedin()
+            })
+        return data
+
+class _InstrumentedPoolMixin:
+    """اندازه‌گیری زمان انتظار در _do_get؛ metrics به عنوان ویژگی کلاس تنظیم می‌شود"""
+
+    metrics: PoolMetrics
+
+    def _do_get(self):
+        # اگر همه اتصال‌ها (با overflow) در دست باشند درخواست باید منتظر بماند
+        waited = self.checkedout() >= self.size() + max(self._max_overflow, 0)
+        started = time.perf_counter()
+        try:
+            connection = super()._do_get()
+        except Exception:
+            self.metrics.record_checkout(time.perf_counter() - started, waited, failed=True)
+            raise
+        self.metrics.record_checkout(time.perf_counter() - started, waited)
+        return connection
+
+class InstrumentedQueuePool(_InstrumentedPoolMixin, QueuePool):
+    pass
+
+class InstrumentedAsyncQueuePool(_InstrumentedPoolMixin, AsyncAdaptedQueuePool):
+    pass
+
+_registry: Dict[str, PoolMetrics] = {}
+
+def instrumented_pool_class(name: str, is_async: bool) -> Type:
+    """
+    کلاس pool اختصاصی برای یک موتور
+
+    metrics روی کلاس قرار می‌گیرد تا pool ساخته شده در recreate()/dispose() هم همان آمار را داشته باشد.
+    """
+    metrics = _registry.setdefault(name, PoolMetrics(name))
+    base = InstrumentedAsyncQueuePool if is_async else InstrumentedQueuePool
+    return type(f"{base.__name__}_{name}", (base,), {"metrics": metrics})
+
+def attach_leak_detector(engine: Engine, name: str) -> None:
+    """ثبت زمان checkout/checkin هر اتصال برای تشخیص sessionهای طولانی"""
+    metrics = _registry.setdefault(name, PoolMetrics(name))
+    metrics.pool = engine.pool
+    capture_stack = settings.DB_LEAK_CAPTURE_STACK
+
+    @event.listens_for(engine, "checkout")
+    def _on_checkout(dbapi_connection, connection_record, connection_proxy):
+        stack = None
+        if capture_stack:
+            # فریم‌های SQLAlchemy حذف می‌شوند تا محل واقعی در کد برنامه دیده شود
+            frames = [f for f in traceback.extract_stack(limit=25)[:-1] if "sqlalchemy" not in f.filename]
+            stack = "".join(traceback.format_list(frames[-4:])).strip()
+        metrics.pool = engine.pool
+        metrics.hold(id(connection_record), stack)
+
+    @event.listens_for(engine, "checkin")
+    def _on_checkin(dbapi_connection, connection_record):
+        metrics.release(id(connection_record))
+
+def report_leaks(threshold: Optional[float] = None) -> int:
+    """ثبت هشدار برای اتصال‌هایی که بیش از آستانه نگه داشته شده‌اند؛ تعداد را برمی‌گرداند"""
+    threshold = threshold if threshold is not None else settings.DB_LEAK_THRESHOLD_SECONDS
+    count = 0
+    for metrics in _registry.values():
+        for leak in metrics.long_held(threshold):
+            count += 1
+            metrics.leaks_reported += 1
+            logger.warning(
+                f"Connection from pool '{metrics.name}' held for {leak['held_seconds']}s"
+                + (f"; checked out at:\n{leak['checked_out_at']}" if leak["checked_out_at"] else "")
+            )
+    return count
+
+@repeat_every(seconds=settings.DB_LEAK_THRESHOLD_SECONDS)
+async def periodic_leak_scan():
+    """بررسی دوره‌ای اتصال‌هایی که بیش از حد از pool بیرون مانده‌اند"""
+    report_leaks()
+
+def pool_stats() -> Dict:
+    """آمار همه poolهای ساخته شده و اتصال‌های مشکوک به نشت"""
+    threshold = settings.DB_LEAK_THRESHOLD_SECONDS
+    return {
+        "workers": settings.WEB_CONCURRENCY,
+        "leak_threshold_seconds": threshold,
+        "pools": {
+            name: {**metrics.snapshot(), "long_held": metrics.long_held(threshold, include_stacks=False)}
+            for name, metrics in _registry.items()
+        }
+    }
+
+_max_connections_cache: Dict[str, int] = {}
+
+def server_max_connections(url: str) -> int:
+    """
+    max_connections سرور Postgres (از DB_MAX_CONNECTIONS یا با یک اتصال موقت بدون pool)
+
+    خواندن از سرور مسدودکننده است؛ موتورها در startup با init_engines داخل ترد ساخته
+    می‌شوند تا این کوئری هیچ‌وقت روی event loop اجرا نشود.
+    """
+    if settings.DB_MAX_CONNECTIONS:
+        return settings.DB_MAX_CONNECTIONS
+    if url in _max_connections_cache:
+        return _max_connections_cache[url]
+    value = DEFAULT_MAX_CONNECTIONS
+    probe = create_engine(url, poolclass=NullPool)
+    try:
+        with probe.connect() as conn:
+            value = int(conn.execute(text("SHOW max_connections")).scalar())
+    except Exception as e:
+        logger.warning(f"Could not read max_connections, assuming {value}: {str(e)}")
+    finally:
+        probe.dispose()
+    _max_connections_cache[url] = value
+    return value
+
+def compute_pool_size(url: str) -> int:
+    """
+    اندازه pool هر موتور
+
+    (max_connections - اتصال‌های رزرو) بین workerها و موتورهای sync/async هر worker
+    تقسیم می‌شود؛ DB_POOL_SIZE در صورت تنظیم بر این محاسبه مقدم است.
+    """
+    if settings.DB_POOL_SIZE:
+        return settings.DB_POOL_SIZE
+    if not url.startswith("postgresql"):
+        return MAX_POOL_SIZE
+    available = server_max_connections(url) - settings.DB_RESERVED_CONNECTIONS
+    per_engine = available // (settings.WEB_CONCURRENCY * ENGINES_PER_WORKER) - settings.DB_MAX_OVERFLOW
+    size = max(MIN_POOL_SIZE, min(MAX_POOL_SIZE, per_engine))
+    logger.info(
+        f"Pool size {size} per engine ({settings.WEB_CONCURRENCY} workers, "
+        f"max_connections={available + settings.DB_RESERVED_CONNECTIONS})"
+    )
+    return size
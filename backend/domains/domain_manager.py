@@ -1,6 +1,7 @@
 from pydantic import BaseModel, validator
 from typing import List, Dict, Optional
 from sqlalchemy.orm import Session
+from backend.config import settings
 from backend.models import Domain, User
 from backend.utils import setup_ssl, generate_subscription_link
 
@@ -111,8 +112,8 @@ class DomainManager:
         if not user or not domains:
             raise ValueError("کاربر یا دامنه یافت نشد")
 
-        configs = [{"name": d.name, "type": d.type} for d in domains]
-        return generate_subscription_link(user.uuid, configs)
+        link = generate_subscription_link(domain=settings.PANEL_DOMAIN or settings.SERVER_IP, uuid=user.uuid)
+        return f"{link}?configs={','.join(d.name for d in domains)}"
 
     # --- سایر متدهای کاربردی ---
     def get_config(self, domain_id: int) -> Dict:
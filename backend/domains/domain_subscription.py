@@ -1,8 +1,11 @@
 from fastapi import APIRouter, Depends, HTTPException, status
 from typing import List, Dict
+from sqlalchemy import select
 from sqlalchemy.orm import Session
-from backend.database import get_db
+from sqlalchemy.ext.asyncio import AsyncSession
+from backend.database import get_db, get_async_db
 from backend.models import Domain, User
+from backend.config import settings
 from backend.utils import generate_subscription_link, get_current_user
 from backend import schemas
 
@@ -19,6 +22,16 @@ def get_domain_configs(db: Session, domain_ids: List[int]) -> List[Dict]:
         })
     return configs
 
+def _selected_domains_link(uuid: str, domain_configs: List[Dict]) -> str:
+    """
+    لینک /sub/{uuid} محدود به دامنه‌های انتخاب‌شده
+
+    /sub اتصال‌ها را روی دامنه‌ها (و آدرس‌های CDN آنها) گسترش می‌دهد؛ configs فقط انتخاب را مشخص می‌کند.
+    """
+    link = generate_subscription_link(domain=settings.PANEL_DOMAIN or settings.SERVER_IP, uuid=uuid)
+    names = [config["domain_name"] for config in domain_configs]
+    return f"{link}?configs={','.join(names)}" if names else link
+
 def create_user_subscription_link(db: Session, user_id: int, domain_ids: List[int]) -> str:
     """ ایجاد لینک سابسکریپشن برای کاربر با کانفیگ‌های دامنه‌های انتخاب‌شده """
     user = db.query(User).filter(User.id == user_id).first()
@@ -26,14 +39,29 @@ def create_user_subscription_link(db: Session, user_id: int, domain_ids: List[in
         raise ValueError("کاربر یافت نشد.")
 
     domain_configs = get_domain_configs(db, domain_ids)
-    subscription_link = generate_subscription_link(user.uuid)
-    subscription_link += "?configs=" + ",".join([config["domain_name"] for config in domain_configs])
-    return subscription_link
+    return _selected_domains_link(user.uuid, domain_configs)
+
+async def get_domain_configs_async(db: AsyncSession, domain_ids: List[int]) -> List[Dict]:
+    """ نسخه async دریافت کانفیگ‌های دامنه‌های انتخاب‌شده """
+    result = await db.execute(select(Domain).where(Domain.id.in_(domain_ids)))
+    return [
+        {"domain_name": domain.name, "config": domain.config}
+        for domain in result.scalars()
+    ]
+
+async def create_user_subscription_link_async(db: AsyncSession, user_id: int, domain_ids: List[int]) -> str:
+    """ نسخه async ایجاد لینک سابسکریپشن کاربر """
+    user = (await db.execute(select(User).where(User.id == user_id))).scalars().first()
+    if not user:
+        raise ValueError("کاربر یافت نشد.")
+
+    domain_configs = await get_domain_configs_async(db, domain_ids)
+    return _selected_domains_link(user.uuid, domain_configs)
 
 @router.get("/configs/", response_model=List[Dict])
 async def get_domains_configs(
     domain_ids: List[int],
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     current_user: schemas.User = Depends(get_current_user)
 ):
     """
@@ -41,7 +69,7 @@ async def get_domains_configs(
     - نیاز به احراز هویت دارد
     """
     try:
-        return get_domain_configs(db, domain_ids)
+        return await get_domain_configs_async(db, domain_ids)
     except Exception as e:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
@@ -51,7 +79,7 @@ async def get_domains_configs(
 @router.post("/generate-link/", response_model=schemas.SubscriptionLink)
 async def generate_subscription_link_endpoint(
     domain_ids: List[int],
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     current_user: schemas.User = Depends(get_current_user)
 ):
     """
@@ -59,7 +87,7 @@ async def generate_subscription_link_endpoint(
     - نیاز به احراز هویت دارد
     """
     try:
-        link = create_user_subscription_link(db, current_user.id, domain_ids)
+        link = await create_user_subscription_link_async(db, current_user.id, domain_ids)
         return {"link": link}
     except ValueError as e:
         raise HTTPException(
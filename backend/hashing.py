@@ -0,0 +1,215 @@
+import asyncio
+import logging
+import multiprocessing
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future, ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Deque, Dict, List, Optional
+
+from passlib.context import CryptContext
+
+from backend.config import settings
+
+logger = logging.getLogger(__name__)
+
+# همان context مورد استفاده در utils؛ هزینه bcrypt از تنظیمات خوانده می‌شود
+pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto", bcrypt__rounds=settings.BCRYPT_ROUNDS)
+
+# تعداد نمونه‌های اخیر که برای محاسبه صدک‌های تأخیر نگه داشته می‌شوند
+LATENCY_WINDOW = 1024
+
+def _hash(password: str) -> str:
+    return pwd_context.hash(password)
+
+def _verify(plain_password: str, hashed_password: str) -> bool:
+    return pwd_context.verify(plain_password, hashed_password)
+
+def _hash_chunk(passwords: List[str]) -> List[str]:
+    return [pwd_context.hash(password) for password in passwords]
+
+def _mp_context():
+    """
+    پردازه‌های pool با forkserver (یا spawn) ساخته می‌شوند نه fork
+
+    worker برنامه هنگام ساخت pool تردهای فعال (event loop، rerenderer، poolهای دیتابیس)
+    و mmap باز دارد؛ fork از چنین پردازه‌ای ممکن است قفل‌های گرفته شده را در فرزند کپی کند.
+    """
+    if "forkserver" in multiprocessing.get_all_start_methods():
+        context = multiprocessing.get_context("forkserver")
+        # سرور fork فقط همین ماژول را بارگذاری می‌کند نه کل برنامه
+        context.set_forkserver_preload([__name__])
+        return context
+    return multiprocessing.get_context("spawn")
+
+class PasswordHasherBusy(Exception):
+    """صف هش رمز پر است (مثلاً هنگام هجوم درخواست‌های ورود)"""
+
+class PasswordHasher:
+    """
+    اجرای bcrypt در یک process pool محدود
+
+    bcrypt عمداً کند است؛ اجرای آن در handlerهای async کل worker را متوقف می‌کند.
+    عملیات‌ها به pool ارسال می‌شوند و اگر تعداد عملیات در انتظار از max_pending
+    بیشتر شود درخواست جدید با PasswordHasherBusy رد می‌شود. یک عملیات تا پایان واقعی
+    اجرای آن در pool در انتظار شمرده می‌شود (حتی اگر درخواست منتظر آن لغو شده باشد).
+    اگر یکی از پردازه‌ها از بین برود pool خراب شده با pool جدید جایگزین می‌شود.
+    عمق صف و تأخیر (انتظار در صف + محاسبه) برای مانیتورینگ نگه داشته می‌شود.
+    """
+
+    def __init__(self, workers: int, max_pending: int):
+        self.workers = workers
+        self.max_pending = max_pending
+        self._executor: Optional[ProcessPoolExecutor] = None
+        self._lock = threading.Lock()
+        self._pending = 0
+        self._peak_pending = 0
+        self._completed = 0
+        self._rejected = 0
+        self._restarts = 0
+        self._latencies: Deque[float] = deque(maxlen=LATENCY_WINDOW)
+
+    def _get_executor(self) -> ProcessPoolExecutor:
+        if self._executor is None:
+            with self._lock:
+                if self._executor is None:
+                    self._executor = ProcessPoolExecutor(max_workers=self.workers, mp_context=_mp_context())
+        return self._executor
+
+    def _reset_executor(self, executor: ProcessPoolExecutor) -> None:
+        """کنار گذاشتن pool خراب؛ pool بعدی در اولین ارسال ساخته می‌شود"""
+        with self._lock:
+            if self._executor is not executor:
+                return
+            self._executor = None
+            self._restarts += 1
+        logger.warning("Password hashing pool is broken; starting a new one")
+        executor.shutdown(wait=False, cancel_futures=True)
+
+    def _acquire(self, count: int = 1, bounded: bool = True) -> None:
+        with self._lock:
+            if bounded and self._pending + count > self.max_pending:
+                self._rejected += count
+                raise PasswordHasherBusy("Password hashing queue is full")
+            self._pending += count
+            self._peak_pending = max(self._peak_pending, self._pending)
+
+    def _release(self, started: float, count: int, future: Future) -> None:
+        elapsed = time.perf_counter() - started
+        with self._lock:
+            self._pending -= count
+            if not future.cancelled() and future.exception() is None:
+                self._completed += count
+                self._latencies.append(elapsed / count)
+
+    def _submit(self, count: int, func, *args) -> Future:
+        """
+        ارسال به pool (جایگزینی pool خراب و یک بار تلاش دوباره)
+
+        جای این عملیات در صف در callback پایان future آزاد می‌شود.
+        """
+        started = time.perf_counter()
+        executor = self._get_executor()
+        try:
+            future = executor.submit(func, *args)
+        except BrokenProcessPool:
+            self._reset_executor(executor)
+            executor = self._get_executor()
+            future = executor.submit(func, *args)
+
+        def done(f: Future) -> None:
+            self._release(started, count, f)
+            if not f.cancelled() and isinstance(f.exception(), BrokenProcessPool):
+                self._reset_executor(executor)
+
+        future.add_done_callback(done)
+        return future
+
+    async def _run(self, func, *args):
+        for attempt in range(2):
+            self._acquire()
+            try:
+                future = self._submit(1, func, *args)
+            except BaseException:
+                with self._lock:
+                    self._pending -= 1
+                raise
+            try:
+                # لغو درخواست فقط future در صف را لغو می‌کند؛ کار در حال اجرا تا پایان در صف می‌ماند
+                return await asyncio.wrap_future(future)
+            except BrokenProcessPool:
+                # پردازه‌ای وسط کار از بین رفته؛ عملیات bcrypt بی‌اثر است و روی pool جدید تکرار می‌شود
+                if attempt:
+                    raise
+
+    async def hash(self, password: str) -> str:
+        """هش رمز عبور بدون مسدود کردن event loop"""
+        return await self._run(_hash, password)
+
+    async def verify(self, plain_password: str, hashed_password: str) -> bool:
+        """بررسی رمز عبور بدون مسدود کردن event loop"""
+        return await self._run(_verify, plain_password, hashed_password)
+
+    def hash_many(self, passwords: List[str]) -> List[str]:
+        """
+        هش دسته‌ای رمزها (برای کد sync مثل ایجاد دسته‌ای کاربران)
+
+        محدودیت صف برای دسته‌ها اعمال نمی‌شود تا یک دسته بزرگ رد نشود؛
+        ولی در عمق صف و آمار تأخیر شمرده می‌شود.
+        """
+        if not passwords:
+            return []
+        chunksize = max(1, len(passwords) // (self.workers * 4))
+        futures = []
+        try:
+            for start in range(0, len(passwords), chunksize):
+                chunk = passwords[start:start + chunksize]
+                self._acquire(len(chunk), bounded=False)
+                try:
+                    futures.append(self._submit(len(chunk), _hash_chunk, chunk))
+                except BaseException:
+                    with self._lock:
+                        self._pending -= len(chunk)
+                    raise
+            return [hashed for future in futures for hashed in future.result()]
+        finally:
+            for future in futures:
+                future.cancel()
+
+    def stats(self) -> Dict:
+        """عمق صف، شمارنده‌ها و صدک‌های تأخیر (میلی‌ثانیه)"""
+        with self._lock:
+            latencies = sorted(self._latencies)
+            pending, peak = self._pending, self._peak_pending
+            completed, rejected, restarts = self._completed, self._rejected, self._restarts
+
+        def percentile(p: float) -> Optional[float]:
+            if not latencies:
+                return None
+            index = min(len(latencies) - 1, int(round(p * (len(latencies) - 1))))
+            return round(latencies[index] * 1000, 2)
+
+        return {
+            "workers": self.workers,
+            "bcrypt_rounds": settings.BCRYPT_ROUNDS,
+            "queue_depth": pending,
+            "peak_queue_depth": peak,
+            "max_pending": self.max_pending,
+            "completed": completed,
+            "rejected": rejected,
+            "pool_restarts": restarts,
+            "latency_ms": {
+                "p50": percentile(0.50),
+                "p95": percentile(0.95),
+                "p99": percentile(0.99),
+                "max": round(latencies[-1] * 1000, 2) if latencies else None
+            }
+        }
+
+    def shutdown(self) -> None:
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+password_hasher = PasswordHasher(settings.PASSWORD_HASH_WORKERS, settings.PASSWORD_HASH_MAX_PENDING)
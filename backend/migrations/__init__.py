@@ -0,0 +1,125 @@
+"""
+اجرای migrationهای نسخه‌دار دیتابیس
+
+هر migration یک ماژول در backend/migrations/versions با VERSION، DESCRIPTION و
+تابع upgrade(conn) است. نسخه اعمال شده در جدول schema_version نگه داشته می‌شود.
+
+migrationها فقط با دستور زیر (یک بار در هر استقرار) اجرا می‌شوند:
+
+    python -m backend.migrations upgrade
+
+workerها هنگام بوت فقط check_schema_version را اجرا می‌کنند که یک کوئری سبک است.
+"""
+import importlib
+import logging
+import pkgutil
+from types import ModuleType
+from typing import List, Optional
+
+from sqlalchemy import text, inspect
+from sqlalchemy.engine import Connection, Engine
+
+logger = logging.getLogger(__name__)
+
+VERSION_TABLE = "schema_version"
+# کلید advisory lock تا دو اجرای همزمان upgrade روی Postgres با هم تداخل نکنند
+ADVISORY_LOCK_KEY = 7_342_001
+
+class SchemaVersionError(RuntimeError):
+    """نسخه schema دیتابیس از نسخه مورد نیاز کد عقب‌تر است"""
+
+def load_migrations() -> List[ModuleType]:
+    """بارگذاری و مرتب‌سازی ماژول‌های migration بر اساس VERSION"""
+    from . import versions
+
+    modules = [
+        importlib.import_module(f"{versions.__name__}.{info.name}")
+        for info in pkgutil.iter_modules(versions.__path__)
+        if not info.name.startswith("_")
+    ]
+    modules.sort(key=lambda m: m.VERSION)
+    for expected, module in enumerate(modules, start=1):
+        if module.VERSION != expected:
+            raise RuntimeError(f"Migration versions must be contiguous; expected {expected}, got {module.VERSION}")
+    return modules
+
+def latest_version() -> int:
+    """آخرین نسخه schema که کد فعلی انتظار دارد"""
+    migrations = load_migrations()
+    return migrations[-1].VERSION if migrations else 0
+
+def _ensure_version_table(conn: Connection) -> None:
+    conn.execute(text(f"""
+        CREATE TABLE IF NOT EXISTS {VERSION_TABLE} (
+            version INTEGER PRIMARY KEY,
+            description VARCHAR(255) NOT NULL,
+            applied_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP
+        )
+    """))
+
+def current_version(conn: Connection) -> int:
+    """نسخه اعمال شده روی دیتابیس (۰ اگر هیچ migrationی اجرا نشده باشد)"""
+    if not inspect(conn).has_table(VERSION_TABLE):
+        return 0
+    return conn.execute(text(f"SELECT COALESCE(MAX(version), 0) FROM {VERSION_TABLE}")).scalar() or 0
+
+def upgrade(engine: Engine, target: Optional[int] = None) -> List[int]:
+    """
+    اعمال migrationهای باقیمانده تا نسخه target (پیش‌فرض: آخرین نسخه)
+
+    هر migration در تراکنش جداگانه اجرا و نسخه آن در همان تراکنش ثبت می‌شود.
+
+    Returns:
+        List[int]: نسخه‌های اعمال شده
+    """
+    migrations = load_migrations()
+    if target is None:
+        target = migrations[-1].VERSION if migrations else 0
+    applied = []
+
+    with engine.connect() as lock_conn:
+        is_postgres = engine.dialect.name == "postgresql"
+        if is_postgres:
+            lock_conn.execute(text("SELECT pg_advisory_lock(:key)"), {"key": ADVISORY_LOCK_KEY})
+            lock_conn.commit()
+        try:
+            with engine.begin() as conn:
+                _ensure_version_table(conn)
+                version = current_version(conn)
+
+            for migration in migrations:
+                if migration.VERSION <= version or migration.VERSION > target:
+                    continue
+                logger.info(f"Applying migration {migration.VERSION}: {migration.DESCRIPTION}")
+                with engine.begin() as conn:
+                    migration.upgrade(conn)
+                    conn.execute(
+                        text(f"INSERT INTO {VERSION_TABLE} (version, description) VALUES (:version, :description)"),
+                        {"version": migration.VERSION, "description": migration.DESCRIPTION}
+                    )
+                applied.append(migration.VERSION)
+        finally:
+            if is_postgres:
+                lock_conn.execute(text("SELECT pg_advisory_unlock(:key)"), {"key": ADVISORY_LOCK_KEY})
+                lock_conn.commit()
+
+    return applied
+
+def check_schema_version(engine: Engine) -> int:
+    """
+    بررسی سریع نسخه schema هنگام بوت worker
+
+    Raises:
+        SchemaVersionError: اگر migrationهای اعمال نشده وجود داشته باشد
+    """
+    expected = latest_version()
+    with engine.connect() as conn:
+        version = current_version(conn)
+    if version < expected:
+        raise SchemaVersionError(
+            f"Database schema is at version {version}, code expects {expected}. "
+            f"Run: python -m backend.migrations upgrade"
+        )
+    if version > expected:
+        logger.warning(f"Database schema version {version} is newer than this code ({expected})")
+    return version
@@ -0,0 +1,39 @@
+import argparse
+import logging
+import sys
+
+from backend.database import get_engine
+from . import upgrade, current_version, latest_version, check_schema_version, SchemaVersionError
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(prog="python -m backend.migrations", description="Database schema migrations")
+    commands = parser.add_subparsers(dest="command", required=True)
+    upgrade_parser = commands.add_parser("upgrade", help="apply pending migrations")
+    upgrade_parser.add_argument("--to", type=int, default=None, help="target version (default: latest)")
+    commands.add_parser("current", help="print the applied and latest versions")
+    commands.add_parser("check", help="exit with status 1 if migrations are pending")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s")
+    engine = get_engine()
+
+    if args.command == "upgrade":
+        applied = upgrade(engine, args.to)
+        print(f"Applied: {applied}" if applied else "Schema is up to date")
+        return 0
+
+    if args.command == "current":
+        with engine.connect() as conn:
+            print(f"current={current_version(conn)} latest={latest_version()}")
+        return 0
+
+    try:
+        check_schema_version(engine)
+    except SchemaVersionError as e:
+        print(str(e))
+        return 1
+    print("Schema is up to date")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,37 @@
+"""توابع کمکی idempotent برای migrationها (روی Postgres و SQLite)"""
+from typing import Optional
+
+from sqlalchemy import inspect, text, String
+from sqlalchemy.engine import Connection
+
+def has_table(conn: Connection, table: str) -> bool:
+    return inspect(conn).has_table(table)
+
+def has_column(conn: Connection, table: str, column: str) -> bool:
+    return any(c["name"] == column for c in inspect(conn).get_columns(table))
+
+def is_string_column(conn: Connection, table: str, column: str) -> bool:
+    for c in inspect(conn).get_columns(table):
+        if c["name"] == column:
+            return isinstance(c["type"], String)
+    return False
+
+def add_column(conn: Connection, table: str, column: str, ddl: str) -> bool:
+    """افزودن ستون اگر وجود نداشته باشد؛ ddl شامل نوع و پیش‌فرض است (مثل 'BOOLEAN DEFAULT TRUE')"""
+    if has_column(conn, table, column):
+        return False
+    conn.execute(text(f"ALTER TABLE {table} ADD COLUMN {column} {ddl}"))
+    return True
+
+def create_index(
+    conn: Connection,
+    name: str,
+    table: str,
+    columns: str,
+    unique: bool = False,
+    using: Optional[str] = None
+) -> None:
+    """ساخت ایندکس اگر وجود نداشته باشد؛ columns عبارت SQL داخل پرانتز است"""
+    unique_sql = "UNIQUE " if unique else ""
+    using_sql = f" USING {using}" if using else ""
+    conn.execute(text(f"CREATE {unique_sql}INDEX IF NOT EXISTS {name} ON {table}{using_sql} ({columns})"))
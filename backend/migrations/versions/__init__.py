@@ -0,0 +1 @@
+"""ماژول‌های migration؛ نام فایل با v و شماره نسخه چهاررقمی شروع می‌شود"""
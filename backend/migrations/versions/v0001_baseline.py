@@ -0,0 +1,19 @@
+"""
+نقطه شروع: جداول اصلی پنل
+
+روی نصب‌های موجود (جداول ساخته شده توسط setup.sh یا create_all قبلی) کاری انجام نمی‌دهد
+و فقط نسخه ۱ را ثبت می‌کند؛ روی دیتابیس خالی جداول را از مدل‌ها می‌سازد.
+"""
+from sqlalchemy.engine import Connection
+
+VERSION = 1
+DESCRIPTION = "baseline tables"
+
+BASELINE_TABLES = ("users", "domains", "subscriptions", "settings", "nodes", "inbounds")
+
+def upgrade(conn: Connection) -> None:
+    from backend.database import Base
+    from backend import models  # noqa: F401  ثبت مدل‌ها روی metadata
+
+    tables = [Base.metadata.tables[name] for name in BASELINE_TABLES]
+    Base.metadata.create_all(conn, tables=tables, checkfirst=True)
@@ -0,0 +1,53 @@
+"""
+ستون‌های اضافه شده به مدل‌ها و ایندکس‌های مسیرهای پرتکرار
+
+- subscriptions (user_id, created_at DESC): آخرین سابسکریپشن هر کاربر؛ برای فیلتر user_id هم کافی است
+- users: is_active، is_online، expiry_date و (created_at, id) برای فیلتر و صفحه‌بندی keyset
+- subscriptions.expiry_date و inbounds.tag
+- Postgres: ایندکس‌های trigram برای جستجوی کاربران
+"""
+from sqlalchemy import text
+from sqlalchemy.engine import Connection
+
+from backend.migrations.operations import add_column, create_index, is_string_column
+
+VERSION = 2
+DESCRIPTION = "model columns and hot-path indexes"
+
+COLUMNS = (
+    ("users", "traffic_used", "BIGINT DEFAULT 0"),
+    ("users", "is_online", "BOOLEAN DEFAULT FALSE"),
+    ("users", "expiry_date", "TIMESTAMP"),
+    ("users", "last_activity", "TIMESTAMP"),
+    ("users", "data_dir", "VARCHAR(255)"),
+    ("subscriptions", "is_active", "BOOLEAN DEFAULT TRUE"),
+    ("inbounds", "tag", "VARCHAR(100)"),
+    ("inbounds", "port", "INTEGER"),
+    ("inbounds", "protocol", "VARCHAR(20)"),
+    ("inbounds", "is_active", "BOOLEAN DEFAULT TRUE"),
+)
+
+INDEXES = (
+    ("ix_subscriptions_user_id_created_at", "subscriptions", "user_id, created_at DESC"),
+    ("ix_subscriptions_expiry_date", "subscriptions", "expiry_date"),
+    ("ix_users_is_active", "users", "is_active"),
+    ("ix_users_is_online", "users", "is_online"),
+    ("ix_users_expiry_date", "users", "expiry_date"),
+    ("ix_users_created_at_id", "users", "created_at, id"),
+    ("ix_inbounds_tag", "inbounds", "tag"),
+)
+
+def upgrade(conn: Connection) -> None:
+    for table, column, ddl in COLUMNS:
+        add_column(conn, table, column, ddl)
+
+    for name, table, columns in INDEXES:
+        create_index(conn, name, table, columns)
+
+    if conn.dialect.name == "postgresql":
+        conn.execute(text("CREATE EXTENSION IF NOT EXISTS pg_trgm"))
+        create_index(conn, "ix_users_username_trgm", "users", "username gin_trgm_ops", using="gin")
+        create_index(conn, "ix_users_email_trgm", "users", "email gin_trgm_ops", using="gin")
+        # نصب‌های setup.sh ستون uuid را از نوع UUID ساخته‌اند که varchar_pattern_ops ندارد
+        if is_string_column(conn, "users", "uuid"):
+            create_index(conn, "ix_users_uuid_pattern", "users", "uuid varchar_pattern_ops")
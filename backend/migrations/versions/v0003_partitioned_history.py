@@ -0,0 +1,64 @@
+"""
+جداول traffic_history و connection_events
+
+روی Postgres جداول به صورت RANGE ماهانه پارتیشن‌بندی می‌شوند تا حذف داده قدیمی با
+DETACH/DROP پارتیشن انجام شود (backend/partitions.py). کلید اصلی باید ستون پارتیشن را
+شامل شود، پس (id, ستون زمان) است. روی دیتابیس‌های دیگر جداول ساده از مدل‌ها ساخته می‌شوند.
+"""
+from sqlalchemy import text
+from sqlalchemy.engine import Connection
+
+from backend.migrations.operations import has_table, create_index
+
+VERSION = 3
+DESCRIPTION = "monthly partitioned traffic history and connection events"
+
+POSTGRES_TABLES = {
+    "traffic_history": """
+        CREATE TABLE traffic_history (
+            id BIGSERIAL NOT NULL,
+            recorded_at TIMESTAMP NOT NULL DEFAULT now(),
+            user_id INTEGER NOT NULL,
+            node_id INTEGER,
+            upload BIGINT DEFAULT 0,
+            download BIGINT DEFAULT 0,
+            PRIMARY KEY (id, recorded_at)
+        ) PARTITION BY RANGE (recorded_at)
+    """,
+    "connection_events": """
+        CREATE TABLE connection_events (
+            id BIGSERIAL NOT NULL,
+            occurred_at TIMESTAMP NOT NULL DEFAULT now(),
+            user_id INTEGER NOT NULL,
+            node_id INTEGER,
+            event_type VARCHAR(20) NOT NULL,
+            ip_address VARCHAR(45),
+            PRIMARY KEY (id, occurred_at)
+        ) PARTITION BY RANGE (occurred_at)
+    """,
+}
+
+INDEXES = (
+    ("ix_traffic_history_user_id_recorded_at", "traffic_history", "user_id, recorded_at"),
+    ("ix_connection_events_user_id_occurred_at", "connection_events", "user_id, occurred_at"),
+)
+
+def upgrade(conn: Connection) -> None:
+    if conn.dialect.name != "postgresql":
+        from backend.database import Base
+        from backend import models  # noqa: F401  ثبت مدل‌ها روی metadata
+
+        tables = [Base.metadata.tables[name] for name in POSTGRES_TABLES]
+        Base.metadata.create_all(conn, tables=tables, checkfirst=True)
+        return
+
+    from backend.partitions import ensure_partitions
+
+    for table, ddl in POSTGRES_TABLES.items():
+        if not has_table(conn, table):
+            conn.execute(text(ddl))
+    # ایندکس روی جدول والد به همه پارتیشن‌های فعلی و آینده اعمال می‌شود
+    for name, table, columns in INDEXES:
+        create_index(conn, name, table, columns)
+    for table in POSTGRES_TABLES:
+        ensure_partitions(conn, table)
@@ -0,0 +1,15 @@
+"""
+ستون config دامنه‌ها
+
+مدیریت CDN و SSL تنظیمات خود را در domain.config ذخیره می‌کنند (مثلاً config["cdn"])
+و سابسکریپشن‌ها دامنه‌های پشت CDN را از روی آن گسترش می‌دهند.
+"""
+from sqlalchemy.engine import Connection
+
+from backend.migrations.operations import add_column
+
+VERSION = 4
+DESCRIPTION = "domain config column"
+
+def upgrade(conn: Connection) -> None:
+    add_column(conn, "domains", "config", "JSON")
@@ -0,0 +1,15 @@
+"""
+ستون health_disabled نودها
+
+بررسی سلامت نودی را که خودش غیرفعال کرده علامت می‌زند تا فقط همان را دوباره فعال کند
+و نودهایی که ادمین دستی غیرفعال کرده دست نخورده بمانند.
+"""
+from sqlalchemy.engine import Connection
+
+from backend.migrations.operations import add_column
+
+VERSION = 5
+DESCRIPTION = "node health_disabled column"
+
+def upgrade(conn: Connection) -> None:
+    add_column(conn, "nodes", "health_disabled", "BOOLEAN NOT NULL DEFAULT FALSE")
@@ -1,5 +1,7 @@
-from sqlalchemy import Column, Integer, String, Boolean, DateTime, ForeignKey, JSON, BigInteger
+from sqlalchemy import Column, Integer, String, Boolean, DateTime, ForeignKey, JSON, BigInteger, Index
+from sqlalchemy import event, DDL, false
 from sqlalchemy.orm import relationship
+from sqlalchemy.ext.mutable import MutableDict
 from sqlalchemy.sql import func
 from backend.database import Base
 
@@ -12,21 +14,44 @@ class User(Base):
     hashed_password = Column(String(255))
     uuid = Column(String(36), unique=True, index=True)
     traffic_limit = Column(BigInteger, default=0)
+    traffic_used = Column(BigInteger, default=0)
     usage_duration = Column(Integer, default=30)
     simultaneous_connections = Column(Integer, default=3)
-    is_active = Column(Boolean, default=True)
+    is_active = Column(Boolean, default=True, index=True)
+    is_online = Column(Boolean, default=False, index=True)
+    expiry_date = Column(DateTime, nullable=True, index=True)
+    last_activity = Column(DateTime, nullable=True)
+    data_dir = Column(String(255), nullable=True)
     created_at = Column(DateTime, server_default=func.now())
     updated_at = Column(DateTime, onupdate=func.now())
 
     domains = relationship("Domain", back_populates="owner", cascade="all, delete-orphan")
     subscriptions = relationship("Subscription", back_populates="user")
 
+    __table_args__ = (
+        # ایندکس keyset برای مرتب‌سازی صفحه‌بندی شده بر اساس زمان ایجاد
+        Index("ix_users_created_at_id", "created_at", "id"),
+        # ایندکس‌های جستجو: trigram برای زیررشته و الگوی پیشوندی برای UUID (فقط Postgres)
+        Index("ix_users_username_trgm", "username", postgresql_using="gin", postgresql_ops={"username": "gin_trgm_ops"}),
+        Index("ix_users_email_trgm", "email", postgresql_using="gin", postgresql_ops={"email": "gin_trgm_ops"}),
+        Index("ix_users_uuid_pattern", "uuid", postgresql_ops={"uuid": "varchar_pattern_ops"}),
+    )
+
+# افزونه pg_trgm باید پیش از ساخت ایندکس‌های trigram وجود داشته باشد
+event.listen(
+    User.__table__,
+    "before_create",
+    DDL("CREATE EXTENSION IF NOT EXISTS pg_trgm").execute_if(dialect="postgresql")
+)
+
 class Domain(Base):
     __tablename__ = "domains"
 
     id = Column(Integer, primary_key=True, index=True)
     name = Column(String(255), unique=True, index=True)
     description = Column(JSON, nullable=True, default=dict)
+    # تنظیمات دامنه (ssl، cdn و ...)؛ MutableDict تا تغییر درجا مثل config["cdn"] = ... ذخیره شود
+    config = Column(MutableDict.as_mutable(JSON), nullable=True, default=dict)
     owner_id = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"))
     created_at = Column(DateTime, server_default=func.now())
     updated_at = Column(DateTime, onupdate=func.now())
@@ -39,14 +64,22 @@ class Subscription(Base):
     id = Column(Integer, primary_key=True, index=True)
     uuid = Column(String(36), unique=True, index=True)
     data_limit = Column(BigInteger, default=10737418240)
-    expiry_date = Column(DateTime, nullable=False)
+    expiry_date = Column(DateTime, nullable=False, index=True)
     max_connections = Column(Integer, default=3)
+    is_active = Column(Boolean, default=True)
     user_id = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"))
     created_at = Column(DateTime, server_default=func.now())
     updated_at = Column(DateTime, onupdate=func.now())
 
     user = relationship("User", back_populates="subscriptions")
 
+# ایندکس ترکیبی برای یافتن آخرین سابسکریپشن هر کاربر (DISTINCT ON / LIMIT 1)
+Index(
+    "ix_subscriptions_user_id_created_at",
+    Subscription.user_id,
+    Subscription.created_at.desc()
+)
+
 class Setting(Base):
     __tablename__ = "settings"
 
@@ -67,6 +100,8 @@ class Node(Base):
     port = Column(Integer, nullable=False)
     protocol = Column(String(20), nullable=False)
     is_active = Column(Boolean, default=True)
+    # نود توسط بررسی سلامت (نه ادمین) غیرفعال شده است و فقط در این حالت خودکار فعال می‌شود
+    health_disabled = Column(Boolean, nullable=False, default=False, server_default=false())
     created_at = Column(DateTime, server_default=func.now())
     updated_at = Column(DateTime, onupdate=func.now())
 
@@ -75,6 +110,45 @@ class Inbound(Base):
 
     id = Column(Integer, primary_key=True, index=True)
     name = Column(String(100), unique=True, index=True)
+    tag = Column(String(100), nullable=True, index=True)
+    port = Column(Integer, nullable=True)
+    protocol = Column(String(20), nullable=True)
+    is_active = Column(Boolean, default=True)
     settings = Column(JSON, nullable=False, server_default='{"protocol": "vmess"}')
     created_at = Column(DateTime, server_default=func.now())
     updated_at = Column(DateTime, onupdate=func.now())
+
+class TrafficHistory(Base):
+    """
+    مصرف ترافیک هر کاربر در بازه‌های زمانی
+
+    روی Postgres جدول توسط migration نسخه ۳ به صورت ماهانه بر اساس recorded_at پارتیشن‌بندی
+    می‌شود و کلید اصلی آن (id, recorded_at) است؛ کلید خارجی ندارد تا حذف پارتیشن‌ها ارزان بماند.
+    """
+    __tablename__ = "traffic_history"
+
+    id = Column(BigInteger().with_variant(Integer, "sqlite"), primary_key=True)
+    recorded_at = Column(DateTime, nullable=False, server_default=func.now())
+    user_id = Column(Integer, nullable=False)
+    node_id = Column(Integer, nullable=True)
+    upload = Column(BigInteger, default=0)
+    download = Column(BigInteger, default=0)
+
+    __table_args__ = (
+        Index("ix_traffic_history_user_id_recorded_at", "user_id", "recorded_at"),
+    )
+
+class ConnectionEvent(Base):
+    """رویدادهای اتصال/قطع کاربران؛ مانند TrafficHistory ماهانه بر اساس occurred_at پارتیشن‌بندی می‌شود"""
+    __tablename__ = "connection_events"
+
+    id = Column(BigInteger().with_variant(Integer, "sqlite"), primary_key=True)
+    occurred_at = Column(DateTime, nullable=False, server_default=func.now())
+    user_id = Column(Integer, nullable=False)
+    node_id = Column(Integer, nullable=True)
+    event_type = Column(String(20), nullable=False)
+    ip_address = Column(String(45), nullable=True)
+
+    __table_args__ = (
+        Index("ix_connection_events_user_id_occurred_at", "user_id", "occurred_at"),
+    )
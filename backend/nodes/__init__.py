@@ -0,0 +1 @@
+"""نودهای خروجی (models.Node): agent روی هر نود و توزیع کانفیگ از پنل"""
@@ -0,0 +1,331 @@
+"""
+agent سبک روی هر نود خروجی برای دریافت کانفیگ Xray از پنل
+
+این فایل فقط به کتابخانه استاندارد پایتون وابسته است تا روی نود بدون نصب پنل اجرا شود:
+
+    python3 agent.py --token <NODE_AGENT_TOKEN> --port 62050 \\
+        --config /usr/local/etc/xray/config.json \\
+        --test-command "xray run -test -c {path}" --reload-command "systemctl restart xray" \\
+        --certfile /etc/zhina/agent.crt --keyfile /etc/zhina/agent.key
+
+کانفیگ‌ها نسخه‌دار هستند (هش محتوای JSON مرتب شده):
+- GET  /health              وضعیت و نسخه فعلی
+- GET  /config              کانفیگ و نسخه فعلی
+- PUT  /config              {"version", "config"} کانفیگ کامل
+- PATCH /config             {"base_version", "version", "diff"} فقط تغییرات نسبت به base_version؛
+                            اگر نسخه نود متفاوت باشد 409 برمی‌گرداند تا پنل کانفیگ کامل بفرستد
+همه درخواست‌ها هدر X-Node-Token می‌خواهند.
+
+start_local_agent یک agent جایگزین روی 127.0.0.1 اجرا می‌کند که فقط فایل موقت می‌نویسد
+و سرویسی را ری‌استارت نمی‌کند (برای تست و بنچمارک توزیع کانفیگ).
+"""
+import argparse
+import copy
+import hashlib
+import hmac
+import json
+import logging
+import os
+import shlex
+import ssl
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+logger = logging.getLogger("zhina.node_agent")
+
+TOKEN_HEADER = "X-Node-Token"
+DEFAULT_PORT = 62050
+MAX_BODY_BYTES = 16 * 1024 * 1024
+
+# -------------------- نسخه و diff کانفیگ (مشترک با پنل) --------------------
+def config_version(config: Dict[str, Any]) -> str:
+    """نسخه کانفیگ: هش JSON مرتب شده؛ کانفیگ یکسان در پنل و نود نسخه یکسان دارد"""
+    canonical = json.dumps(config, sort_keys=True, separators=(",", ":"), ensure_ascii=False)
+    return hashlib.blake2b(canonical.encode(), digest_size=16).hexdigest()
+
+_INBOUNDS = "inbounds"
+_ORDER = "inbounds/#order"
+_MISSING = object()
+
+def _units(config: Dict[str, Any]) -> Dict[str, Any]:
+    """تجزیه کانفیگ به بخش‌های مستقل: کلیدهای سطح اول و هر اینباند بر اساس tag"""
+    units = {key: value for key, value in config.items() if key != _INBOUNDS}
+    if _INBOUNDS in config:
+        order = []
+        for index, inbound in enumerate(config[_INBOUNDS] or []):
+            tag = inbound.get("tag") if isinstance(inbound, dict) else None
+            key = f"{_INBOUNDS}/{tag}" if tag and f"{_INBOUNDS}/{tag}" not in units else f"{_INBOUNDS}/#{index}"
+            units[key] = inbound
+            order.append(key)
+        units[_ORDER] = order
+    return units
+
+def _assemble(units: Dict[str, Any]) -> Dict[str, Any]:
+    config = {key: value for key, value in units.items() if not key.startswith(f"{_INBOUNDS}/")}
+    if _ORDER in units:
+        config[_INBOUNDS] = [units[key] for key in units[_ORDER] if key in units]
+    return config
+
+def diff_configs(old: Dict[str, Any], new: Dict[str, Any]) -> Dict[str, Any]:
+    """تغییرات لازم برای رسیدن از old به new (بخش‌های تغییر کرده و حذف شده)"""
+    old_units, new_units = _units(old), _units(new)
+    return {
+        "set": {key: value for key, value in new_units.items() if old_units.get(key, _MISSING) != value},
+        "remove": [key for key in old_units if key not in new_units]
+    }
+
+def apply_diff(config: Dict[str, Any], diff: Dict[str, Any]) -> Dict[str, Any]:
+    units = _units(copy.deepcopy(config))
+    for key in diff.get("remove", []):
+        units.pop(key, None)
+    units.update(copy.deepcopy(diff.get("set", {})))
+    return _assemble(units)
+
+# -------------------- وضعیت agent --------------------
+class ApplyError(Exception):
+    """کانفیگ جدید تست یا بارگذاری نشد؛ کانفیگ قبلی باقی می‌ماند"""
+
+class AgentState:
+    """کانفیگ فعلی نود؛ اعمال کانفیگ جدید اتمیک است و در صورت خطا به نسخه قبل برمی‌گردد"""
+
+    def __init__(self, config_path: Path, test_command: Optional[str] = None, reload_command: Optional[str] = None):
+        self.config_path = Path(config_path)
+        self.test_command = test_command
+        self.reload_command = reload_command
+        self.started_at = time.time()
+        self.applied_at: Optional[float] = None
+        self._lock = threading.Lock()
+        try:
+            self.config = json.loads(self.config_path.read_text())
+        except (OSError, ValueError):
+            self.config = {}
+        self.version = config_version(self.config)
+
+    def snapshot(self) -> Tuple[str, Dict[str, Any]]:
+        with self._lock:
+            return self.version, self.config
+
+    def _run(self, command: str, path: Path) -> None:
+        result = subprocess.run(
+            shlex.split(command.format(path=str(path))),
+            capture_output=True,
+            text=True,
+            timeout=60
+        )
+        if result.returncode != 0:
+            raise ApplyError((result.stderr or result.stdout).strip()[-2000:] or f"{command} failed")
+
+    def _write(self, path: Path, config: Dict[str, Any]) -> None:
+        path.parent.mkdir(parents=True, exist_ok=True)
+        with open(path, "w") as f:
+            json.dump(config, f, indent=2, ensure_ascii=False)
+
+    def apply(self, config: Dict[str, Any], version: str, base_version: Optional[str] = None) -> Tuple[bool, str]:
+        """
+        اعمال کانفیگ؛ (تغییر کرد؟، نسخه فعلی) را برمی‌گرداند
+
+        Raises:
+            ApplyError: اگر تست یا reload کانفیگ شکست بخورد
+        """
+        with self._lock:
+            if base_version is not None and base_version != self.version:
+                raise LookupError(self.version)
+            if version == self.version:
+                return False, self.version
+
+            tmp = self.config_path.with_name(f".{self.config_path.name}.{os.getpid()}.tmp")
+            self._write(tmp, config)
+            try:
+                if self.test_command:
+                    self._run(self.test_command, tmp)
+                backup = self.config_path.with_name(self.config_path.name + ".bak")
+                if self.config_path.exists():
+                    os.replace(self.config_path, backup)
+                os.replace(tmp, self.config_path)
+                if self.reload_command:
+                    try:
+                        self._run(self.reload_command, self.config_path)
+                    except ApplyError:
+                        if backup.exists():
+                            os.replace(backup, self.config_path)
+                            self._run(self.reload_command, self.config_path)
+                        raise
+            finally:
+                if tmp.exists():
+                    tmp.unlink()
+
+            self.config, self.version = config, version
+            self.applied_at = time.time()
+            logger.info(f"Applied config version {version}")
+            return True, version
+
+# -------------------- HTTP --------------------
+class AgentHandler(BaseHTTPRequestHandler):
+    server_version = "ZhinaNodeAgent/1"
+    state: AgentState
+    token: str
+
+    def log_message(self, format: str, *args) -> None:
+        logger.debug("%s - %s", self.address_string(), format % args)
+
+    def _send(self, status: int, payload: Dict[str, Any]) -> None:
+        body = json.dumps(payload, ensure_ascii=False).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _authorized(self) -> bool:
+        supplied = self.headers.get(TOKEN_HEADER, "")
+        if hmac.compare_digest(supplied.encode(), self.token.encode()):
+            return True
+        self._send(401, {"detail": "invalid token"})
+        return False
+
+    def _body(self) -> Optional[Dict[str, Any]]:
+        length = int(self.headers.get("Content-Length") or 0)
+        if length > MAX_BODY_BYTES:
+            self._send(413, {"detail": "body too large"})
+            return None
+        try:
+            return json.loads(self.rfile.read(length) or b"{}")
+        except ValueError:
+            self._send(400, {"detail": "invalid JSON"})
+            return None
+
+    def do_GET(self) -> None:
+        if not self._authorized():
+            return
+        version, config = self.state.snapshot()
+        if self.path == "/health":
+            self._send(200, {
+                "status": "ok",
+                "version": version,
+                "applied_at": self.state.applied_at,
+                "uptime": round(time.time() - self.state.started_at, 1)
+            })
+        elif self.path == "/config":
+            self._send(200, {"version": version, "config": config})
+        else:
+            self._send(404, {"detail": "not found"})
+
+    def _apply(self, config: Dict[str, Any], version: str, base_version: Optional[str] = None) -> None:
+        if config_version(config) != version:
+            self._send(409, {"detail": "version does not match config", "version": self.state.version})
+            return
+        try:
+            changed, current = self.state.apply(config, version, base_version)
+        except LookupError as e:
+            self._send(409, {"detail": "base version mismatch", "version": e.args[0]})
+            return
+        except (ApplyError, OSError, subprocess.SubprocessError) as e:
+            logger.error(f"Applying config {version} failed: {str(e)}")
+            self._send(422, {"detail": str(e), "version": self.state.version})
+            return
+        self._send(200, {"version": current, "changed": changed})
+
+    def do_PUT(self) -> None:
+        if not self._authorized():
+            return
+        if self.path != "/config":
+            self._send(404, {"detail": "not found"})
+            return
+        body = self._body()
+        if body is None:
+            return
+        if not isinstance(body.get("config"), dict) or not body.get("version"):
+            self._send(400, {"detail": "config and version are required"})
+            return
+        self._apply(body["config"], body["version"])
+
+    def do_PATCH(self) -> None:
+        if not self._authorized():
+            return
+        if self.path != "/config":
+            self._send(404, {"detail": "not found"})
+            return
+        body = self._body()
+        if body is None:
+            return
+        base_version, version, diff = body.get("base_version"), body.get("version"), body.get("diff")
+        if not base_version or not version or not isinstance(diff, dict):
+            self._send(400, {"detail": "base_version, version and diff are required"})
+            return
+        current_version, current = self.state.snapshot()
+        if current_version != base_version:
+            self._send(409, {"detail": "base version mismatch", "version": current_version})
+            return
+        self._apply(apply_diff(current, diff), version, base_version)
+
+def make_server(
+    state: AgentState,
+    token: str,
+    host: str = "0.0.0.0",
+    port: int = DEFAULT_PORT,
+    certfile: Optional[str] = None,
+    keyfile: Optional[str] = None
+) -> ThreadingHTTPServer:
+    if not token:
+        raise ValueError("A node token is required")
+    handler = type("BoundAgentHandler", (AgentHandler,), {"state": state, "token": token})
+    server = ThreadingHTTPServer((host, port), handler)
+    if certfile:
+        context = ssl.create_default_context(ssl.Purpose.CLIENT_AUTH)
+        context.load_cert_chain(certfile, keyfile)
+        server.socket = context.wrap_socket(server.socket, server_side=True)
+    return server
+
+def start_local_agent(token: str, config_path: Optional[Path] = None) -> Tuple[ThreadingHTTPServer, str]:
+    """
+    agent جایگزین روی 127.0.0.1 با پورت آزاد در یک thread پس‌زمینه
+
+    کانفیگ فقط در فایل (پیش‌فرض موقت) نوشته می‌شود و هیچ سرویسی ری‌استارت نمی‌شود.
+    Returns:
+        (سرور برای shutdown، آدرس پایه agent)
+    """
+    if config_path is None:
+        config_path = Path(tempfile.mkdtemp(prefix="zhina-agent-")) / "config.json"
+    server = make_server(AgentState(config_path), token, host="127.0.0.1", port=0)
+    threading.Thread(target=server.serve_forever, name="local-node-agent", daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_address[1]}"
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Zhina node agent: receives versioned Xray config from the panel")
+    parser.add_argument("--host", default="0.0.0.0")
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT)
+    parser.add_argument("--token", default=os.environ.get("NODE_AGENT_TOKEN"), help="shared token (or NODE_AGENT_TOKEN)")
+    parser.add_argument("--config", type=Path, default=Path("/usr/local/etc/xray/config.json"))
+    parser.add_argument("--test-command", help="command validating a new config; {path} is replaced by its path")
+    parser.add_argument("--reload-command", help="command applying the config, e.g. 'systemctl restart xray'")
+    parser.add_argument("--certfile", help="serve HTTPS with this certificate")
+    parser.add_argument("--keyfile")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(name)s - %(levelname)s - %(message)s")
+    if not args.token:
+        parser.error("--token or NODE_AGENT_TOKEN is required")
+    if not args.certfile and args.host not in ("127.0.0.1", "::1", "localhost"):
+        logger.warning(
+            "Serving without TLS: the panel only pushes to plain-http agents with NODE_AGENT_ALLOW_INSECURE; "
+            "pass --certfile/--keyfile"
+        )
+    state = AgentState(args.config, args.test_command, args.reload_command)
+    server = make_server(state, args.token, args.host, args.port, args.certfile, args.keyfile)
+    logger.info(f"Node agent listening on {args.host}:{args.port} (config version {state.version})")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
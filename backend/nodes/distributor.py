@@ -0,0 +1,215 @@
+"""
+توزیع کانفیگ Xray به نودهای فعال (models.Node)
+
+- کانفیگ با XrayManager.build_config ساخته و با نسخه (هش محتوا) به agent هر نود ارسال می‌شود
+- برای نودی که نسخه تأیید شده قبلی آن معلوم است فقط diff فرستاده می‌شود (PATCH)؛
+  اگر نود نسخه دیگری داشته باشد (409) یا نسخه‌اش معلوم نباشد، نسخه نود خوانده و در صورت نیاز
+  کانفیگ کامل ارسال می‌شود
+- نودها همزمان و با حداکثر NODE_PUSH_CONCURRENCY درخواست موازی به‌روزرسانی می‌شوند
+- توکن و کانفیگ (شامل کلید خصوصی REALITY) روی http فقط به loopback فرستاده می‌شوند، مگر
+  NODE_AGENT_ALLOW_INSECURE تنظیم شده باشد
+"""
+import asyncio
+import ipaddress
+import logging
+import threading
+import time
+from dataclasses import asdict, dataclass
+from typing import Any, Dict, List, Optional, Tuple
+from urllib.parse import urlsplit
+
+import httpx
+
+from backend.config import settings
+from backend.models import Node
+from .agent import TOKEN_HEADER, config_version, diff_configs
+
+logger = logging.getLogger(__name__)
+
+@dataclass(frozen=True)
+class NodeTarget:
+    id: int
+    name: str
+    url: str
+
+@dataclass(frozen=True)
+class PushResult:
+    node_id: int
+    name: str
+    ok: bool
+    mode: str  # unchanged، diff، full یا error
+    version: Optional[str]
+    duration_ms: float
+    error: Optional[str] = None
+
+INSECURE_ERROR = "refusing to send the node token and config over plain http; use https or set NODE_AGENT_ALLOW_INSECURE"
+
+def agent_url(host: str) -> str:
+    """آدرس پایه agent یک نود (NODE_AGENT_SCHEME و NODE_AGENT_PORT)"""
+    if ":" in host and not host.startswith("["):
+        host = f"[{host}]"
+    return f"{settings.NODE_AGENT_SCHEME}://{host}:{settings.NODE_AGENT_PORT}"
+
+def _is_loopback(host: str) -> bool:
+    if host == "localhost":
+        return True
+    try:
+        return ipaddress.ip_address(host).is_loopback
+    except ValueError:
+        return False
+
+def cleartext_refused(url: str) -> bool:
+    """آیا ارسال توکن به این آدرس agent باید رد شود (http روی میزبان غیر loopback)"""
+    parts = urlsplit(url)
+    return parts.scheme == "http" and not settings.NODE_AGENT_ALLOW_INSECURE and not _is_loopback(parts.hostname or "")
+
+def node_targets(nodes: List[Node]) -> List[NodeTarget]:
+    """آدرس agent نودها (IP نود و NODE_AGENT_PORT)"""
+    return [NodeTarget(id=node.id, name=node.name, url=agent_url(node.ip_address)) for node in nodes]
+
+class NodeDistributor:
+    """ارسال کانفیگ به agentها؛ آخرین کانفیگ تأیید شده هر نود برای ساخت diff نگه داشته می‌شود"""
+
+    def __init__(
+        self,
+        token: Optional[str],
+        concurrency: int,
+        timeout: float,
+        transport: Optional[httpx.AsyncBaseTransport] = None
+    ):
+        self.token = token
+        self.concurrency = concurrency
+        self.timeout = timeout
+        self.transport = transport
+        self._lock = threading.Lock()
+        self._confirmed: Dict[int, Tuple[str, Dict[str, Any]]] = {}  # node_id → (version, config)
+        self._last_results: Dict[int, PushResult] = {}
+
+    def _confirm(self, node_id: int, version: str, config: Dict[str, Any]) -> None:
+        with self._lock:
+            self._confirmed[node_id] = (version, config)
+
+    def _forget(self, node_id: int) -> None:
+        with self._lock:
+            self._confirmed.pop(node_id, None)
+
+    async def _push_one(
+        self,
+        client: httpx.AsyncClient,
+        semaphore: asyncio.Semaphore,
+        target: NodeTarget,
+        config: Dict[str, Any],
+        version: str
+    ) -> PushResult:
+        async with semaphore:
+            started = time.perf_counter()
+            mode = "error"
+            error = None
+            node_version = None
+            try:
+                if cleartext_refused(target.url):
+                    raise ValueError(INSECURE_ERROR)
+                with self._lock:
+                    known = self._confirmed.get(target.id)
+                response = None
+                if known is not None:
+                    base_version, base_config = known
+                    response = await client.patch(f"{target.url}/config", json={
+                        "base_version": base_version,
+                        "version": version,
+                        "diff": diff_configs(base_config, config)
+                    })
+                    mode = "diff"
+
+                if response is None or response.status_code == 409:
+                    # نسخه نود نامعلوم یا متفاوت است
+                    health = await client.get(f"{target.url}/health")
+                    health.raise_for_status()
+                    if health.json().get("version") == version:
+                        response, mode = None, "unchanged"
+                    else:
+                        response = await client.put(f"{target.url}/config", json={"version": version, "config": config})
+                        mode = "full"
+
+                if response is not None:
+                    response.raise_for_status()
+                    if not response.json().get("changed", True):
+                        mode = "unchanged"
+                node_version = version
+                self._confirm(target.id, version, config)
+            except (httpx.HTTPError, ValueError) as e:
+                self._forget(target.id)
+                mode = "error"
+                if isinstance(e, httpx.HTTPStatusError):
+                    try:
+                        error = f"{e.response.status_code}: {e.response.json().get('detail')}"
+                    except ValueError:
+                        error = f"{e.response.status_code}"
+                else:
+                    error = str(e) or type(e).__name__
+                logger.warning(f"Config push to node {target.name} failed: {error}")
+
+            result = PushResult(
+                node_id=target.id,
+                name=target.name,
+                ok=mode != "error",
+                mode=mode,
+                version=node_version,
+                duration_ms=round((time.perf_counter() - started) * 1000, 1),
+                error=error
+            )
+            with self._lock:
+                self._last_results[target.id] = result
+            return result
+
+    async def push(self, config: Dict[str, Any], targets: List[NodeTarget]) -> List[PushResult]:
+        """ارسال همزمان کانفیگ به همه نودها با موازی‌سازی محدود"""
+        if not targets:
+            return []
+        if not self.token:
+            raise RuntimeError("NODE_AGENT_TOKEN is not configured")
+        version = config_version(config)
+        semaphore = asyncio.Semaphore(self.concurrency)
+        async with httpx.AsyncClient(
+            headers={TOKEN_HEADER: self.token},
+            timeout=self.timeout,
+            transport=self.transport,
+            verify=settings.NODE_AGENT_VERIFY_TLS
+        ) as client:
+            return list(await asyncio.gather(*(
+                self._push_one(client, semaphore, target, config, version) for target in targets
+            )))
+
+    def stats(self) -> Dict:
+        with self._lock:
+            return {
+                "concurrency": self.concurrency,
+                "nodes": [asdict(result) for result in self._last_results.values()]
+            }
+
+node_distributor = NodeDistributor(
+    settings.NODE_AGENT_TOKEN,
+    settings.NODE_PUSH_CONCURRENCY,
+    settings.NODE_PUSH_TIMEOUT
+)
+
+def _load_config_and_targets() -> Tuple[Dict[str, Any], List[NodeTarget]]:
+    from backend.database import SessionLocal
+    from backend.xray_config.xray_manager import XrayManager
+
+    with SessionLocal() as db:
+        nodes = db.query(Node).filter(Node.is_active == True).order_by(Node.id).all()
+        if not nodes:
+            return {}, []
+        return XrayManager(db).build_config(), node_targets(nodes)
+
+async def distribute_config() -> List[PushResult]:
+    """ساخت کانفیگ فعلی و ارسال آن به همه نودهای فعال"""
+    if not settings.NODE_AGENT_TOKEN:
+        return []
+    config, targets = await asyncio.to_thread(_load_config_and_targets)
+    results = await node_distributor.push(config, targets)
+    failed = [result.name for result in results if not result.ok]
+    if failed:
+        logger.warning(f"Config distribution failed for nodes: {', '.join(failed)}")
+    return results
@@ -0,0 +1,394 @@
+"""
+بررسی سلامت نودهای خروجی و به‌روزرسانی Node.is_active
+
+- همه نودها همزمان (حداکثر NODE_HEALTH_CONCURRENCY) در سه مرحله بررسی می‌شوند:
+  اتصال TCP به پورت Xray نود، handshake TLS با agent (اگر NODE_AGENT_SCHEME=https)
+  و درخواست /health از agent (اگر NODE_AGENT_TOKEN تنظیم شده باشد و توکن روی http به میزبان
+  غیر loopback فرستاده نشود)
+- پس از NODE_HEALTH_FAILURE_THRESHOLD شکست پیاپی نود غیرفعال (با علامت Node.health_disabled)
+  و با اولین موفقیت دوباره فعال می‌شود؛ نودی که ادمین دستی غیرفعال کرده هیچ‌وقت خودکار فعال نمی‌شود.
+  فاصله بررسی نود خراب تا NODE_HEALTH_MAX_BACKOFF به صورت نمایی زیاد می‌شود
+- فقط یک worker (دارنده flock روی NODE_HEALTH_LOCK_PATH) بررسی می‌کند و نتیجه را در
+  NODE_HEALTH_STATE_PATH می‌نویسد تا بقیه workerها (داشبورد) بدون کوئری از آن بخوانند
+"""
+import asyncio
+import fcntl
+import json
+import logging
+import os
+import ssl
+import time
+from collections import deque
+from dataclasses import asdict, dataclass, field
+from pathlib import Path
+from typing import Deque, Dict, List, Optional, Tuple
+
+import httpx
+from sqlalchemy import update
+
+from backend.config import settings
+from backend.models import Node
+from backend.utils import repeat_every
+from .agent import TOKEN_HEADER
+from .distributor import agent_url, cleartext_refused, distribute_config
+
+logger = logging.getLogger(__name__)
+
+@dataclass(frozen=True)
+class HealthTarget:
+    id: int
+    name: str
+    host: str
+    port: int
+    active: bool
+    health_disabled: bool = False
+
+@dataclass(frozen=True)
+class ProbeResult:
+    ok: bool
+    checked_at: float
+    tcp_ms: Optional[float] = None
+    tls_ms: Optional[float] = None
+    agent_ms: Optional[float] = None
+    version: Optional[str] = None  # نسخه کانفیگ گزارش شده توسط agent
+    error: Optional[str] = None
+
+@dataclass
+class NodeHealth:
+    name: str
+    active: bool
+    health_disabled: bool = False  # غیرفعال شده توسط همین بررسی‌کننده
+    failures: int = 0
+    next_probe: float = 0.0
+    last: Optional[ProbeResult] = None
+    history: Deque[Tuple[float, Optional[float]]] = field(default_factory=deque)  # (زمان، تأخیر TCP یا None برای شکست)
+
+def _elapsed_ms(started: float) -> float:
+    return round((time.perf_counter() - started) * 1000, 1)
+
+def _percentile(values: List[float], fraction: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+class NodeHealthProber:
+    """وضعیت سلامت نودها در حافظه worker بررسی‌کننده"""
+
+    def __init__(
+        self,
+        interval: float,
+        timeout: float,
+        failure_threshold: int,
+        max_backoff: float,
+        concurrency: int,
+        history: int,
+        transport: Optional[httpx.AsyncBaseTransport] = None
+    ):
+        self.interval = interval
+        self.timeout = timeout
+        self.failure_threshold = failure_threshold
+        self.max_backoff = max_backoff
+        self.concurrency = concurrency
+        self.history = history
+        self.transport = transport
+        self._nodes: Dict[int, NodeHealth] = {}
+
+    def _ssl_context(self) -> ssl.SSLContext:
+        context = ssl.create_default_context()
+        if not settings.NODE_AGENT_VERIFY_TLS:
+            context.check_hostname = False
+            context.verify_mode = ssl.CERT_NONE
+        return context
+
+    async def _connect(self, host: str, port: int, context: Optional[ssl.SSLContext] = None) -> None:
+        _, writer = await asyncio.wait_for(
+            asyncio.open_connection(host, port, ssl=context, server_hostname=host if context else None),
+            self.timeout
+        )
+        writer.close()
+        try:
+            await asyncio.wait_for(writer.wait_closed(), self.timeout)
+        except (OSError, asyncio.TimeoutError, ssl.SSLError):
+            pass
+
+    async def probe(self, client: Optional[httpx.AsyncClient], target: HealthTarget) -> ProbeResult:
+        """بررسی مرحله‌ای یک نود؛ در اولین مرحله ناموفق متوقف می‌شود"""
+        checked_at = time.time()
+        timings: Dict[str, Optional[float]] = {"tcp_ms": None, "tls_ms": None, "agent_ms": None}
+        stage = "tcp"
+        try:
+            started = time.perf_counter()
+            await self._connect(target.host, target.port)
+            timings["tcp_ms"] = _elapsed_ms(started)
+
+            if settings.NODE_AGENT_SCHEME == "https":
+                stage = "tls"
+                started = time.perf_counter()
+                await self._connect(target.host, settings.NODE_AGENT_PORT, self._ssl_context())
+                timings["tls_ms"] = _elapsed_ms(started)
+
+            version = None
+            url = agent_url(target.host)
+            if client is not None and not cleartext_refused(url):
+                stage = "agent"
+                started = time.perf_counter()
+                response = await client.get(f"{url}/health")
+                response.raise_for_status()
+                timings["agent_ms"] = _elapsed_ms(started)
+                version = response.json().get("version")
+            return ProbeResult(ok=True, checked_at=checked_at, version=version, **timings)
+        except asyncio.TimeoutError:
+            error = f"{stage}: timed out"
+        except httpx.HTTPStatusError as e:
+            error = f"{stage}: HTTP {e.response.status_code}"
+        except (OSError, ssl.SSLError, httpx.HTTPError, ValueError) as e:
+            error = f"{stage}: {e or type(e).__name__}"
+        return ProbeResult(ok=False, checked_at=checked_at, error=error, **timings)
+
+    def _record(self, target: HealthTarget, result: ProbeResult, now: float) -> Optional[bool]:
+        """
+        ثبت نتیجه و زمان‌بندی بررسی بعدی
+
+        Returns:
+            Optional[bool]: مقدار جدید is_active اگر باید تغییر کند، وگرنه None؛
+            فقط نودی که خود بررسی‌کننده غیرفعال کرده دوباره فعال می‌شود
+        """
+        health = self._nodes[target.id]
+        health.last = result
+        health.history.append((result.checked_at, result.tcp_ms if result.ok else None))
+        while len(health.history) > self.history:
+            health.history.popleft()
+
+        if result.ok:
+            health.failures = 0
+            health.next_probe = now + self.interval
+            if not health.active and health.health_disabled:
+                health.active, health.health_disabled = True, False
+                return True
+            return None
+
+        health.failures += 1
+        # تا رسیدن به آستانه با فاصله عادی تکرار می‌شود، پس از آن فاصله دو برابر می‌شود
+        excess = health.failures - self.failure_threshold
+        delay = self.interval if excess < 0 else min(self.interval * 2 ** (excess + 1), self.max_backoff)
+        health.next_probe = now + delay
+        if health.active and health.failures >= self.failure_threshold:
+            health.active, health.health_disabled = False, True
+            return False
+        return None
+
+    async def run_once(self, targets: List[HealthTarget], now: Optional[float] = None) -> Dict[int, bool]:
+        """
+        بررسی همزمان نودهایی که نوبتشان رسیده است
+
+        Returns:
+            Dict[int, bool]: نودهایی که is_active آنها باید تغییر کند
+        """
+        now = time.monotonic() if now is None else now
+        current = {target.id for target in targets}
+        for node_id in list(self._nodes):
+            if node_id not in current:
+                del self._nodes[node_id]
+
+        due = []
+        for target in targets:
+            health = self._nodes.get(target.id)
+            if health is None:
+                health = self._nodes[target.id] = NodeHealth(
+                    name=target.name, active=target.active, health_disabled=target.health_disabled
+                )
+            else:
+                # وضعیت دیتابیس مرجع است (مثلاً تغییر دستی توسط ادمین)
+                health.name = target.name
+                health.active = target.active
+                health.health_disabled = target.health_disabled
+            if health.next_probe <= now:
+                due.append(target)
+        if not due:
+            return {}
+
+        semaphore = asyncio.Semaphore(self.concurrency)
+        client = None
+        if settings.NODE_AGENT_TOKEN:
+            client = httpx.AsyncClient(
+                headers={TOKEN_HEADER: settings.NODE_AGENT_TOKEN},
+                timeout=self.timeout,
+                transport=self.transport,
+                verify=settings.NODE_AGENT_VERIFY_TLS
+            )
+
+        async def bounded(target: HealthTarget) -> ProbeResult:
+            async with semaphore:
+                return await self.probe(client, target)
+
+        try:
+            results = await asyncio.gather(*(bounded(target) for target in due))
+        finally:
+            if client is not None:
+                await client.aclose()
+
+        changes = {}
+        for target, result in zip(due, results):
+            change = self._record(target, result, now)
+            if change is not None:
+                changes[target.id] = change
+                logger.warning(
+                    f"Node {target.name} marked {'active' if change else 'inactive'}"
+                    + (f": {result.error}" if result.error else "")
+                )
+        return changes
+
+    def snapshot(self) -> Dict:
+        """وضعیت قابل JSON همه نودها برای فایل مشترک بین workerها"""
+        nodes = []
+        for node_id, health in sorted(self._nodes.items()):
+            latencies = [latency for _, latency in health.history if latency is not None]
+            nodes.append({
+                "id": node_id,
+                "name": health.name,
+                "active": health.active,
+                "health_disabled": health.health_disabled,
+                "consecutive_failures": health.failures,
+                "last": asdict(health.last) if health.last else None,
+                "latency_ms": {
+                    "last": latencies[-1] if latencies else None,
+                    "avg": round(sum(latencies) / len(latencies), 1) if latencies else None,
+                    "p95": _percentile(latencies, 0.95) if latencies else None,
+                    "samples": len(health.history),
+                    "loss": round(1 - len(latencies) / len(health.history), 3) if health.history else None
+                },
+                "history": list(health.history)
+            })
+        return {
+            "updated_at": time.time(),
+            "interval": self.interval,
+            "active_nodes": sum(1 for node in nodes if node["active"]),
+            "nodes": nodes
+        }
+
+class LeaderLock:
+    """انتخاب یک worker با flock غیرمسدودکننده؛ قفل تا پایان عمر پردازه نگه داشته می‌شود"""
+
+    def __init__(self, path: Path):
+        self.path = Path(path)
+        self._fd: Optional[int] = None
+
+    def acquire(self) -> bool:
+        if self._fd is not None:
+            return True
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o640)
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            os.close(fd)
+            return False
+        self._fd = fd
+        return True
+
+    def release(self) -> None:
+        if self._fd is not None:
+            fcntl.flock(self._fd, fcntl.LOCK_UN)
+            os.close(self._fd)
+            self._fd = None
+
+node_prober = NodeHealthProber(
+    interval=settings.NODE_HEALTH_INTERVAL,
+    timeout=settings.NODE_HEALTH_TIMEOUT,
+    failure_threshold=settings.NODE_HEALTH_FAILURE_THRESHOLD,
+    max_backoff=settings.NODE_HEALTH_MAX_BACKOFF,
+    concurrency=settings.NODE_HEALTH_CONCURRENCY,
+    history=settings.NODE_HEALTH_HISTORY
+)
+prober_lock = LeaderLock(settings.NODE_HEALTH_LOCK_PATH)
+
+def write_snapshot(snapshot: Dict, path: Optional[Path] = None) -> None:
+    """نوشتن اتمیک وضعیت (فایل موقت و rename) تا خواننده‌ها هیچ‌وقت فایل نیمه‌کاره نبینند"""
+    path = Path(path or settings.NODE_HEALTH_STATE_PATH)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_name(f"{path.name}.{os.getpid()}.tmp")
+    tmp.write_text(json.dumps(snapshot, separators=(",", ":")))
+    os.replace(tmp, path)
+
+_snapshot_cache: Tuple[Optional[int], Optional[Dict]] = (None, None)
+
+def read_snapshot(path: Optional[Path] = None) -> Optional[Dict]:
+    """آخرین وضعیت نوشته شده توسط worker بررسی‌کننده (فقط با تغییر mtime دوباره خوانده می‌شود)"""
+    global _snapshot_cache
+    path = Path(path or settings.NODE_HEALTH_STATE_PATH)
+    try:
+        mtime = path.stat().st_mtime_ns
+        if _snapshot_cache[0] == mtime:
+            return _snapshot_cache[1]
+        snapshot = json.loads(path.read_text())
+    except (OSError, ValueError):
+        return None
+    _snapshot_cache = (mtime, snapshot)
+    return snapshot
+
+def active_node_count() -> Optional[int]:
+    """تعداد نودهای فعال از وضعیت بررسی‌کننده؛ None اگر وضعیت موجود یا تازه نباشد"""
+    snapshot = read_snapshot()
+    if not snapshot:
+        return None
+    if time.time() - snapshot.get("updated_at", 0) > 3 * snapshot.get("interval", settings.NODE_HEALTH_INTERVAL):
+        return None
+    return snapshot.get("active_nodes")
+
+def _load_targets() -> List[HealthTarget]:
+    from backend.database import SessionLocal
+
+    with SessionLocal() as db:
+        rows = db.query(
+            Node.id, Node.name, Node.ip_address, Node.port, Node.is_active, Node.health_disabled
+        ).order_by(Node.id).all()
+    return [
+        HealthTarget(
+            id=row.id,
+            name=row.name,
+            host=row.ip_address,
+            port=row.port,
+            active=bool(row.is_active),
+            health_disabled=bool(row.health_disabled)
+        )
+        for row in rows
+    ]
+
+def _apply_changes(changes: Dict[int, bool]) -> None:
+    from backend.database import SessionLocal
+
+    with SessionLocal() as db:
+        enable = [node_id for node_id, active in changes.items() if active]
+        disable = [node_id for node_id, active in changes.items() if not active]
+        # شرط‌ها تغییر دستی ادمین بین خواندن و نوشتن را بازنویسی نمی‌کنند
+        if enable:
+            db.execute(
+                update(Node)
+                .where(Node.id.in_(enable), Node.is_active == False, Node.health_disabled == True)
+                .values(is_active=True, health_disabled=False)
+            )
+        if disable:
+            db.execute(
+                update(Node)
+                .where(Node.id.in_(disable), Node.is_active == True)
+                .values(is_active=False, health_disabled=True)
+            )
+        db.commit()
+
+async def probe_nodes() -> Dict[int, bool]:
+    """یک دور بررسی سلامت، ثبت تغییرات is_active و انتشار وضعیت برای workerهای دیگر"""
+    targets = await asyncio.to_thread(_load_targets)
+    changes = await node_prober.run_once(targets)
+    if changes:
+        await asyncio.to_thread(_apply_changes, changes)
+    await asyncio.to_thread(write_snapshot, node_prober.snapshot())
+    if any(changes.values()):
+        # نود برگشته ممکن است کانفیگ‌های زمان قطعی را نگرفته باشد
+        await distribute_config()
+    return changes
+
+@repeat_every(seconds=settings.NODE_HEALTH_INTERVAL)
+async def periodic_node_health():
+    """وظیفه دوره‌ای بررسی سلامت نودها؛ workerهای غیر از دارنده قفل کاری نمی‌کنند"""
+    if not await asyncio.to_thread(prober_lock.acquire):
+        return
+    await probe_nodes()
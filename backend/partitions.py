@@ -0,0 +1,195 @@
+"""
+نگهداری پارتیشن‌های ماهانه جداول پرحجم (traffic_history و connection_events)
+
+روی Postgres هر جدول بر اساس ستون زمان به صورت RANGE ماهانه پارتیشن‌بندی شده است:
+- پارتیشن ماه جاری و PARTITION_PREMAKE_MONTHS ماه آینده از قبل ساخته می‌شوند
+- پارتیشن‌های قدیمی‌تر از دوره نگهداری DETACH و DROP می‌شوند؛ حذف داده قدیمی
+  هرگز DELETE سراسری و VACUUM بعد از آن را لازم ندارد
+
+روی دیتابیس‌های دیگر (SQLite در توسعه) جدول پارتیشن ندارد و داده قدیمی با DELETE بازه‌ای حذف می‌شود.
+"""
+import asyncio
+import logging
+import re
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple
+
+from sqlalchemy import text, inspect
+from sqlalchemy.engine import Connection, Engine
+
+from backend.config import settings
+from backend.utils import repeat_every
+
+logger = logging.getLogger(__name__)
+
+# جدول → ستون زمان (کلید پارتیشن)
+PARTITIONED_TABLES = {
+    "traffic_history": "recorded_at",
+    "connection_events": "occurred_at",
+}
+
+# کلید advisory lock تا فقط یک worker در هر زمان پارتیشن‌ها را تغییر دهد
+PARTITION_LOCK_KEY = 7_342_002
+# DETACH/DROP قفل انحصاری می‌گیرند؛ اگر قفل سریع به دست نیاید در اجرای بعدی تلاش می‌شود
+LOCK_TIMEOUT = "5s"
+
+_PARTITION_PATTERN = re.compile(r"^(?P<table>.+)_p(?P<year>\d{4})(?P<month>\d{2})$")
+
+def retention_months(table: str) -> int:
+    if table == "connection_events":
+        return settings.CONNECTION_EVENTS_RETENTION_MONTHS
+    return settings.TRAFFIC_HISTORY_RETENTION_MONTHS
+
+def month_start(value: datetime) -> datetime:
+    return value.replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+
+def add_months(value: datetime, months: int) -> datetime:
+    """جابجایی ابتدای ماه به اندازه months ماه (مقدار منفی برای گذشته)"""
+    index = value.year * 12 + value.month - 1 + months
+    return value.replace(year=index // 12, month=index % 12 + 1)
+
+def partition_name(table: str, month: datetime) -> str:
+    return f"{table}_p{month:%Y%m}"
+
+def parse_partition_name(name: str) -> Optional[Tuple[str, datetime]]:
+    """(جدول، ابتدای ماه) از نام پارتیشن؛ None برای پارتیشن‌هایی که این ماژول نساخته است"""
+    match = _PARTITION_PATTERN.match(name)
+    if not match:
+        return None
+    return match.group("table"), datetime(int(match.group("year")), int(match.group("month")), 1)
+
+def list_partitions(conn: Connection, table: str) -> List[Tuple[str, datetime]]:
+    """پارتیشن‌های ماهانه یک جدول به ترتیب زمانی"""
+    rows = conn.execute(text("""
+        SELECT child.relname
+        FROM pg_inherits
+        JOIN pg_class parent ON parent.oid = pg_inherits.inhparent
+        JOIN pg_class child ON child.oid = pg_inherits.inhrelid
+        WHERE parent.relname = :table
+    """), {"table": table}).scalars()
+    partitions = []
+    for name in rows:
+        parsed = parse_partition_name(name)
+        if parsed and parsed[0] == table:
+            partitions.append((name, parsed[1]))
+    return sorted(partitions, key=lambda item: item[1])
+
+def ensure_partitions(
+    conn: Connection,
+    table: str,
+    months_ahead: Optional[int] = None,
+    now: Optional[datetime] = None
+) -> List[str]:
+    """ساخت پارتیشن ماه جاری و ماه‌های آینده در صورت نبود؛ نام پارتیشن‌های ساخته شده را برمی‌گرداند"""
+    months_ahead = settings.PARTITION_PREMAKE_MONTHS if months_ahead is None else months_ahead
+    current = month_start(now or datetime.utcnow())
+    existing = {name for name, _ in list_partitions(conn, table)}
+    created = []
+    for offset in range(months_ahead + 1):
+        start = add_months(current, offset)
+        name = partition_name(table, start)
+        if name in existing:
+            continue
+        end = add_months(start, 1)
+        conn.execute(text(
+            f"CREATE TABLE IF NOT EXISTS {name} PARTITION OF {table} "
+            f"FOR VALUES FROM ('{start:%Y-%m-%d %H:%M:%S}') TO ('{end:%Y-%m-%d %H:%M:%S}')"
+        ))
+        created.append(name)
+    return created
+
+def prune_partitions(
+    conn: Connection,
+    table: str,
+    keep_months: Optional[int] = None,
+    now: Optional[datetime] = None
+) -> List[str]:
+    """
+    جدا کردن و حذف پارتیشن‌هایی که کاملاً خارج از دوره نگهداری هستند
+
+    ماه جاری به همراه keep_months ماه کامل قبل از آن نگه داشته می‌شوند.
+    """
+    keep_months = retention_months(table) if keep_months is None else keep_months
+    cutoff = add_months(month_start(now or datetime.utcnow()), -keep_months)
+    dropped = []
+    for name, start in list_partitions(conn, table):
+        if add_months(start, 1) > cutoff:
+            break
+        conn.execute(text(f"ALTER TABLE {table} DETACH PARTITION {name}"))
+        conn.execute(text(f"DROP TABLE {name}"))
+        dropped.append(name)
+    return dropped
+
+def _prune_rows(conn: Connection, table: str, now: Optional[datetime] = None) -> int:
+    """حذف بازه‌ای داده قدیمی روی دیتابیس‌های بدون پارتیشن"""
+    cutoff = add_months(month_start(now or datetime.utcnow()), -retention_months(table))
+    column = PARTITIONED_TABLES[table]
+    result = conn.execute(text(f"DELETE FROM {table} WHERE {column} < :cutoff"), {"cutoff": cutoff})
+    return result.rowcount or 0
+
+def maintain_partitions(engine: Optional[Engine] = None, now: Optional[datetime] = None) -> Dict:
+    """
+    ساخت پارتیشن‌های آینده و حذف پارتیشن‌های منقضی همه جداول
+
+    Returns:
+        Dict: پارتیشن‌های ساخته و حذف شده هر جدول؛ skipped اگر worker دیگری در حال اجرا باشد
+    """
+    if engine is None:
+        from backend.database import get_engine
+        engine = get_engine()
+    result: Dict = {"created": {}, "dropped": {}}
+
+    with engine.begin() as conn:
+        is_postgres = conn.dialect.name == "postgresql"
+        if is_postgres:
+            acquired = conn.execute(
+                text("SELECT pg_try_advisory_xact_lock(:key)"), {"key": PARTITION_LOCK_KEY}
+            ).scalar()
+            if not acquired:
+                return {"skipped": True}
+            conn.execute(text(f"SET LOCAL lock_timeout = '{LOCK_TIMEOUT}'"))
+
+        for table in PARTITIONED_TABLES:
+            if not inspect(conn).has_table(table):
+                continue
+            if is_postgres:
+                result["created"][table] = ensure_partitions(conn, table, now=now)
+                result["dropped"][table] = prune_partitions(conn, table, now=now)
+            else:
+                result["dropped"][table] = _prune_rows(conn, table, now=now)
+
+    for table, names in result["created"].items():
+        if names:
+            logger.info(f"Created partitions for {table}: {', '.join(names)}")
+    for table, names in result["dropped"].items():
+        if names and is_postgres:
+            logger.info(f"Dropped expired partitions of {table}: {', '.join(names)}")
+    return result
+
+def partition_status(engine: Optional[Engine] = None) -> Dict:
+    """پارتیشن‌های موجود هر جدول و اینکه ماه‌های آینده از قبل ساخته شده‌اند یا نه"""
+    if engine is None:
+        from backend.database import get_engine
+        engine = get_engine()
+    current = month_start(datetime.utcnow())
+    status = {}
+    with engine.connect() as conn:
+        if conn.dialect.name != "postgresql":
+            return {"partitioned": False}
+        for table in PARTITIONED_TABLES:
+            partitions = list_partitions(conn, table)
+            months = {start for _, start in partitions}
+            status[table] = {
+                "partitions": [name for name, _ in partitions],
+                "retention_months": retention_months(table),
+                "future_ready": all(
+                    add_months(current, offset) in months
+                    for offset in range(settings.PARTITION_PREMAKE_MONTHS + 1)
+                )
+            }
+    return {"partitioned": True, "tables": status}
+
+@repeat_every(seconds=settings.PARTITION_MAINTENANCE_INTERVAL)
+async def periodic_partition_maintenance():
+    """وظیفه دوره‌ای ساخت پارتیشن‌های آینده و حذف پارتیشن‌های منقضی"""
+    await asyncio.to_thread(maintain_partitions)
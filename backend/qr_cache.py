@@ -0,0 +1,216 @@
+"""
+کش QR codeهای رندر شده (حافظه + دیسک) با آدرس‌دهی بر اساس محتوا
+
+کلید هر QR هش blake2b از (فرمت، متن) است؛ چون خروجی برای یک کلید هرگز تغییر نمی‌کند،
+endpoint مربوطه می‌تواند هدر cache طولانی و immutable برگرداند.
+
+- register(text) فقط کلید را می‌سازد و متن را ثبت می‌کند (بدون رندر)؛ صفحه کاربر از این استفاده می‌کند
+- render(key, fmt) هنگام درخواست تصویر، QR را رندر و در حافظه و دیسک ذخیره می‌کند
+- prune() لایه دیسک را به QR_CACHE_DISK_MAX_MB و QR_CACHE_DISK_MAX_FILES محدود می‌کند؛ فایل‌هایی
+  که مدت بیشتری استفاده نشده‌اند (mtime؛ با هر خواندن به‌روز می‌شود) اول حذف می‌شوند
+"""
+import asyncio
+import hashlib
+import io
+import logging
+import os
+import threading
+from collections import OrderedDict
+from pathlib import Path
+from typing import Dict, Optional, Tuple
+
+import qrcode
+import qrcode.image.svg
+
+from backend.config import settings
+from backend.utils import repeat_every
+
+logger = logging.getLogger(__name__)
+
+QR_FORMATS = {
+    "png": "image/png",
+    "svg": "image/svg+xml",
+}
+
+# طول کلید به هگز (۱۲۸ بیت؛ حدس زدن کلید یک لینک ممکن نیست)
+KEY_SIZE = 16
+
+def qr_key(text: str) -> str:
+    return hashlib.blake2b(text.encode(), digest_size=KEY_SIZE).hexdigest()
+
+def render_qr(text: str, fmt: str = "png") -> bytes:
+    """رندر QR code به PNG یا SVG"""
+    qr = qrcode.QRCode(
+        version=1,
+        error_correction=qrcode.constants.ERROR_CORRECT_L,
+        box_size=10,
+        border=4,
+        image_factory=qrcode.image.svg.SvgPathImage if fmt == "svg" else None
+    )
+    qr.add_data(text)
+    qr.make(fit=True)
+    buffered = io.BytesIO()
+    if fmt == "svg":
+        qr.make_image().save(buffered)
+    else:
+        qr.make_image(fill_color="black", back_color="white").save(buffered, format="PNG")
+    return buffered.getvalue()
+
+class QRCache:
+    """LRU در حافظه بر اساس تعداد و یک لایه دیسک که بین workerها و ری‌استارت‌ها مشترک است"""
+
+    def __init__(self, directory: Path, max_entries: int, disk_max_bytes: int, disk_max_files: int):
+        self.directory = Path(directory)
+        self.max_entries = max_entries
+        self.disk_max_bytes = disk_max_bytes
+        self.disk_max_files = disk_max_files
+        self._lock = threading.Lock()
+        self._images: "OrderedDict[Tuple[str, str], bytes]" = OrderedDict()
+        self._texts: "OrderedDict[str, str]" = OrderedDict()
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.renders = 0
+        self.pruned = 0
+
+    def _path(self, key: str, suffix: str) -> Path:
+        return self.directory / key[:2] / f"{key}.{suffix}"
+
+    def _write(self, path: Path, data: bytes) -> None:
+        """نوشتن اتمیک روی دیسک؛ خطا فقط لاگ می‌شود چون دیسک یک لایه اختیاری است"""
+        try:
+            path.parent.mkdir(parents=True, exist_ok=True)
+            tmp = path.with_name(f".{path.name}.{os.getpid()}.tmp")
+            tmp.write_bytes(data)
+            os.replace(tmp, path)
+        except OSError as e:
+            logger.warning(f"Could not write QR cache file {path}: {str(e)}")
+
+    def _remember(self, store: OrderedDict, key, value) -> None:
+        store[key] = value
+        store.move_to_end(key)
+        while len(store) > self.max_entries:
+            store.popitem(last=False)
+
+    def register(self, text: str) -> str:
+        """ثبت متن و برگرداندن کلید آن بدون رندر"""
+        key = qr_key(text)
+        with self._lock:
+            self._remember(self._texts, key, text)
+        # فایل متن ممکن است توسط prune (در هر worker) حذف شده باشد؛ بدون آن workerهای دیگر تصویر را نمی‌شناسند
+        path = self._path(key, "txt")
+        if not self._touch(path):
+            self._write(path, text.encode())
+        return key
+
+    def _touch(self, path: Path) -> bool:
+        """به‌روز کردن زمان استفاده فایل برای prune؛ False اگر فایل وجود نداشت"""
+        try:
+            os.utime(path)
+            return True
+        except OSError:
+            return False
+
+    def text_for(self, key: str) -> Optional[str]:
+        with self._lock:
+            text = self._texts.get(key)
+        if text is not None:
+            return text
+        try:
+            text = self._path(key, "txt").read_text()
+        except (OSError, UnicodeDecodeError):
+            return None
+        with self._lock:
+            self._remember(self._texts, key, text)
+        return text
+
+    def render(self, key: str, fmt: str) -> Optional[bytes]:
+        """تصویر QR یک کلید ثبت شده؛ None اگر کلید ناشناخته باشد"""
+        with self._lock:
+            image = self._images.get((key, fmt))
+            if image is not None:
+                self._images.move_to_end((key, fmt))
+                self.memory_hits += 1
+                return image
+
+        path = self._path(key, fmt)
+        try:
+            image = path.read_bytes()
+            self._touch(path)
+            with self._lock:
+                self.disk_hits += 1
+        except OSError:
+            text = self.text_for(key)
+            if text is None:
+                return None
+            image = render_qr(text, fmt)
+            self._write(path, image)
+            with self._lock:
+                self.renders += 1
+
+        with self._lock:
+            self._remember(self._images, (key, fmt), image)
+        return image
+
+    def get_or_render(self, text: str, fmt: str = "png") -> bytes:
+        return self.render(self.register(text), fmt)
+
+    def prune(self) -> int:
+        """حذف قدیمی‌ترین فایل‌های دیسک تا حجم و تعداد زیر سقف بیاید؛ تعداد فایل‌های حذف شده را برمی‌گرداند"""
+        files = []
+        total = 0
+        for path in self.directory.glob("*/*"):
+            try:
+                info = path.stat()
+            except OSError:
+                continue
+            files.append((info.st_mtime, info.st_size, path))
+            total += info.st_size
+
+        removed = 0
+        files.sort()
+        count = len(files)
+        for _, size, path in files:
+            if total <= self.disk_max_bytes and count <= self.disk_max_files:
+                break
+            try:
+                path.unlink()
+                removed += 1
+            except FileNotFoundError:
+                pass
+            except OSError as e:
+                logger.warning(f"Could not prune QR cache file {path}: {str(e)}")
+                continue
+            total -= size
+            count -= 1
+        if removed:
+            with self._lock:
+                self.pruned += removed
+            logger.info(f"Pruned {removed} QR cache files")
+        return removed
+
+    def stats(self) -> Dict:
+        with self._lock:
+            return {
+                "entries": len(self._images),
+                "max_entries": self.max_entries,
+                "memory_hits": self.memory_hits,
+                "disk_hits": self.disk_hits,
+                "renders": self.renders,
+                "pruned_files": self.pruned
+            }
+
+qr_cache = QRCache(
+    settings.QR_CACHE_DIR,
+    settings.QR_CACHE_SIZE,
+    settings.QR_CACHE_DISK_MAX_MB * 1024 * 1024,
+    settings.QR_CACHE_DISK_MAX_FILES
+)
+
+@repeat_every(seconds=settings.QR_CACHE_PRUNE_INTERVAL)
+async def periodic_qr_cache_prune():
+    """وظیفه دوره‌ای محدود کردن لایه دیسک کش QR"""
+    await asyncio.to_thread(qr_cache.prune)
+
+def qr_url(text: str, fmt: str = "png") -> str:
+    """آدرس تصویر QR برای استفاده در صفحات (رندر در اولین درخواست تصویر انجام می‌شود)"""
+    return f"/qr/{qr_cache.register(text)}.{fmt}"
@@ -0,0 +1,106 @@
+"""
+محدودیت نرخ درخواست با token bucket برای endpointهای عمومی (/login و /sub)
+
+/sub با dependencyهای limit_by_ip و limit_subscription محدود می‌شود؛ فرم /login مستقیماً
+login_limiter.acquire را صدا می‌زند تا خطا در همان صفحه ورود نمایش داده شود.
+
+- هر کلید (IP یا UUID) یک سطل با ظرفیت burst دارد که با نرخ ثابت پر می‌شود
+- سطل‌ها درون‌پردازه‌ای هستند؛ با چند worker سقف واقعی تا تعداد workerها برابر است
+- تعداد کلیدها محدود است و قدیمی‌ترین سطل‌ها حذف می‌شوند (سطل حذف شده دوباره پر شروع می‌شود)
+"""
+import math
+import threading
+import time
+from collections import OrderedDict
+from typing import Callable, Dict, Optional
+
+from fastapi import HTTPException, Request, status
+
+from backend.config import settings
+
+# IP آدرس‌هایی که از nginx روی همین سرور می‌آیند و هدر X-Real-IP آنها قابل اعتماد است
+TRUSTED_PROXIES = ("127.0.0.1", "::1")
+
+class TokenBucketLimiter:
+    """token bucket برای هر کلید؛ rate توکن در دقیقه و حداکثر burst توکن ذخیره"""
+
+    def __init__(self, name: str, rate_per_minute: float, burst: int, max_keys: int = 100000):
+        self.name = name
+        self.rate = rate_per_minute / 60.0
+        self.burst = burst
+        self.max_keys = max_keys
+        self._lock = threading.Lock()
+        self._buckets: "OrderedDict[str, list]" = OrderedDict()  # key → [tokens, updated_at]
+        self.allowed = 0
+        self.rejected = 0
+
+    def acquire(self, key: str) -> Optional[float]:
+        """گرفتن یک توکن؛ None اگر مجاز باشد وگرنه ثانیه‌های لازم تا توکن بعدی"""
+        now = time.monotonic()
+        with self._lock:
+            bucket = self._buckets.get(key)
+            if bucket is None:
+                bucket = self._buckets[key] = [float(self.burst), now]
+                while len(self._buckets) > self.max_keys:
+                    self._buckets.popitem(last=False)
+            else:
+                bucket[0] = min(self.burst, bucket[0] + (now - bucket[1]) * self.rate)
+                bucket[1] = now
+                self._buckets.move_to_end(key)
+
+            if bucket[0] >= 1:
+                bucket[0] -= 1
+                self.allowed += 1
+                return None
+            self.rejected += 1
+            return (1 - bucket[0]) / self.rate
+
+    def stats(self) -> Dict:
+        with self._lock:
+            return {
+                "name": self.name,
+                "rate_per_minute": self.rate * 60,
+                "burst": self.burst,
+                "keys": len(self._buckets),
+                "allowed": self.allowed,
+                "rejected": self.rejected
+            }
+
+def client_ip(request: Request) -> str:
+    """IP کلاینت؛ پشت nginx محلی از X-Real-IP خوانده می‌شود"""
+    host = request.client.host if request.client else "unknown"
+    if host in TRUSTED_PROXIES:
+        return request.headers.get("x-real-ip") or host
+    return host
+
+def _reject(retry_after: float) -> HTTPException:
+    return HTTPException(
+        status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+        detail="تعداد درخواست‌ها بیش از حد مجاز است",
+        headers={"Retry-After": str(max(1, math.ceil(retry_after)))}
+    )
+
+def rate_limit(limiter: TokenBucketLimiter, key: Callable[[Request], str] = client_ip):
+    """dependency برای محدود کردن یک route؛ در صورت عبور از سقف پاسخ 429 با Retry-After"""
+    async def dependency(request: Request) -> None:
+        retry_after = limiter.acquire(key(request))
+        if retry_after is not None:
+            raise _reject(retry_after)
+    return dependency
+
+# هر IP روی endpointهای سابسکریپشن
+ip_limiter = TokenBucketLimiter("ip", settings.RATE_LIMIT, settings.RATE_LIMIT_BURST)
+# هر UUID سابسکریپشن (کلاینت‌های زیاد پشت IPهای مختلف با یک لینک)
+subscription_limiter = TokenBucketLimiter(
+    "subscription",
+    settings.SUBSCRIPTION_RATE_LIMIT,
+    settings.SUBSCRIPTION_RATE_LIMIT_BURST
+)
+# تلاش‌های ورود هر IP
+login_limiter = TokenBucketLimiter("login", settings.LOGIN_RATE_LIMIT, settings.LOGIN_RATE_LIMIT_BURST)
+
+limit_by_ip = rate_limit(ip_limiter)
+limit_subscription = rate_limit(subscription_limiter, lambda request: request.path_params.get("uuid", ""))
+
+def limiter_stats() -> Dict:
+    return {limiter.name: limiter.stats() for limiter in (ip_limiter, subscription_limiter, login_limiter)}
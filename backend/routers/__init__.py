@@ -1,9 +1,17 @@
 from .xray import router as xray_router
 from .domain_router import router as domain_router
 from .user_routes import router as user_router
+from .metrics import router as metrics_router
+from .subscription import router as subscription_router
+from .qr import router as qr_router
+from .nodes import router as nodes_router
 
 __all__ = [
     "xray_router",
     "domain_router",
     "user_router",
+    "metrics_router",
+    "subscription_router",
+    "qr_router",
+    "nodes_router",
 ]
@@ -0,0 +1,43 @@
+from fastapi import APIRouter, Depends
+import asyncio
+from typing import Dict
+from backend.hashing import password_hasher
+from backend.db_pool import pool_stats
+from backend.partitions import partition_status
+from backend.qr_cache import qr_cache
+from backend.rate_limit import limiter_stats
+from backend.users.user_cache import user_cache
+from backend.users.subscription_bundle import render_flight, subscription_store
+from backend.utils import get_current_user
+
+router = APIRouter(prefix="/api/v1/metrics", tags=["Metrics"], dependencies=[Depends(get_current_user)])
+
+@router.get("/auth", response_model=Dict)
+async def auth_metrics():
+    """عمق صف و تأخیر هش/بررسی رمز عبور (برای مشاهده هجوم درخواست‌های ورود)"""
+    return password_hasher.stats()
+
+@router.get("/db-pool", response_model=Dict)
+async def db_pool_metrics():
+    """زمان انتظار checkout، تعداد انتظارها و اتصال‌های طولانی هر connection pool"""
+    return pool_stats()
+
+@router.get("/user-cache", response_model=Dict)
+async def user_cache_metrics():
+    """اندازه و نرخ hit کش رکوردهای کاربران در این worker"""
+    return {**user_cache.stats(), "subscription_store": subscription_store.stats()}
+
+@router.get("/partitions", response_model=Dict)
+async def partition_metrics():
+    """پارتیشن‌های ماهانه جداول تاریخچه و آماده بودن پارتیشن‌های ماه‌های آینده"""
+    return await asyncio.to_thread(partition_status)
+
+@router.get("/qr-cache", response_model=Dict)
+async def qr_cache_metrics():
+    """نرخ hit حافظه/دیسک و تعداد رندرهای QR در این worker"""
+    return qr_cache.stats()
+
+@router.get("/rate-limit", response_model=Dict)
+async def rate_limit_metrics():
+    """درخواست‌های مجاز/رد شده هر limiter و رندرهای ادغام شده سابسکریپشن در این worker"""
+    return {**limiter_stats(), "subscription_renders": render_flight.stats()}
@@ -0,0 +1,36 @@
+import asyncio
+from dataclasses import asdict
+from typing import Dict
+from fastapi import APIRouter, Depends, HTTPException, status
+from backend import schemas
+from backend.config import settings
+from backend.nodes.distributor import distribute_config, node_distributor
+from backend.nodes.health import read_snapshot
+from backend.utils import get_current_user
+
+router = APIRouter(prefix="/api/v1/nodes", tags=["Nodes"])
+
+@router.post("/sync", response_model=Dict)
+async def sync_nodes(current_user: schemas.User = Depends(get_current_user)):
+    """ارسال فوری کانفیگ فعلی به همه نودهای فعال (فقط diff برای نودهای به‌روز)"""
+    if not settings.NODE_AGENT_TOKEN:
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail="NODE_AGENT_TOKEN تنظیم نشده است"
+        )
+    results = await distribute_config()
+    return {
+        "nodes": [asdict(result) for result in results],
+        "failed": sum(1 for result in results if not result.ok)
+    }
+
+@router.get("/status", response_model=Dict)
+async def nodes_status(current_user: schemas.User = Depends(get_current_user)):
+    """نتیجه آخرین ارسال کانفیگ به هر نود در این worker"""
+    return node_distributor.stats()
+
+@router.get("/health", response_model=Dict)
+async def nodes_health(current_user: schemas.User = Depends(get_current_user)):
+    """آخرین نتیجه بررسی سلامت نودها و تاریخچه تأخیر هر نود"""
+    snapshot = await asyncio.to_thread(read_snapshot)
+    return snapshot or {"updated_at": None, "active_nodes": None, "nodes": []}
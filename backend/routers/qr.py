@@ -0,0 +1,30 @@
+from fastapi import APIRouter, HTTPException, Request, Response, status
+import asyncio
+from backend.qr_cache import QR_FORMATS, KEY_SIZE, qr_cache
+
+router = APIRouter(prefix="/qr", tags=["QR"])
+
+# محتوای هر کلید هرگز تغییر نمی‌کند
+CACHE_CONTROL = "public, max-age=31536000, immutable"
+
+@router.get("/{key}.{fmt}")
+async def qr_image(key: str, fmt: str, request: Request):
+    """تصویر QR یک لینک ثبت شده (PNG یا SVG)"""
+    if fmt not in QR_FORMATS:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"فرمت نامعتبر. باید یکی از این موارد باشد: {', '.join(QR_FORMATS)}"
+        )
+    if len(key) != KEY_SIZE * 2 or any(c not in "0123456789abcdef" for c in key):
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="QR code یافت نشد")
+
+    etag = f'"{key}-{fmt}"'
+    headers = {"Cache-Control": CACHE_CONTROL, "ETag": etag}
+    if request.headers.get("if-none-match") == etag:
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+
+    # رندر و دسترسی به دیسک خارج از event loop
+    image = await asyncio.to_thread(qr_cache.render, key, fmt)
+    if image is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="QR code یافت نشد")
+    return Response(content=image, media_type=QR_FORMATS[fmt], headers=headers)
@@ -0,0 +1,74 @@
+from typing import Dict, Optional
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, Response, status
+from sqlalchemy.ext.asyncio import AsyncSession
+from backend.config import settings
+from backend.database import get_async_db
+from backend.rate_limit import limit_by_ip, limit_subscription
+from backend.users.subscription_bundle import (
+    SubscriptionUserInfo,
+    etag_matches,
+    get_subscription_bundle,
+    get_subscription_userinfo
+)
+from backend.xray_config.subscription_formats import negotiate_format
+
+# محدودیت نرخ بر اساس IP و UUID برای جلوگیری از هجوم کلاینت‌ها (مثلاً پس از ری‌استارت نود)
+router = APIRouter(tags=["Subscription"], dependencies=[Depends(limit_by_ip), Depends(limit_subscription)])
+
+def _check_access(found: Optional[object], active: bool) -> None:
+    if found is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="سابسکریپشن یافت نشد")
+    if not active:
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="سابسکریپشن غیرفعال یا منقضی شده است")
+
+def _userinfo_headers(info: Optional[SubscriptionUserInfo]) -> Dict[str, str]:
+    headers = {"profile-update-interval": str(settings.SUBSCRIPTION_UPDATE_INTERVAL)}
+    if info is not None:
+        headers["subscription-userinfo"] = info.header
+    return headers
+
+@router.get("/sub/{uuid}")
+async def subscription_feed(
+    uuid: str,
+    request: Request,
+    format: Optional[str] = Query(None, description="v2rayn (base64)، clash یا singbox"),
+    configs: Optional[str] = Query(None, description="محدود کردن به این دامنه‌ها (جدا شده با کاما)"),
+    db: AsyncSession = Depends(get_async_db)
+):
+    """
+    لینک‌های اشتراک کاربر برای کلاینت‌ها
+
+    فرمت از پارامتر format و در نبود آن از User-Agent تعیین می‌شود (پیش‌فرض base64 برای v2rayN).
+    اتصال‌ها روی همه دامنه‌های کاربر (و آدرس‌های CDN دامنه‌های پشت CDN) گسترش می‌یابند.
+    اگر بسته در کش معتبر باشد هیچ کوئری اجرا نمی‌شود (AsyncSession تا اولین کوئری اتصالی نمی‌گیرد)
+    و If-None-Match منطبق پاسخ 304 می‌گیرد.
+    """
+    try:
+        fmt = negotiate_format(format, request.headers.get("user-agent"))
+    except ValueError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+
+    domains = [name.strip() for name in configs.split(",") if name.strip()] if configs else None
+    bundle = await get_subscription_bundle(db, uuid, fmt, domains)
+    _check_access(bundle, bundle is not None and bundle.active)
+
+    headers = {
+        "ETag": bundle.etag,
+        "Cache-Control": "no-cache",
+        "Vary": "User-Agent",
+        **_userinfo_headers(await get_subscription_userinfo(db, uuid))
+    }
+    if etag_matches(request.headers.get("if-none-match"), bundle.etag):
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+    return Response(content=bundle.body, media_type=bundle.media_type, headers=headers)
+
+@router.head("/sub/{uuid}")
+async def subscription_userinfo(uuid: str, db: AsyncSession = Depends(get_async_db)):
+    """
+    فقط هدرهای مصرف و انقضا برای کلاینت‌هایی که برای به‌روزرسانی وضعیت درخواست HEAD می‌فرستند
+
+    هیچ کانفیگی رندر نمی‌شود و اطلاعات از کش رکورد کاربران یا فایل مشترک خوانده می‌شود.
+    """
+    info = await get_subscription_userinfo(db, uuid)
+    _check_access(info, info is not None and info.active)
+    return Response(headers={"Cache-Control": "no-cache", **_userinfo_headers(info)})
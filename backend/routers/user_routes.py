@@ -1,12 +1,22 @@
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, HTTPException, status, Query
 from sqlalchemy.orm import Session
-from backend.database import get_db
-from backend.schemas import UserCreate, UserUpdate, UserResponse
-from backend.user.user_manager import UserManager
-from typing import List
+from sqlalchemy.ext.asyncio import AsyncSession
+from backend.database import get_db, get_read_db, get_async_read_db
+from backend.schemas import UserCreate, UserResponse, UserPage, BulkUserCreate, BulkUserResult
+from backend.users.user_manager import UserManager, UserUpdate
+from backend.users.user_listing import (
+    paginate_users_async,
+    serialize_user_summary,
+    DEFAULT_PAGE_SIZE,
+    MAX_PAGE_SIZE
+)
+from backend.users.user_search import search_users, DEFAULT_SEARCH_LIMIT, MAX_SEARCH_LIMIT
+from typing import List, Optional
 from backend.models import User
+from backend.utils import get_current_user
 
-router = APIRouter(prefix="/users", tags=["Users"])
+# UUID کاربر همان اعتبار /sub است؛ همه مسیرها فقط برای ادمین لاگین کرده
+router = APIRouter(prefix="/users", tags=["Users"], dependencies=[Depends(get_current_user)])
 
 @router.post("/", response_model=UserResponse)
 def create_user(user_data: UserCreate, db: Session = Depends(get_db)):
@@ -14,6 +24,14 @@ def create_user(user_data: UserCreate, db: Session = Depends(get_db)):
     user = manager.create(user_data)
     return user
 
+@router.post("/bulk", response_model=BulkUserResult)
+def bulk_create_users(payload: BulkUserCreate, db: Session = Depends(get_db)):
+    """ایجاد دسته‌ای کاربران؛ خطای هر ردیف جداگانه گزارش می‌شود"""
+    try:
+        return UserManager(db).bulk_create(payload.users)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
 @router.put("/{user_id}", response_model=UserResponse)
 def update_user(user_id: int, user_data: UserUpdate, db: Session = Depends(get_db)):
     manager = UserManager(db)
@@ -30,10 +48,38 @@ def delete_user(user_id: int, db: Session = Depends(get_db)):
         raise HTTPException(status_code=404, detail="کاربر یافت نشد")
     return
 
-@router.get("/", response_model=List[UserResponse])
-def list_users(db: Session = Depends(get_db)):
-    users = db.query(User).all()
-    return users
+@router.get("/", response_model=UserPage)
+async def list_users(
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    cursor: Optional[str] = Query(None, description="cursor صفحه قبل"),
+    status: Optional[str] = Query(None, description="active, expired, online, over_quota"),
+    sort: str = Query("id", description="id, username, created_at"),
+    order: str = Query("asc", description="asc یا desc"),
+    db: AsyncSession = Depends(get_async_read_db)
+):
+    """لیست کاربران با صفحه‌بندی cursor و فیلتر سمت سرور"""
+    try:
+        users, next_cursor = await paginate_users_async(db, limit, cursor, status, sort, order)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return {
+        "users": [serialize_user_summary(u) for u in users],
+        "next_cursor": next_cursor,
+        "limit": limit
+    }
+
+@router.get("/search")
+def search(
+    q: str = Query(..., min_length=1, max_length=100, description="بخشی از نام کاربری، ایمیل یا UUID"),
+    limit: int = Query(DEFAULT_SEARCH_LIMIT, ge=1, le=MAX_SEARCH_LIMIT),
+    db: Session = Depends(get_read_db)
+):
+    """جستجوی رتبه‌بندی شده کاربران"""
+    results = search_users(db, q, limit)
+    return {
+        "query": q,
+        "users": [{**serialize_user_summary(u), "score": round(score, 3)} for u, score in results]
+    }
 
 @router.get("/{user_id}", response_model=UserResponse)
 def get_user(user_id: int, db: Session = Depends(get_db)):
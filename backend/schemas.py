@@ -40,6 +40,48 @@ class UserResponse(UserBase):
 class User(UserResponse):
     pass
 
+class UserSummary(BaseModel):
+    """ردیف سبک کاربر در لیست‌های صفحه‌بندی شده"""
+    id: int
+    username: str
+    email: Optional[str] = None
+    uuid: Optional[str] = None
+    is_active: bool
+    is_online: bool = False
+    traffic_limit: int = 0
+    traffic_used: int = 0
+    simultaneous_connections: Optional[int] = None
+    expiry_date: Optional[datetime] = None
+    last_activity: Optional[datetime] = None
+    created_at: Optional[datetime] = None
+
+class UserPage(BaseModel):
+    """یک صفحه از کاربران با cursor صفحه بعد"""
+    users: List[UserSummary]
+    next_cursor: Optional[str] = Field(None, description="برای صفحه بعد ارسال شود؛ None یعنی صفحه آخر")
+    limit: int
+
+class BulkUserCreate(BaseModel):
+    """درخواست ایجاد دسته‌ای کاربران؛ هر ردیف جداگانه اعتبارسنجی می‌شود"""
+    users: List[Dict] = Field(..., min_length=1, max_length=1000)
+
+class BulkUserCreated(BaseModel):
+    index: int
+    id: int
+    username: str
+    uuid: str
+
+class BulkUserError(BaseModel):
+    index: int
+    username: Optional[str] = None
+    error: str
+
+class BulkUserResult(BaseModel):
+    """نتیجه ایجاد دسته‌ای: ردیف‌های ایجاد شده و خطای هر ردیف ناموفق"""
+    created: List[BulkUserCreated]
+    errors: List[BulkUserError]
+    xray_applied: bool
+
 class UserInDB(UserResponse):
     hashed_password: str
 
@@ -0,0 +1,54 @@
+"""
+ادغام فراخوانی‌های همزمان با کلید یکسان (single-flight)
+
+وقتی چند درخواست همزمان برای یک کلید (مثلاً UUID سابسکریپشن) به کش نمی‌خورند،
+فقط اولی کار را انجام می‌دهد و بقیه منتظر نتیجه همان می‌مانند.
+"""
+import asyncio
+from typing import Any, Awaitable, Callable, Dict, Hashable
+
+class SingleFlight:
+    def __init__(self):
+        self._calls: Dict[Hashable, asyncio.Future] = {}
+        self.leaders = 0
+        self.followers = 0
+
+    async def run(self, key: Hashable, func: Callable[[], Awaitable[Any]]) -> Any:
+        """
+        اجرای func برای key؛ فراخوانی‌های همزمان با همین کلید نتیجه (یا خطای) همان اجرا را می‌گیرند
+
+        اگر درخواست اجراکننده لغو شود، منتظرها خودشان دوباره اجرا را به عهده می‌گیرند.
+        """
+        while True:
+            future = self._calls.get(key)
+            if future is None:
+                break
+            self.followers += 1
+            try:
+                return await asyncio.shield(future)
+            except asyncio.CancelledError:
+                if not future.cancelled():
+                    raise
+
+        future = asyncio.get_running_loop().create_future()
+        self._calls[key] = future
+        self.leaders += 1
+        try:
+            result = await func()
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        except Exception as e:
+            future.set_exception(e)
+            # اگر منتظری نبود خطا بدون بازیابی در لاگ asyncio نیاید
+            future.exception()
+            raise
+        else:
+            future.set_result(result)
+            return result
+        finally:
+            if self._calls.get(key) is future:
+                del self._calls[key]
+
+    def stats(self) -> Dict:
+        return {"in_flight": len(self._calls), "leaders": self.leaders, "followers": self.followers}
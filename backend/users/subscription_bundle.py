@@ -0,0 +1,565 @@
+"""
+بسته سابسکریپشن هر کاربر برای /sub/{uuid}
+
+کلاینت‌ها این لینک را هر چند دقیقه می‌خوانند، پس بسته‌ها از قبل رندر و در فایل
+memory-mapped مشترک (subscription_store) نوشته می‌شوند:
+- درخواست‌ها مستقیماً از فایل خوانده می‌شوند؛ نه دیتابیس و نه ساخت رشته در پایتون
+- ETag از نسخه داده‌ها (رکورد کاربر، اینباندهای فعال و دامنه‌ها) ساخته می‌شود و در همه workerها یکسان است
+- تغییر کاربر/سابسکریپشن/دامنه (از طریق user_cache) بسته همان کاربر را در پس‌زمینه دوباره رندر می‌کند؛
+  تغییر اینباندها همه بسته‌ها را نامعتبر و دوباره رندر می‌کند
+- اگر بسته‌ای در فایل نباشد (یا قدیمی‌تر از SUBSCRIPTION_STORE_MAX_AGE باشد) در همان درخواست رندر می‌شود
+- هر نوشتن epoch فایل مشترک و زمان خواندن ورودی‌هایش را همراه دارد؛ رندری که ورودی‌هایش پیش از
+  تغییر اینباندها (در هر worker) یا پیش از نسخه موجود همان کلید خوانده شده نوشته نمی‌شود
+
+برای هر کاربر مدل یکسان اتصال‌ها (کلید "{uuid}:model") و هر فرمت خروجی (کلید "{uuid}:{format}")
+جداگانه ذخیره می‌شوند؛ درخواست فرمت جدید فقط از مدل ذخیره شده رندر می‌شود و به دیتابیس نمی‌رود.
+
+هدر subscription-userinfo (مصرف، حجم کل و انقضا) برای درخواست‌های HEAD از کش رکورد کاربران
+و در نبود آن از کلید "{uuid}:info" فایل مشترک خوانده می‌شود؛ این درخواست‌ها چیزی رندر نمی‌کنند.
+"""
+import hashlib
+import json
+import logging
+import threading
+import time
+from dataclasses import dataclass
+from datetime import datetime
+from collections import OrderedDict
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+from sqlalchemy import event, select
+from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from backend.config import settings
+from backend.models import Domain, Inbound, User
+from backend.single_flight import SingleFlight
+from backend.xray_config.share_links import (
+    SHAREABLE_PROTOCOLS,
+    Host,
+    compile_templates,
+    domain_host,
+    expand_templates
+)
+from backend.xray_config.subscription_formats import DEFAULT_FORMAT, FORMATS, media_type, render_format
+from .subscription_store import FLAG_ACTIVE, StoredBundle, SubscriptionStore
+from .user_cache import (
+    UserRecord,
+    _build_record,
+    add_invalidation_listener,
+    get_user_record_by_uuid_async,
+    user_cache
+)
+
+logger = logging.getLogger(__name__)
+
+_INBOUNDS_CHANGED_KEY = "subscription_inbounds_changed"
+_DELETED_UUIDS_KEY = "subscription_deleted_uuids"
+RERENDER_BATCH_SIZE = 500
+TEMPLATE_CACHE_SIZE = 1024
+_EPOCH = datetime(1970, 1, 1)
+
+@dataclass(frozen=True)
+class SubscriptionBundle:
+    uuid: str
+    body: bytes
+    etag: str
+    active: bool
+    media_type: str
+
+@dataclass(frozen=True)
+class UserModel:
+    """مدل یکسان اتصال‌های کاربر که همه فرمت‌ها از آن رندر می‌شوند"""
+    endpoints: List[Dict]
+    etag: str
+    active: bool
+    expires_at: Optional[float]
+    # epoch فایل مشترک و زمان خواندن ورودی‌ها؛ برای رد نوشتن‌های کهنه
+    epoch: Optional[int] = None
+    loaded_at: Optional[float] = None
+
+@dataclass(frozen=True)
+class SubscriptionUserInfo:
+    """مقدار هدر subscription-userinfo و وضعیت فعال بودن کاربر"""
+    header: str
+    active: bool
+
+class _InboundSnapshot:
+    """
+    اینباندهای قابل اشتراک فعال؛ برای همه کاربران یکسان است و یک بار در هر نسخه خوانده می‌شود
+
+    snapshot با epoch فایل مشترک در زمان خواندن ذخیره می‌شود؛ تغییر اینباندها در هر worker
+    (clear فایل مشترک) snapshot بقیه workerها را هم بدون انتظار برای TTL نامعتبر می‌کند.
+    """
+
+    def __init__(self, ttl: float):
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._inbounds: Optional[List[Dict]] = None
+        self._version: Optional[str] = None
+        self._epoch: Optional[int] = None
+        self._expires_at = 0.0
+
+    def current(self, epoch: int) -> Optional[Tuple[List[Dict], str]]:
+        with self._lock:
+            if self._inbounds is None or self._epoch != epoch or self._expires_at <= time.monotonic():
+                return None
+            return self._inbounds, self._version
+
+    def store(self, inbounds: List[Dict], epoch: int) -> Tuple[List[Dict], str]:
+        version = hashlib.blake2b(repr(inbounds).encode(), digest_size=8).hexdigest()
+        with self._lock:
+            self._inbounds, self._version, self._epoch = inbounds, version, epoch
+            self._expires_at = time.monotonic() + self.ttl
+        return inbounds, version
+
+    def invalidate(self) -> None:
+        with self._lock:
+            self._inbounds = None
+            self._expires_at = 0.0
+
+_inbound_snapshot = _InboundSnapshot(settings.USER_CACHE_TTL)
+
+class _TemplateCache:
+    """
+    قالب‌های اتصال بر اساس (نسخه اینباندها، مقصدها)
+
+    کاربران با دامنه‌های یکسان (یا بدون دامنه) قالب مشترک دارند، پس تجزیه تنظیمات اینباندها
+    و گسترش CDN برای هر ترکیب فقط یک بار انجام می‌شود و رندر کاربر ۲۰ دامنه‌ای فقط کپی قالب‌هاست.
+    """
+
+    def __init__(self, max_size: int):
+        self.max_size = max_size
+        self._lock = threading.Lock()
+        self._templates: "OrderedDict[Tuple[str, Tuple[Host, ...]], List[Dict]]" = OrderedDict()
+
+    def get(self, inbounds: List[Dict], inbounds_version: str, hosts: Tuple[Host, ...]) -> List[Dict]:
+        key = (inbounds_version, hosts)
+        with self._lock:
+            templates = self._templates.get(key)
+            if templates is not None:
+                self._templates.move_to_end(key)
+                return templates
+        templates = compile_templates(inbounds, hosts)
+        with self._lock:
+            self._templates[key] = templates
+            while len(self._templates) > self.max_size:
+                self._templates.popitem(last=False)
+        return templates
+
+    def clear(self) -> None:
+        with self._lock:
+            self._templates.clear()
+
+_template_cache = _TemplateCache(TEMPLATE_CACHE_SIZE)
+
+# رندرهای همزمان یک کاربر (پس از نامعتبر شدن فایل مشترک) فقط یک بار انجام می‌شوند
+render_flight = SingleFlight()
+
+subscription_store = SubscriptionStore(
+    settings.SUBSCRIPTION_STORE_PATH,
+    settings.SUBSCRIPTION_STORE_SLOTS,
+    settings.SUBSCRIPTION_STORE_SIZE_MB * 1024 * 1024
+)
+
+def _inbound_row(inbound: Inbound) -> Dict:
+    inbound_settings = inbound.settings or {}
+    return {
+        "id": inbound.id,
+        "tag": inbound.tag or inbound.name,
+        "protocol": (inbound.protocol or inbound_settings.get("protocol") or "").lower(),
+        "port": inbound.port,
+        "settings": inbound_settings
+    }
+
+_INBOUNDS_QUERY = select(Inbound).where(Inbound.is_active != False).order_by(Inbound.id)
+
+def _snapshot_inbounds(rows: Iterable[Inbound], epoch: int) -> Tuple[List[Dict], str]:
+    inbounds = [row for row in map(_inbound_row, rows) if row["protocol"] in SHAREABLE_PROTOCOLS]
+    return _inbound_snapshot.store(inbounds, epoch)
+
+async def _load_inbounds(db: AsyncSession, epoch: int) -> Tuple[List[Dict], str]:
+    """epoch: مقدار subscription_store.epoch() پیش از شروع بارگذاری"""
+    cached = _inbound_snapshot.current(epoch)
+    if cached is not None:
+        return cached
+    return _snapshot_inbounds((await db.execute(_INBOUNDS_QUERY)).scalars().all(), epoch)
+
+def _load_inbounds_sync(db: Session, epoch: int) -> Tuple[List[Dict], str]:
+    cached = _inbound_snapshot.current(epoch)
+    if cached is not None:
+        return cached
+    return _snapshot_inbounds(db.execute(_INBOUNDS_QUERY).scalars().all(), epoch)
+
+# (نام، config) دامنه‌ها؛ config شامل تنظیمات CDN است
+DomainRow = Tuple[str, Optional[Dict]]
+
+def _hosts(domain_rows: Iterable[DomainRow]) -> Tuple[Host, ...]:
+    """مقصدهای کاربر از دامنه‌هایش؛ اگر دامنه‌ای نداشته باشد دامنه پنل"""
+    hosts = tuple(domain_host(name, config) for name, config in domain_rows)
+    if hosts:
+        return hosts
+    default = settings.PANEL_DOMAIN or settings.SERVER_IP
+    return (Host(name=default, addresses=(default,)),) if default else ()
+
+def make_etag(record: UserRecord, inbounds_version: str, hosts: Tuple[Host, ...]) -> str:
+    """ETag قوی از نسخه داده‌های ورودی بسته (مستقل از worker)"""
+    # ۱۰ بایت تا ETag فرمت‌ها ("{digest}-{format}") در ۳۲ بایت فایل مشترک جا شود
+    digest = hashlib.blake2b(
+        repr((record, inbounds_version, hosts)).encode(),
+        digest_size=10
+    ).hexdigest()
+    return f'"{digest}"'
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    """مقایسه هدر If-None-Match با ETag (پشتیبانی از چند مقدار، * و پیشوند W/)"""
+    if not if_none_match:
+        return False
+    for candidate in if_none_match.split(","):
+        candidate = candidate.strip()
+        if candidate == "*":
+            return True
+        if candidate.startswith("W/"):
+            candidate = candidate[2:]
+        if candidate == etag:
+            return True
+    return False
+
+def format_etag(model_etag: str, fmt: str) -> str:
+    """ETag هر فرمت از ETag مدل کاربر"""
+    return f'{model_etag[:-1]}-{fmt}"'
+
+def _model_key(uuid: str) -> str:
+    return f"{uuid}:model"
+
+def _format_key(uuid: str, fmt: str) -> str:
+    return f"{uuid}:{fmt}"
+
+def _info_key(uuid: str) -> str:
+    return f"{uuid}:info"
+
+def discard_user(uuid: str) -> None:
+    """حذف مدل، اطلاعات مصرف و همه فرمت‌های یک کاربر از فایل مشترک"""
+    subscription_store.discard(_model_key(uuid))
+    subscription_store.discard(_info_key(uuid))
+    for fmt in FORMATS:
+        subscription_store.discard(_format_key(uuid, fmt))
+
+def _is_active(record: UserRecord) -> bool:
+    subscription = record.subscription
+    return (
+        record.is_active
+        and not record.is_expired
+        and (subscription is None or subscription.is_active)
+    )
+
+def _expiry_timestamp(record: UserRecord) -> Optional[float]:
+    expiry = record.subscription.expiry_date if record.subscription else record.expiry_date
+    # تاریخ‌ها UTC و بدون timezone ذخیره می‌شوند
+    return (expiry - _EPOCH).total_seconds() if expiry else None
+
+def userinfo_header(record: UserRecord) -> str:
+    """مقدار هدر subscription-userinfo؛ مصرف در سطح کاربر و بدون تفکیک آپلود/دانلود ثبت می‌شود"""
+    total = record.traffic_limit or (record.subscription.data_limit if record.subscription else 0)
+    expire = _expiry_timestamp(record)
+    return f"upload=0; download={record.traffic_used}; total={total}; expire={int(expire) if expire else 0}"
+
+def _format_bundle(
+    uuid: str,
+    fmt: str,
+    model: UserModel,
+    endpoints: Optional[List[Dict]] = None,
+    etag: Optional[str] = None
+) -> SubscriptionBundle:
+    return SubscriptionBundle(
+        uuid=uuid,
+        body=render_format(fmt, model.endpoints if endpoints is None else endpoints),
+        etag=etag or format_etag(model.etag, fmt),
+        active=model.active,
+        media_type=media_type(fmt)
+    )
+
+def _put_model_entry(name: str, body: bytes, model: UserModel, etag: Optional[str] = None) -> bool:
+    return subscription_store.put(
+        name,
+        body,
+        etag or model.etag,
+        model.active,
+        model.expires_at,
+        epoch=model.epoch,
+        loaded_at=model.loaded_at
+    )
+
+def _store_format(uuid: str, fmt: str, model: UserModel) -> SubscriptionBundle:
+    bundle = _format_bundle(uuid, fmt, model)
+    _put_model_entry(_format_key(uuid, fmt), bundle.body, model, bundle.etag)
+    return bundle
+
+def build_model(
+    record: UserRecord,
+    inbounds: List[Dict],
+    inbounds_version: str,
+    domain_rows: Iterable[DomainRow],
+    epoch: Optional[int] = None,
+    loaded_at: Optional[float] = None
+) -> UserModel:
+    """
+    ساخت مدل کاربر از قالب‌های مشترک و نوشتن مدل و اطلاعات مصرف در فایل مشترک
+
+    epoch و loaded_at: epoch فایل مشترک و زمان پیش از خواندن ورودی‌ها؛ اگر در این فاصله
+    اینباندها یا همین کاربر (در worker دیگری) تغییر کرده باشد مدل در فایل نوشته نمی‌شود.
+    """
+    hosts = _hosts(domain_rows)
+    templates = _template_cache.get(inbounds, inbounds_version, hosts)
+    model = UserModel(
+        endpoints=expand_templates(templates, record.uuid, record.username),
+        etag=make_etag(record, inbounds_version, hosts),
+        active=_is_active(record),
+        expires_at=_expiry_timestamp(record),
+        epoch=epoch,
+        loaded_at=loaded_at
+    )
+    _put_model_entry(_info_key(record.uuid), userinfo_header(record).encode(), model)
+    _put_model_entry(_model_key(record.uuid), json.dumps(model.endpoints, separators=(",", ":")).encode(), model)
+    return model
+
+def render_bundle(
+    record: UserRecord,
+    inbounds: List[Dict],
+    inbounds_version: str,
+    domain_rows: Iterable[DomainRow],
+    fmt: str = DEFAULT_FORMAT,
+    epoch: Optional[int] = None,
+    loaded_at: Optional[float] = None
+) -> SubscriptionBundle:
+    """ساخت مدل کاربر و رندر یک فرمت؛ هر دو در فایل مشترک نوشته می‌شوند"""
+    model = build_model(record, inbounds, inbounds_version, domain_rows, epoch, loaded_at)
+    return _store_format(record.uuid, fmt, model)
+
+def _is_fresh(stored: StoredBundle, now: float) -> bool:
+    return now - stored.rendered_at <= settings.SUBSCRIPTION_STORE_MAX_AGE
+
+def _stored_active(stored: StoredBundle, now: float) -> bool:
+    return bool(stored.flags & FLAG_ACTIVE) and not (stored.expires_at and stored.expires_at <= now)
+
+def _stored_model(uuid: str) -> Optional[UserModel]:
+    now = time.time()
+    # epoch پیش از خواندن گرفته می‌شود تا فرمتی که از مدل پیش از clear رندر شود نوشته نشود
+    epoch = subscription_store.epoch()
+    stored = subscription_store.get(_model_key(uuid))
+    if stored is None or not _is_fresh(stored, now):
+        return None
+    return UserModel(
+        endpoints=json.loads(stored.body),
+        etag=stored.etag,
+        active=_stored_active(stored, now),
+        expires_at=stored.expires_at or None,
+        epoch=epoch,
+        loaded_at=stored.rendered_at
+    )
+
+def _stored_format(uuid: str, fmt: str) -> Optional[SubscriptionBundle]:
+    now = time.time()
+    stored = subscription_store.get(_format_key(uuid, fmt))
+    if stored is None or not _is_fresh(stored, now):
+        return None
+    return SubscriptionBundle(
+        uuid=uuid,
+        body=stored.body,
+        etag=stored.etag,
+        active=_stored_active(stored, now),
+        media_type=media_type(fmt)
+    )
+
+_DOMAINS_QUERY = select(Domain.owner_id, Domain.name, Domain.config).order_by(Domain.id)
+
+async def _load_model(db: AsyncSession, uuid: str) -> Optional[UserModel]:
+    """مدل کاربر از دیتابیس؛ درخواست‌های همزمان یک UUID فقط یک بار بارگذاری و رندر می‌کنند"""
+    async def load() -> Optional[UserModel]:
+        epoch, loaded_at = subscription_store.epoch(), time.time()
+        record = await get_user_record_by_uuid_async(db, uuid)
+        if record is None:
+            return None
+        inbounds, inbounds_version = await _load_inbounds(db, epoch)
+        rows = (await db.execute(_DOMAINS_QUERY.where(Domain.owner_id == record.id))).all()
+        domain_rows = [(name, config) for _, name, config in rows]
+        return build_model(record, inbounds, inbounds_version, domain_rows, epoch, loaded_at)
+
+    return await render_flight.run(uuid, load)
+
+async def get_subscription_bundle(
+    db: AsyncSession,
+    uuid: str,
+    fmt: str = DEFAULT_FORMAT,
+    domains: Optional[Iterable[str]] = None
+) -> Optional[SubscriptionBundle]:
+    """
+    بسته سابسکریپشن کاربر؛ None اگر کاربر وجود نداشت
+
+    ترتیب: فرمت ذخیره شده، رندر فرمت از مدل ذخیره شده و در آخر ساخت مدل از دیتابیس.
+    domains: فقط اتصال‌های این دامنه‌ها (لینک‌های ساخته شده با ?configs=)؛ این بسته‌ها ذخیره نمی‌شوند
+    """
+    selected = frozenset(domains) if domains else None
+    if selected is None:
+        bundle = _stored_format(uuid, fmt)
+        if bundle is not None:
+            return bundle
+
+    model = _stored_model(uuid) or await _load_model(db, uuid)
+    if model is None:
+        return None
+    if selected is None:
+        return _store_format(uuid, fmt, model)
+
+    endpoints = [endpoint for endpoint in model.endpoints if endpoint.get("domain") in selected]
+    selection = hashlib.blake2b(",".join(sorted(selected)).encode(), digest_size=4).hexdigest()
+    return _format_bundle(uuid, fmt, model, endpoints, format_etag(model.etag, f"{fmt}-{selection}"))
+
+async def get_subscription_userinfo(db: AsyncSession, uuid: str) -> Optional[SubscriptionUserInfo]:
+    """
+    اطلاعات مصرف کاربر برای هدرها بدون رندر
+
+    ترتیب: کش رکورد کاربران این worker، کلید info فایل مشترک و در آخر دیتابیس
+    """
+    record = user_cache.get_by_uuid(uuid)
+    if record is None:
+        now = time.time()
+        stored = subscription_store.get(_info_key(uuid))
+        if stored is not None and _is_fresh(stored, now):
+            return SubscriptionUserInfo(header=stored.body.decode(), active=_stored_active(stored, now))
+        record = await get_user_record_by_uuid_async(db, uuid)
+        if record is None:
+            return None
+    return SubscriptionUserInfo(header=userinfo_header(record), active=_is_active(record))
+
+# -------------------- رندر دوباره در پس‌زمینه --------------------
+def rerender_users(db: Session, user_ids: Iterable[int]) -> int:
+    """رندر دسته‌ای بسته‌های چند کاربر با سه کوئری set-based (دامنه‌ها و تنظیمات CDN همه کاربران در یک کوئری)؛ تعداد بسته‌های نوشته شده را برمی‌گرداند"""
+    from .user_subscription import get_latest_subscriptions
+
+    ids = list(user_ids)
+    if not ids:
+        return 0
+    epoch, loaded_at = subscription_store.epoch(), time.time()
+    users = db.execute(select(User).where(User.id.in_(ids))).scalars().all()
+    subscriptions = get_latest_subscriptions(db, ids)
+    domains: Dict[int, List[DomainRow]] = {}
+    for owner_id, name, config in db.execute(_DOMAINS_QUERY.where(Domain.owner_id.in_(ids))):
+        domains.setdefault(owner_id, []).append((name, config))
+    inbounds, inbounds_version = _load_inbounds_sync(db, epoch)
+
+    for user in users:
+        record = _build_record(user, subscriptions.get(user.id))
+        render_bundle(record, inbounds, inbounds_version, domains.get(user.id, []), DEFAULT_FORMAT, epoch, loaded_at)
+        # فرمت‌های دیگر در اولین درخواست از مدل جدید رندر می‌شوند؛ نسخه‌های قدیمی‌تر از این مدل رد می‌شوند
+        for fmt in FORMATS:
+            if fmt != DEFAULT_FORMAT:
+                subscription_store.discard(_format_key(user.uuid, fmt), loaded_at)
+    return len(users)
+
+def rerender_all(db: Session, batch_size: int = RERENDER_BATCH_SIZE) -> int:
+    """رندر دوباره بسته همه کاربران به صورت دسته‌ای (keyset روی آیدی)"""
+    total = 0
+    last_id = 0
+    while True:
+        ids = db.execute(
+            select(User.id).where(User.id > last_id).order_by(User.id).limit(batch_size)
+        ).scalars().all()
+        if not ids:
+            return total
+        total += rerender_users(db, ids)
+        last_id = ids[-1]
+        # آزاد کردن اشیای بارگذاری شده هر دسته
+        db.expunge_all()
+
+class BundleRerenderer:
+    """
+    صف رندر دوباره در یک thread پس‌زمینه
+
+    کاربران تغییر کرده پس از commit در صف قرار می‌گیرند تا درخواست تغییر منتظر رندر نماند.
+    """
+
+    def __init__(self):
+        self._condition = threading.Condition()
+        self._pending: Set[int] = set()
+        self._all = False
+        self._thread: Optional[threading.Thread] = None
+
+    def _ensure_thread(self) -> None:
+        if self._thread is None or not self._thread.is_alive():
+            self._thread = threading.Thread(target=self._run, name="subscription-rerender", daemon=True)
+            self._thread.start()
+
+    def schedule(self, user_ids: Iterable[int]) -> None:
+        with self._condition:
+            self._pending.update(user_ids)
+            self._ensure_thread()
+            self._condition.notify()
+
+    def schedule_all(self) -> None:
+        with self._condition:
+            self._all = True
+            self._pending.clear()
+            self._ensure_thread()
+            self._condition.notify()
+
+    def _take(self) -> Tuple[bool, List[int]]:
+        with self._condition:
+            while not self._all and not self._pending:
+                self._condition.wait()
+            if self._all:
+                self._all = False
+                self._pending.clear()
+                return True, []
+            ids = list(self._pending)[:RERENDER_BATCH_SIZE]
+            self._pending.difference_update(ids)
+            return False, ids
+
+    def _run(self) -> None:
+        from backend.database import SessionLocal
+
+        while True:
+            render_all, ids = self._take()
+            try:
+                with SessionLocal() as db:
+                    if render_all:
+                        count = rerender_all(db)
+                        logger.info(f"Re-rendered {count} subscription bundles")
+                    else:
+                        rerender_users(db, ids)
+            except Exception as e:
+                logger.error(f"Subscription re-render failed: {str(e)}")
+
+bundle_rerenderer = BundleRerenderer()
+
+def invalidate_all_bundles() -> None:
+    """نامعتبر کردن همه بسته‌ها (در همه workerها) و رندر دوباره در پس‌زمینه"""
+    _inbound_snapshot.invalidate()
+    _template_cache.clear()
+    subscription_store.clear()
+    bundle_rerenderer.schedule_all()
+
+# -------------------- بی‌اعتبارسازی --------------------
+add_invalidation_listener(bundle_rerenderer.schedule)
+
+@event.listens_for(Session, "before_flush")
+def _collect_bundle_changes(session, flush_context, instances):
+    for obj in list(session.new) + list(session.dirty) + list(session.deleted):
+        if isinstance(obj, Inbound):
+            session.info[_INBOUNDS_CHANGED_KEY] = True
+            break
+    for obj in session.deleted:
+        if isinstance(obj, User) and obj.uuid:
+            session.info.setdefault(_DELETED_UUIDS_KEY, set()).add(obj.uuid)
+
+@event.listens_for(Session, "after_commit")
+def _apply_bundle_changes(session):
+    for uuid in session.info.pop(_DELETED_UUIDS_KEY, ()):
+        discard_user(uuid)
+    if session.info.pop(_INBOUNDS_CHANGED_KEY, False):
+        invalidate_all_bundles()
+
+@event.listens_for(Session, "after_rollback")
+def _discard_bundle_changes(session):
+    session.info.pop(_INBOUNDS_CHANGED_KEY, None)
+    session.info.pop(_DELETED_UUIDS_KEY, None)
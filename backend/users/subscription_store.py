@@ -0,0 +1,395 @@
+"""
+فایل memory-mapped بسته‌های سابسکریپشن رندر شده (مشترک بین همه workerها)
+
+ساختار فایل:
+- header: magic، نسخه، ظرفیت index، ظرفیت داده، مقدار استفاده شده از داده، generation، epoch
+  و تعداد slotهای اشغال شده
+- index: جدول hash با open addressing؛ هر slot شامل کلید (blake2b کلید)، seq، offset، طول و ظرفیت
+  ناحیه داده، flags، زمان رندر، زمان انقضای کاربر و ETag
+- داده: هر کلید ناحیه خودش را دارد؛ بازنویسی همان کلید اگر جا شود در همان ناحیه و در غیر این صورت
+  در انتهای ناحیه داده انجام می‌شود
+
+ضریب بار index حداکثر MAX_LOAD_FACTOR است (تعداد slotها از روی ظرفیت درخواستی حساب می‌شود) تا
+probe خطی کوتاه بماند. نوشتن با flock انحصاری انجام می‌شود. خواندن بدون قفل است و با seqlock
+(seq فرد یعنی در حال نوشتن) روی slot و generation روی کل فایل سازگاری را بررسی می‌کند.
+
+وقتی ناحیه داده پر شود بسته‌های زنده به ابتدای آن منتقل می‌شوند (compaction) و فضای بسته‌های
+حذف یا جابه‌جا شده آزاد می‌شود؛ وقتی index پر شود slotهای حذف شده هم کنار گذاشته می‌شوند.
+فقط اگر این کار جا باز نکند فایل خالی (reset) می‌شود.
+
+نوشتن‌های کهنه رد می‌شوند:
+- epoch با هر clear (تغییر اینباندها) زیاد می‌شود؛ نوشتنی که ورودی‌هایش پیش از آن خوانده شده رد می‌شود
+- زمان رندر هر slot زمان خواندن ورودی‌هاست؛ نوشتنی که ورودی‌هایش قدیمی‌تر از نسخه موجود
+  (یا حذف آن با discard) باشد رد می‌شود
+"""
+import fcntl
+import hashlib
+import logging
+import math
+import mmap
+import os
+import struct
+import threading
+import time
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Dict, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+_MAGIC = b"ZHSUBST1"
+_VERSION = 3
+# magic, version, slots, data_capacity, data_used, generation, epoch, entries
+_HEADER = struct.Struct("<8sIIQQQQQ")
+# key, seq, offset, length, capacity, flags, rendered_at, expires_at, etag
+_ENTRY = struct.Struct("<16sQQIIIdd32s")
+_SEQ = struct.Struct("<Q")
+_GENERATION_OFFSET = 8 + 4 + 4 + 8 + 8
+_EPOCH_OFFSET = _GENERATION_OFFSET + 8
+_EMPTY_KEY = b"\x00" * 16
+
+# flags
+FLAG_PRESENT = 1
+FLAG_ACTIVE = 2
+
+# اگر خواندن همزمان با نوشتن باشد چند بار دوباره تلاش می‌شود
+_READ_RETRIES = 3
+
+# حداکثر نسبت slotهای اشغال شده (شامل حذف شده‌ها) به کل index
+MAX_LOAD_FACTOR = 0.7
+
+def store_key(name: str) -> bytes:
+    return hashlib.blake2b(name.encode(), digest_size=16).digest()
+
+@dataclass(frozen=True)
+class StoredBundle:
+    body: bytes
+    etag: str
+    flags: int
+    rendered_at: float
+    expires_at: float
+
+class SubscriptionStore:
+    def __init__(self, path: Path, slots: int, data_capacity: int):
+        """slots: تعداد بسته‌هایی که index باید جا بدهد؛ index با ضریب بار MAX_LOAD_FACTOR ساخته می‌شود"""
+        self.path = Path(path)
+        # ظرفیت index توان ۲ است تا probe با ماسک انجام شود
+        self.slots = 1 << max(math.ceil(slots / MAX_LOAD_FACTOR) - 1, 1).bit_length()
+        self.data_capacity = data_capacity
+        self._fd: Optional[int] = None
+        self._mm: Optional[mmap.mmap] = None
+        self._open_lock = threading.Lock()
+        # قفل داخل پردازه؛ flock بین پردازه‌هاست و threadهای یک پردازه را از هم جدا نمی‌کند
+        self._write_lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.writes = 0
+        self.compactions = 0
+        self.resets = 0
+        self.stale_writes = 0
+
+    @property
+    def max_entries(self) -> int:
+        return int(self.slots * MAX_LOAD_FACTOR)
+
+    # -------------------- فایل --------------------
+    @property
+    def _data_start(self) -> int:
+        return _HEADER.size + self.slots * _ENTRY.size
+
+    def _file_size(self) -> int:
+        return self._data_start + self.data_capacity
+
+    def _open(self) -> mmap.mmap:
+        if self._mm is not None:
+            return self._mm
+        with self._open_lock:
+            if self._mm is not None:
+                return self._mm
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o640)
+            fcntl.flock(fd, fcntl.LOCK_EX)
+            try:
+                size = os.fstat(fd).st_size
+                header = os.pread(fd, _HEADER.size, 0) if size >= _HEADER.size else b""
+                valid = False
+                if header[:8] == _MAGIC and len(header) == _HEADER.size:
+                    _, version, slots, data_capacity = _HEADER.unpack(header)[:4]
+                    if version == _VERSION and size == _HEADER.size + slots * _ENTRY.size + data_capacity:
+                        # اندازه فایل موجود (که workerهای دیگر هم از آن استفاده می‌کنند) حفظ می‌شود
+                        self.slots, self.data_capacity = slots, data_capacity
+                        valid = True
+                if not valid:
+                    os.ftruncate(fd, 0)
+                    os.ftruncate(fd, self._file_size())
+                    os.pwrite(fd, _HEADER.pack(_MAGIC, _VERSION, self.slots, self.data_capacity, 0, 0, 0, 0), 0)
+            finally:
+                fcntl.flock(fd, fcntl.LOCK_UN)
+            self._fd = fd
+            self._mm = mmap.mmap(fd, 0)
+            return self._mm
+
+    def close(self) -> None:
+        with self._open_lock:
+            if self._mm is not None:
+                self._mm.close()
+                self._mm = None
+            if self._fd is not None:
+                os.close(self._fd)
+                self._fd = None
+
+    def _entry_offset(self, slot: int) -> int:
+        return _HEADER.size + slot * _ENTRY.size
+
+    def _generation(self, mm: mmap.mmap) -> int:
+        return _SEQ.unpack_from(mm, _GENERATION_OFFSET)[0]
+
+    def epoch(self) -> int:
+        """شماره clear فعلی؛ پیش از خواندن ورودی‌های رندر گرفته و به put داده می‌شود"""
+        return _SEQ.unpack_from(self._open(), _EPOCH_OFFSET)[0]
+
+    def _find_slot(self, mm: mmap.mmap, key: bytes, for_write: bool) -> Optional[int]:
+        """slot کلید (یا اولین slot خالی برای نوشتن)؛ None اگر پیدا نشد یا index پر است"""
+        mask = self.slots - 1
+        slot = int.from_bytes(key[:8], "little") & mask
+        for _ in range(self.slots):
+            stored_key = mm[self._entry_offset(slot):self._entry_offset(slot) + 16]
+            if stored_key == key:
+                return slot
+            if stored_key == _EMPTY_KEY:
+                return slot if for_write else None
+            slot = (slot + 1) & mask
+        return None
+
+    # -------------------- خواندن --------------------
+    def get(self, name: str) -> Optional[StoredBundle]:
+        """خواندن بدون قفل؛ None اگر بسته وجود نداشت یا همزمان در حال تغییر بود"""
+        mm = self._open()
+        key = store_key(name)
+        for _ in range(_READ_RETRIES):
+            generation = self._generation(mm)
+            if generation & 1:
+                continue
+            slot = self._find_slot(mm, key, for_write=False)
+            if slot is None:
+                break
+            offset = self._entry_offset(slot)
+            seq = _SEQ.unpack_from(mm, offset + 16)[0]
+            if seq & 1:
+                continue
+            _, _, data_offset, length, _, flags, rendered_at, expires_at, etag = _ENTRY.unpack_from(mm, offset)
+            body = mm[data_offset:data_offset + length] if flags & FLAG_PRESENT else b""
+            if _SEQ.unpack_from(mm, offset + 16)[0] != seq or self._generation(mm) != generation:
+                continue
+            if not flags & FLAG_PRESENT:
+                break
+            self.hits += 1
+            return StoredBundle(body, etag.rstrip(b"\x00").decode(), flags, rendered_at, expires_at)
+        self.misses += 1
+        return None
+
+    # -------------------- نوشتن --------------------
+    def _lock(self):
+        self._write_lock.acquire()
+        fcntl.flock(self._fd, fcntl.LOCK_EX)
+
+    def _unlock(self):
+        fcntl.flock(self._fd, fcntl.LOCK_UN)
+        self._write_lock.release()
+
+    def _bump_seq(self, mm: mmap.mmap, offset: int) -> None:
+        _SEQ.pack_into(mm, offset, _SEQ.unpack_from(mm, offset)[0] + 1)
+
+    def _set_header(self, mm: mmap.mmap, data_used: int, entries: int, generation: int, epoch: int) -> None:
+        _HEADER.pack_into(
+            mm, 0, _MAGIC, _VERSION, self.slots, self.data_capacity, data_used, generation, epoch, entries
+        )
+
+    def _reset_locked(self, mm: mmap.mmap, epoch: int) -> None:
+        self._bump_seq(mm, _GENERATION_OFFSET)
+        mm[_HEADER.size:self._data_start] = b"\x00" * (self._data_start - _HEADER.size)
+        self._set_header(mm, 0, 0, self._generation(mm) + 1, epoch)
+        self.resets += 1
+
+    def _compact_locked(self, mm: mmap.mmap, drop_discarded: bool, replacing: Optional[bytes] = None) -> None:
+        """
+        انتقال بسته‌های زنده به ابتدای ناحیه داده و ساخت دوباره index
+
+        فضای بسته‌های حذف شده، نسخه‌های جابه‌جا شده و نسخه فعلی replacing (که در حال بازنویسی است)
+        آزاد می‌شود. slotهای حذف شده (که جلوی نوشتن‌های کهنه را می‌گیرند) فقط با drop_discarded
+        کنار گذاشته می‌شوند.
+        """
+        self._bump_seq(mm, _GENERATION_OFFSET)
+        entries = []
+        for slot in range(self.slots):
+            values = _ENTRY.unpack_from(mm, self._entry_offset(slot))
+            if values[0] == _EMPTY_KEY:
+                continue
+            key, _, offset, length, _, flags, rendered_at, expires_at, etag = values
+            if key == replacing:
+                flags = 0
+            if not flags & FLAG_PRESENT:
+                if drop_discarded:
+                    continue
+                offset = length = 0
+            entries.append([key, offset, length, flags, rendered_at, expires_at, etag])
+
+        # مقصد هیچ‌وقت بعد از مبدأ نیست، پس انتقال به ترتیب offset داده‌ای را خراب نمی‌کند
+        data_used = 0
+        for entry in sorted(entries, key=lambda entry: entry[1]):
+            if not entry[2]:
+                entry[1] = 0
+                continue
+            target = self._data_start + data_used
+            if target != entry[1]:
+                mm.move(target, entry[1], entry[2])
+            entry[1] = target
+            data_used += entry[2]
+
+        mm[_HEADER.size:self._data_start] = b"\x00" * (self._data_start - _HEADER.size)
+        for key, offset, length, flags, rendered_at, expires_at, etag in entries:
+            slot = self._find_slot(mm, key, for_write=True)
+            _ENTRY.pack_into(
+                mm, self._entry_offset(slot), key, 0, offset, length, length, flags, rendered_at, expires_at, etag
+            )
+        epoch = _HEADER.unpack_from(mm, 0)[6]
+        self._set_header(mm, data_used, len(entries), self._generation(mm) + 1, epoch)
+        self.compactions += 1
+
+    def _reserve(self, mm: mmap.mmap, key: bytes, size: int) -> Tuple[int, int, int, bool, bool]:
+        """
+        slot و ناحیه داده برای نوشتن size بایت: (slot، offset، ظرفیت، ناحیه جدید است، slot جدید است)
+
+        اول ناحیه قبلی همان کلید، بعد انتهای ناحیه داده؛ اگر جا نبود compaction و در آخر reset
+        """
+        index_full = False
+        for remedy in (None, "compact", "reset"):
+            if remedy == "compact":
+                self._compact_locked(mm, drop_discarded=index_full, replacing=key)
+            elif remedy == "reset":
+                logger.info("Subscription store is full after compaction; resetting it")
+                self._reset_locked(mm, _HEADER.unpack_from(mm, 0)[6])
+            data_used, entries = _HEADER.unpack_from(mm, 0)[4], _HEADER.unpack_from(mm, 0)[7]
+            slot = self._find_slot(mm, key, for_write=True)
+            stored = _ENTRY.unpack_from(mm, self._entry_offset(slot)) if slot is not None else None
+            is_new = stored is None or stored[0] == _EMPTY_KEY
+            index_full = is_new and entries >= self.max_entries
+            if index_full:
+                continue
+            if not is_new and stored[2] and stored[4] >= size:
+                return slot, stored[2], stored[4], False, False
+            if data_used + size <= self.data_capacity:
+                return slot, self._data_start + data_used, size, True, is_new
+        raise RuntimeError("Subscription store has no room after reset")
+
+    def _is_stale(self, mm: mmap.mmap, key: bytes, epoch: Optional[int], loaded_at: float) -> bool:
+        if epoch is not None and _HEADER.unpack_from(mm, 0)[6] != epoch:
+            return True
+        slot = self._find_slot(mm, key, for_write=False)
+        return slot is not None and _ENTRY.unpack_from(mm, self._entry_offset(slot))[6] > loaded_at
+
+    def put(
+        self,
+        name: str,
+        body: bytes,
+        etag: str,
+        active: bool,
+        expires_at: Optional[float] = None,
+        epoch: Optional[int] = None,
+        loaded_at: Optional[float] = None
+    ) -> bool:
+        """
+        نوشتن بسته؛ False اگر بسته از کل ظرفیت داده بزرگ‌تر یا کهنه باشد
+
+        epoch: مقدار epoch() پیش از خواندن ورودی‌ها؛ اگر در این فاصله clear شده باشد نوشته نمی‌شود
+        loaded_at: زمان خواندن ورودی‌ها (پیش‌فرض اکنون)؛ اگر slot نسخه جدیدتری داشته باشد نوشته نمی‌شود
+        """
+        if len(body) > self.data_capacity:
+            return False
+        mm = self._open()
+        key = store_key(name)
+        flags = FLAG_PRESENT | (FLAG_ACTIVE if active else 0)
+        loaded_at = time.time() if loaded_at is None else loaded_at
+        self._lock()
+        try:
+            if self._is_stale(mm, key, epoch, loaded_at):
+                self.stale_writes += 1
+                return False
+            slot, data_offset, capacity, appended, is_new = self._reserve(mm, key, len(body))
+
+            # خواننده‌ای که همزمان ناحیه قبلی را می‌خواند با تغییر seq دوباره تلاش می‌کند
+            offset = self._entry_offset(slot)
+            self._bump_seq(mm, offset + 16)
+            seq = _SEQ.unpack_from(mm, offset + 16)[0]
+            mm[data_offset:data_offset + len(body)] = body
+            _ENTRY.pack_into(
+                mm, offset, key, seq, data_offset, len(body), capacity, flags,
+                loaded_at, expires_at or 0.0, etag.encode()[:32]
+            )
+            self._bump_seq(mm, offset + 16)
+
+            header = list(_HEADER.unpack_from(mm, 0))
+            if appended:
+                header[4] += len(body)
+            if is_new:
+                header[7] += 1
+            _HEADER.pack_into(mm, 0, *header)
+            self.writes += 1
+            return True
+        finally:
+            self._unlock()
+
+    def discard(self, name: str, loaded_at: Optional[float] = None) -> None:
+        """
+        حذف بسته؛ ناحیه داده‌اش برای نوشتن بعدی همان کلید یا compaction بعدی آزاد می‌شود
+
+        slot برای همان کلید باقی می‌ماند و loaded_at (پیش‌فرض اکنون) در آن ثبت می‌شود تا
+        نوشتن‌های با ورودی قدیمی‌تر رد شوند.
+        """
+        mm = self._open()
+        key = store_key(name)
+        loaded_at = time.time() if loaded_at is None else loaded_at
+        self._lock()
+        try:
+            slot = self._find_slot(mm, key, for_write=False)
+            if slot is None:
+                return
+            offset = self._entry_offset(slot)
+            _, _, data_offset, _, capacity = _ENTRY.unpack_from(mm, offset)[:5]
+            self._bump_seq(mm, offset + 16)
+            seq = _SEQ.unpack_from(mm, offset + 16)[0]
+            _ENTRY.pack_into(mm, offset, key, seq, data_offset, 0, capacity, 0, loaded_at, 0.0, b"")
+            self._bump_seq(mm, offset + 16)
+        finally:
+            self._unlock()
+
+    def clear(self) -> None:
+        """نامعتبر کردن همه بسته‌ها (مثلاً پس از تغییر اینباندها)؛ نوشتن‌های در جریان با epoch قبلی رد می‌شوند"""
+        mm = self._open()
+        self._lock()
+        try:
+            self._reset_locked(mm, _HEADER.unpack_from(mm, 0)[6] + 1)
+        finally:
+            self._unlock()
+
+    def stats(self) -> Dict:
+        mm = self._open()
+        _, _, slots, data_capacity, data_used, generation, epoch, entries = _HEADER.unpack_from(mm, 0)
+        lookups = self.hits + self.misses
+        return {
+            "path": str(self.path),
+            "slots": slots,
+            "entries": entries,
+            "load_factor": round(entries / slots, 4),
+            "data_capacity_bytes": data_capacity,
+            "data_used_bytes": data_used,
+            "generation": generation,
+            "epoch": epoch,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": round(self.hits / lookups, 4) if lookups else None,
+            "writes": self.writes,
+            "compactions": self.compactions,
+            "resets": self.resets,
+            "stale_writes": self.stale_writes
+        }
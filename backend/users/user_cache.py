@@ -0,0 +1,267 @@
+"""
+کش درون‌پردازه‌ای رکوردهای فشرده کاربران (بر اساس UUID و آیدی)
+
+مسیرهای پرتکرار مثل سابسکریپشن فقط به محدودیت‌ها، تاریخ انقضا و وضعیت فعال بودن
+کاربر نیاز دارند؛ این اطلاعات به جای کوئری در هر درخواست از کش خوانده می‌شود.
+
+بی‌اعتبارسازی:
+- تغییرات ORM روی User، Subscription و Domain در before_flush جمع‌آوری و پس از commit اعمال می‌شوند
+- UserManager.update/delete و تغییرات دسته‌ای (query.update/delete) صریحاً invalidate را صدا می‌زنند
+- کش هر worker مستقل است؛ TTL حداکثر زمان کهنگی در workerهای دیگر را محدود می‌کند
+"""
+import logging
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Callable, Dict, Iterable, List, Optional, Set
+
+from sqlalchemy import event, select
+from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from backend.config import settings
+from backend.models import User, Subscription, Domain
+
+logger = logging.getLogger(__name__)
+
+_PENDING_KEY = "user_cache_invalidate"
+
+@dataclass(frozen=True)
+class SubscriptionRecord:
+    uuid: str
+    data_limit: int
+    expiry_date: Optional[datetime]
+    max_connections: int
+    is_active: bool
+
+@dataclass(frozen=True)
+class UserRecord:
+    id: int
+    uuid: str
+    username: str
+    email: Optional[str]
+    is_active: bool
+    traffic_limit: int
+    traffic_used: int
+    simultaneous_connections: int
+    expiry_date: Optional[datetime]
+    subscription: Optional[SubscriptionRecord]
+
+    @property
+    def is_expired(self) -> bool:
+        expiry = self.subscription.expiry_date if self.subscription else self.expiry_date
+        return expiry is not None and expiry < datetime.utcnow()
+
+def _build_record(user: User, subscription: Optional[Subscription]) -> UserRecord:
+    return UserRecord(
+        id=user.id,
+        uuid=user.uuid,
+        username=user.username,
+        email=user.email,
+        is_active=bool(user.is_active),
+        traffic_limit=user.traffic_limit or 0,
+        traffic_used=user.traffic_used or 0,
+        simultaneous_connections=user.simultaneous_connections or 0,
+        expiry_date=user.expiry_date,
+        subscription=SubscriptionRecord(
+            uuid=subscription.uuid,
+            data_limit=subscription.data_limit or 0,
+            expiry_date=subscription.expiry_date,
+            max_connections=subscription.max_connections or 0,
+            is_active=subscription.is_active is not False
+        ) if subscription else None
+    )
+
+class UserCache:
+    """
+    LRU با TTL برای UserRecord
+
+    اگر در حین بارگذاری یک کاربر از دیتابیس همان کاربر invalidate شود،
+    نتیجه بارگذاری ذخیره نمی‌شود تا داده کهنه به کش برنگردد.
+    """
+
+    def __init__(self, max_size: int, ttl: float):
+        self.max_size = max_size
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._by_id: "OrderedDict[int, tuple]" = OrderedDict()  # id → (record, expires_at)
+        self._uuid_to_id: Dict[str, int] = {}
+        # شمارنده بی‌اعتبارسازی برای تشخیص بارگذاری‌های همزمان با تغییر
+        self._generation = 0
+        self._invalidated_gen: Dict[int, int] = {}
+        # بارگذاری‌هایی که پیش از این نسل شروع شده‌اند ذخیره نمی‌شوند
+        self._floor = 0
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+        self.evictions = 0
+
+    def _get(self, user_id: Optional[int]) -> Optional[UserRecord]:
+        with self._lock:
+            entry = self._by_id.get(user_id) if user_id is not None else None
+            if entry and entry[1] > time.monotonic():
+                self._by_id.move_to_end(user_id)
+                self.hits += 1
+                return entry[0]
+            if entry:
+                self._drop(user_id)
+            self.misses += 1
+            return None
+
+    def get_by_id(self, user_id: int) -> Optional[UserRecord]:
+        return self._get(user_id)
+
+    def get_by_uuid(self, uuid: str) -> Optional[UserRecord]:
+        with self._lock:
+            user_id = self._uuid_to_id.get(uuid)
+        return self._get(user_id)
+
+    def generation(self) -> int:
+        return self._generation
+
+    def put(self, record: UserRecord, loaded_generation: int) -> None:
+        with self._lock:
+            if loaded_generation < self._floor or self._invalidated_gen.get(record.id, -1) > loaded_generation:
+                return
+            self._drop(record.id)
+            self._by_id[record.id] = (record, time.monotonic() + self.ttl)
+            self._uuid_to_id[record.uuid] = record.id
+            while len(self._by_id) > self.max_size:
+                oldest_id = next(iter(self._by_id))
+                self._drop(oldest_id)
+                self.evictions += 1
+
+    def _drop(self, user_id: int) -> None:
+        entry = self._by_id.pop(user_id, None)
+        if entry:
+            self._uuid_to_id.pop(entry[0].uuid, None)
+
+    def invalidate(self, user_ids: Iterable[int]) -> None:
+        with self._lock:
+            self._generation += 1
+            for user_id in user_ids:
+                self._drop(user_id)
+                self._invalidated_gen[user_id] = self._generation
+                self.invalidations += 1
+            # فقط بی‌اعتبارسازی‌های اخیر برای تشخیص بارگذاری همزمان لازم است
+            if len(self._invalidated_gen) > self.max_size:
+                self._invalidated_gen.clear()
+                self._floor = self._generation
+
+    def clear(self) -> None:
+        with self._lock:
+            self._generation += 1
+            self._floor = self._generation
+            self._by_id.clear()
+            self._uuid_to_id.clear()
+
+    def stats(self) -> Dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "size": len(self._by_id),
+                "max_size": self.max_size,
+                "ttl_seconds": self.ttl,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_ratio": round(self.hits / lookups, 4) if lookups else None,
+                "invalidations": self.invalidations,
+                "evictions": self.evictions
+            }
+
+user_cache = UserCache(settings.USER_CACHE_SIZE, settings.USER_CACHE_TTL)
+
+def _latest_subscription_sync(db: Session, user_id: int) -> Optional[Subscription]:
+    from .user_subscription import get_latest_subscription
+    return get_latest_subscription(db, user_id)
+
+def _lookup(db: Session, condition, cached: Optional[UserRecord]) -> Optional[UserRecord]:
+    if cached is not None:
+        return cached
+    generation = user_cache.generation()
+    user = db.execute(select(User).where(condition)).scalars().first()
+    if user is None:
+        return None
+    record = _build_record(user, _latest_subscription_sync(db, user.id))
+    user_cache.put(record, generation)
+    return record
+
+def get_user_record(db: Session, user_id: int) -> Optional[UserRecord]:
+    """رکورد کاربر بر اساس آیدی (از کش یا دیتابیس)"""
+    return _lookup(db, User.id == user_id, user_cache.get_by_id(user_id))
+
+def get_user_record_by_uuid(db: Session, uuid: str) -> Optional[UserRecord]:
+    """رکورد کاربر بر اساس UUID (از کش یا دیتابیس)"""
+    return _lookup(db, User.uuid == uuid, user_cache.get_by_uuid(uuid))
+
+async def get_user_record_by_uuid_async(db: AsyncSession, uuid: str) -> Optional[UserRecord]:
+    """نسخه async از get_user_record_by_uuid"""
+    cached = user_cache.get_by_uuid(uuid)
+    if cached is not None:
+        return cached
+    from .user_subscription import get_latest_subscriptions_async
+    generation = user_cache.generation()
+    user = (await db.execute(select(User).where(User.uuid == uuid))).scalars().first()
+    if user is None:
+        return None
+    subscription = (await get_latest_subscriptions_async(db, [user.id])).get(user.id)
+    record = _build_record(user, subscription)
+    user_cache.put(record, generation)
+    return record
+
+_invalidation_listeners: List[Callable[[Set[int]], None]] = []
+
+def add_invalidation_listener(callback: Callable[[Set[int]], None]) -> None:
+    """ثبت تابعی که پس از بی‌اعتبار شدن کاربران (با آیدی آن‌ها) صدا زده می‌شود"""
+    _invalidation_listeners.append(callback)
+
+def _invalidate(ids: Set[int]) -> None:
+    user_cache.invalidate(ids)
+    for callback in _invalidation_listeners:
+        try:
+            callback(ids)
+        except Exception as e:
+            logger.error(f"User invalidation listener failed: {str(e)}")
+
+def invalidate_users(user_ids: Iterable[int]) -> None:
+    """حذف کاربران از کش (برای تغییرات خارج از ORM مثل query.update/delete)"""
+    ids = {user_id for user_id in user_ids if user_id is not None}
+    if ids:
+        _invalidate(ids)
+
+# -------------------- بی‌اعتبارسازی با رویدادهای ORM --------------------
+def _affected_user_ids(session: Session) -> Set[int]:
+    ids: Set[int] = set()
+    for obj in list(session.dirty) + list(session.deleted):
+        if isinstance(obj, User) and obj.id is not None:
+            ids.add(obj.id)
+        elif isinstance(obj, Subscription) and obj.user_id is not None:
+            ids.add(obj.user_id)
+        elif isinstance(obj, Domain) and obj.owner_id is not None:
+            ids.add(obj.owner_id)
+    for obj in session.new:
+        # سابسکریپشن جدید «آخرین سابسکریپشن» کاربر را تغییر می‌دهد
+        if isinstance(obj, Subscription) and obj.user_id is not None:
+            ids.add(obj.user_id)
+        # دامنه جدید به لینک‌های سابسکریپشن مالک اضافه می‌شود
+        elif isinstance(obj, Domain) and obj.owner_id is not None:
+            ids.add(obj.owner_id)
+    return ids
+
+@event.listens_for(Session, "before_flush")
+def _collect_before_flush(session, flush_context, instances):
+    ids = _affected_user_ids(session)
+    if ids:
+        session.info.setdefault(_PENDING_KEY, set()).update(ids)
+
+@event.listens_for(Session, "after_commit")
+def _apply_after_commit(session):
+    ids = session.info.pop(_PENDING_KEY, None)
+    if ids:
+        _invalidate(ids)
+
+@event.listens_for(Session, "after_rollback")
+def _discard_after_rollback(session):
+    session.info.pop(_PENDING_KEY, None)
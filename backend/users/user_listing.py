@@ -0,0 +1,195 @@
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple
+from datetime import datetime
+import base64
+import json
+from sqlalchemy import select, tuple_, and_, or_
+from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.sql import Select
+from backend.models import User
+
+# ستون‌های قابل مرتب‌سازی (همه ایندکس دارند)
+SORT_COLUMNS = {
+    "id": User.id,
+    "username": User.username,
+    "created_at": User.created_at
+}
+
+# ستون‌های nullable (ردیف‌های قدیمی یا درج شده با Core ممکن است created_at نداشته باشند)؛
+# NULLها مثل ترتیب پیش‌فرض ایندکس Postgres در انتهای ترتیب صعودی و ابتدای نزولی می‌آیند
+# و بین خودشان با آیدی مرتب می‌شوند
+
+STATUS_FILTERS = ("active", "expired", "online", "over_quota")
+
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 200
+
+def encode_cursor(sort: str, value: Any, user_id: int) -> str:
+    """ساخت cursor مات از مقدار ستون مرتب‌سازی و آیدی آخرین ردیف"""
+    if isinstance(value, datetime):
+        value = value.isoformat()
+    payload = json.dumps([sort, value, user_id], separators=(",", ":"))
+    return base64.urlsafe_b64encode(payload.encode()).decode().rstrip("=")
+
+def decode_cursor(cursor: str, sort: str) -> Tuple[Any, int]:
+    """
+    بازکردن cursor
+
+    Raises:
+        ValueError: اگر cursor نامعتبر باشد یا برای مرتب‌سازی دیگری ساخته شده باشد
+    """
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        cursor_sort, value, user_id = json.loads(base64.urlsafe_b64decode(padded))
+    except Exception:
+        raise ValueError("cursor نامعتبر است")
+    if cursor_sort != sort:
+        raise ValueError("cursor با نوع مرتب‌سازی همخوانی ندارد")
+    if sort == "created_at" and value is not None:
+        value = datetime.fromisoformat(value)
+    return value, int(user_id)
+
+def apply_status_filter(stmt: Select, status: Optional[str]) -> Select:
+    """اعمال فیلتر وضعیت سمت سرور"""
+    if status is None:
+        return stmt
+    if status == "active":
+        return stmt.where(User.is_active == True)
+    if status == "expired":
+        return stmt.where(User.expiry_date < datetime.utcnow())
+    if status == "online":
+        return stmt.where(User.is_online == True)
+    if status == "over_quota":
+        return stmt.where(and_(User.traffic_limit > 0, User.traffic_used >= User.traffic_limit))
+    raise ValueError(f"فیلتر نامعتبر. باید یکی از این موارد باشد: {', '.join(STATUS_FILTERS)}")
+
+def build_user_page_query(
+    limit: int = DEFAULT_PAGE_SIZE,
+    cursor: Optional[str] = None,
+    status: Optional[str] = None,
+    sort: str = "id",
+    order: str = "asc"
+) -> Select:
+    """
+    ساخت کوئری یک صفحه از کاربران با صفحه‌بندی keyset
+
+    هزینه هر صفحه مستقل از تعداد کل کاربران است چون به جای OFFSET
+    از مقایسه با آخرین ردیف صفحه قبل روی ستون ایندکس‌دار استفاده می‌شود.
+    یک ردیف اضافه خوانده می‌شود تا وجود صفحه بعد مشخص شود.
+    """
+    if sort not in SORT_COLUMNS:
+        raise ValueError(f"مرتب‌سازی نامعتبر. باید یکی از این موارد باشد: {', '.join(SORT_COLUMNS)}")
+    if order not in ("asc", "desc"):
+        raise ValueError("ترتیب باید asc یا desc باشد")
+
+    column = SORT_COLUMNS[sort]
+    descending = order == "desc"
+    stmt = apply_status_filter(select(User), status)
+
+    if cursor:
+        value, last_id = decode_cursor(cursor, sort)
+        if sort == "id":
+            stmt = stmt.where(User.id < last_id if descending else User.id > last_id)
+        else:
+            stmt = stmt.where(keyset_condition(column, value, last_id, descending))
+
+    if sort == "id":
+        stmt = stmt.order_by(User.id.desc() if descending else User.id.asc())
+    else:
+        stmt = stmt.order_by(
+            column.desc().nulls_first() if descending else column.asc().nulls_last(),
+            User.id.desc() if descending else User.id.asc()
+        )
+
+    return stmt.limit(min(max(limit, 1), MAX_PAGE_SIZE) + 1)
+
+def keyset_condition(column, value: Any, last_id: int, descending: bool):
+    """
+    شرط ردیف‌های بعد از (value, last_id) با در نظر گرفتن NULL
+
+    مقایسه tuple با NULL نتیجه NULL می‌دهد و ردیف‌های بدون مقدار را حذف می‌کرد؛
+    گروه NULL جداگانه و فقط با آیدی مقایسه می‌شود.
+    """
+    if value is None:
+        in_nulls = and_(column.is_(None), User.id < last_id if descending else User.id > last_id)
+        # نزولی: NULLها اول هستند و همه ردیف‌های دارای مقدار بعد از آنها می‌آیند
+        return or_(in_nulls, column.isnot(None)) if descending else in_nulls
+    key = tuple_(column, User.id)
+    if descending:
+        return key < tuple_(value, last_id)
+    return or_(key > tuple_(value, last_id), column.is_(None))
+
+def finalize_page(rows: List[User], limit: int, sort: str) -> Tuple[List[User], Optional[str]]:
+    """جدا کردن ردیف اضافه و ساخت cursor صفحه بعد"""
+    limit = min(max(limit, 1), MAX_PAGE_SIZE)
+    if len(rows) <= limit:
+        return rows, None
+    rows = rows[:limit]
+    last = rows[-1]
+    return rows, encode_cursor(sort, getattr(last, sort), last.id)
+
+class PageStream:
+    """
+    ردیف‌های یک صفحه برای رندر تدریجی قالب به همراه cursor صفحه بعد
+
+    rows حاصل build_user_page_query است (یک ردیف اضافه)؛ ردیف اضافه پس داده نمی‌شود و
+    next_cursor پس از پایان پیمایش مشخص است (قالب آن را بعد از حلقه می‌خواند).
+    """
+
+    def __init__(self, rows: Iterable[User], limit: int = DEFAULT_PAGE_SIZE, sort: str = "id"):
+        self._rows = rows
+        self.limit = min(max(limit, 1), MAX_PAGE_SIZE)
+        self.sort = sort
+        self.next_cursor: Optional[str] = None
+
+    def __iter__(self) -> Iterator[User]:
+        last = None
+        for index, row in enumerate(self._rows):
+            if index == self.limit:
+                self.next_cursor = encode_cursor(self.sort, getattr(last, self.sort), last.id)
+                break
+            last = row
+            yield row
+
+def paginate_users(
+    db: Session,
+    limit: int = DEFAULT_PAGE_SIZE,
+    cursor: Optional[str] = None,
+    status: Optional[str] = None,
+    sort: str = "id",
+    order: str = "asc"
+) -> Tuple[List[User], Optional[str]]:
+    """دریافت یک صفحه از کاربران به همراه cursor صفحه بعد"""
+    stmt = build_user_page_query(limit, cursor, status, sort, order)
+    rows = db.execute(stmt).scalars().all()
+    return finalize_page(list(rows), limit, sort)
+
+async def paginate_users_async(
+    db: AsyncSession,
+    limit: int = DEFAULT_PAGE_SIZE,
+    cursor: Optional[str] = None,
+    status: Optional[str] = None,
+    sort: str = "id",
+    order: str = "asc"
+) -> Tuple[List[User], Optional[str]]:
+    """نسخه async از paginate_users برای مسیرهای async"""
+    stmt = build_user_page_query(limit, cursor, status, sort, order)
+    rows = (await db.execute(stmt)).scalars().all()
+    return finalize_page(list(rows), limit, sort)
+
+def serialize_user_summary(user: User) -> Dict:
+    """خلاصه کاربر برای لیست‌ها"""
+    return {
+        "id": user.id,
+        "username": user.username,
+        "email": user.email,
+        "uuid": user.uuid,
+        "is_active": user.is_active,
+        "is_online": user.is_online or False,
+        "traffic_limit": user.traffic_limit or 0,
+        "traffic_used": user.traffic_used or 0,
+        "simultaneous_connections": user.simultaneous_connections,
+        "expiry_date": user.expiry_date,
+        "last_activity": user.last_activity,
+        "created_at": user.created_at
+    }
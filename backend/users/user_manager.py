@@ -1,6 +1,8 @@
-from pydantic import BaseModel, Field, validator
-from typing import Optional, Dict, List
-from datetime import datetime
+from pydantic import BaseModel, Field, validator, ValidationError
+from typing import Any, Optional, Dict, List
+from datetime import datetime, timedelta
+from sqlalchemy import select, insert, or_
+from sqlalchemy.exc import IntegrityError
 from sqlalchemy.orm import Session
 from fastapi import HTTPException, status
 from backend.models import User, Inbound, Subscription
@@ -11,14 +13,19 @@ from backend.utils import (
     calculate_traffic_usage,
     calculate_remaining_days,
     format_bytes,
-    get_password_hash
+    get_password_hash,
+    hash_passwords
 )
 from backend.config import settings
+from .user_cache import invalidate_users
 import logging
 from pathlib import Path  # ADDED
 
 logger = logging.getLogger(__name__)
 
+# حداکثر تعداد کاربران در یک درخواست ایجاد دسته‌ای
+MAX_BULK_USERS = 1000
+
 class UserCreate(BaseModel):
     """مدل ایجاد کاربر جدید"""
     username: str = Field(..., min_length=3, max_length=50, example="user123")
@@ -103,6 +110,7 @@ class UserManager:
                 
             user.updated_at = datetime.utcnow()
             self.db.commit()
+            invalidate_users([user_id])
             logger.info(f"کاربر به‌روزرسانی شد: {user_id}")
             return user
             
@@ -131,6 +139,8 @@ class UserManager:
             # حذف کاربر
             self.db.delete(user)
             self.db.commit()
+            # حذف سابسکریپشن‌ها با query.delete از رویدادهای ORM عبور نمی‌کند
+            invalidate_users([user_id])
             logger.info(f"کاربر حذف شد: {user_id}")
             return True
             
@@ -139,8 +149,168 @@ class UserManager:
             logger.error(f"خطا در حذف کاربر {user_id}: {str(e)}")
             raise
 
+    def bulk_create(self, rows: List[Dict[str, Any]], apply_xray: bool = True) -> Dict[str, Any]:
+        """
+        ایجاد دسته‌ای کاربران
+
+        - هر ردیف جداگانه اعتبارسنجی می‌شود و خطای آن بدون شکست کل دسته گزارش می‌شود
+        - تکراری بودن نام کاربری/ایمیل با یک کوئری بررسی می‌شود
+        - رمزها در process pool هش می‌شوند
+        - کاربران با یک INSERT چندردیفی (RETURNING) و سابسکریپشن‌ها با یک INSERT دیگر ثبت می‌شوند
+        - کانفیگ Xray فقط یک بار در پایان اعمال می‌شود
+        """
+        if len(rows) > MAX_BULK_USERS:
+            raise ValueError(f"حداکثر {MAX_BULK_USERS} کاربر در هر درخواست مجاز است")
+
+        errors: List[Dict[str, Any]] = []
+        valid: List[tuple] = []
+        seen_usernames, seen_emails = set(), set()
+
+        # 1. اعتبارسنجی هر ردیف
+        for index, row in enumerate(rows):
+            username = row.get("username") if isinstance(row, dict) else None
+            try:
+                data = UserCreate(**row) if isinstance(row, dict) else None
+                if data is None:
+                    raise ValueError("ردیف باید یک آبجکت باشد")
+            except (ValidationError, TypeError, ValueError) as e:
+                errors.append({"index": index, "username": username, "error": _format_error(e)})
+                continue
+            if data.username in seen_usernames:
+                errors.append({"index": index, "username": data.username, "error": "نام کاربری در این دسته تکراری است"})
+                continue
+            if data.email and data.email in seen_emails:
+                errors.append({"index": index, "username": data.username, "error": "ایمیل در این دسته تکراری است"})
+                continue
+            seen_usernames.add(data.username)
+            if data.email:
+                seen_emails.add(data.email)
+            valid.append((index, data))
+
+        # 2. حذف ردیف‌هایی که در دیتابیس تکراری هستند
+        valid = self._drop_existing(valid, errors)
+        if not valid:
+            return {"created": [], "errors": sorted(errors, key=lambda e: e["index"]), "xray_applied": False}
+
+        # 3. هش رمزها خارج از تراکنش
+        hashes = hash_passwords([data.password for _, data in valid])
+
+        # 4. درج دسته‌ای کاربران و سابسکریپشن‌ها در یک تراکنش
+        try:
+            created = self._insert_batch(valid, hashes)
+        except IntegrityError:
+            # درج همزمان توسط درخواست دیگر؛ یک بار دیگر تکراری‌ها را حذف و تلاش می‌کنیم
+            self.db.rollback()
+            retry = self._drop_existing(valid, errors)
+            retry_indexes = {index for index, _ in retry}
+            hashes = [h for (index, _), h in zip(valid, hashes) if index in retry_indexes]
+            valid = retry
+            try:
+                created = self._insert_batch(valid, hashes) if valid else []
+            except Exception as e:
+                self.db.rollback()
+                logger.error(f"خطا در ایجاد دسته‌ای کاربران: {str(e)}")
+                raise
+        except Exception as e:
+            self.db.rollback()
+            logger.error(f"خطا در ایجاد دسته‌ای کاربران: {str(e)}")
+            raise
+
+        # 5. دایرکتوری کاربران و اعمال یک‌باره کانفیگ Xray
+        for item in created:
+            (self.user_data_dir / item["username"]).mkdir(parents=True, exist_ok=True)
+
+        xray_applied = False
+        if created and apply_xray:
+            from backend.xray_config.xray_manager import XrayManager
+            xray_applied = XrayManager(self.db).update_xray_config()
+
+        logger.info(f"{len(created)} کاربر به صورت دسته‌ای ایجاد شد ({len(errors)} خطا)")
+        return {
+            "created": created,
+            "errors": sorted(errors, key=lambda e: e["index"]),
+            "xray_applied": xray_applied
+        }
+
+    def _drop_existing(self, valid: List[tuple], errors: List[Dict[str, Any]]) -> List[tuple]:
+        """حذف ردیف‌هایی که نام کاربری یا ایمیل آنها از قبل وجود دارد (یک کوئری)"""
+        if not valid:
+            return valid
+        usernames = [data.username for _, data in valid]
+        emails = [data.email for _, data in valid if data.email]
+        conditions = [User.username.in_(usernames)]
+        if emails:
+            conditions.append(User.email.in_(emails))
+        existing = self.db.execute(select(User.username, User.email).where(or_(*conditions))).all()
+        taken_usernames = {username for username, _ in existing}
+        taken_emails = {email for _, email in existing if email}
+
+        remaining = []
+        for index, data in valid:
+            if data.username in taken_usernames:
+                errors.append({"index": index, "username": data.username, "error": "نام کاربری قبلاً استفاده شده است"})
+            elif data.email and data.email in taken_emails:
+                errors.append({"index": index, "username": data.username, "error": "ایمیل قبلاً استفاده شده است"})
+            else:
+                remaining.append((index, data))
+        return remaining
+
+    def _insert_batch(self, valid: List[tuple], hashes: List[str]) -> List[Dict[str, Any]]:
+        """درج کاربران و سابسکریپشن اولیه آنها و commit"""
+        now = datetime.utcnow()
+        user_rows = []
+        for (_, data), hashed in zip(valid, hashes):
+            user_rows.append({
+                "username": data.username,
+                "email": data.email,
+                "hashed_password": hashed,
+                "uuid": generate_uuid(),
+                "traffic_limit": data.traffic_limit,
+                "usage_duration": data.usage_duration,
+                "simultaneous_connections": data.simultaneous_connections,
+                "expiry_date": now + timedelta(days=data.usage_duration),
+                "is_active": True,
+                "created_at": now,
+                "last_activity": now,
+                "data_dir": str(self.user_data_dir / data.username)
+            })
+
+        inserted = self.db.execute(
+            insert(User).returning(User.id, User.username, User.uuid),
+            user_rows,
+            execution_options={"synchronize_session": False}
+        ).all()
+        ids = {username: (user_id, uuid) for user_id, username, uuid in inserted}
+
+        subscription_rows = []
+        for (_, data), row in zip(valid, user_rows):
+            subscription_rows.append({
+                "uuid": generate_uuid(),
+                "user_id": ids[data.username][0],
+                "data_limit": data.traffic_limit,
+                "expiry_date": row["expiry_date"],
+                "max_connections": data.simultaneous_connections,
+                "is_active": True,
+                "created_at": now
+            })
+        self.db.execute(insert(Subscription), subscription_rows)
+        self.db.commit()
+
+        return [
+            {"index": index, "id": ids[data.username][0], "username": data.username, "uuid": ids[data.username][1]}
+            for index, data in valid
+        ]
+
     # ... (بقیه توابع بدون تغییر)
 
+def _format_error(error: Exception) -> str:
+    """متن خوانای خطای اعتبارسنجی یک ردیف"""
+    if isinstance(error, ValidationError):
+        return "; ".join(
+            f"{'.'.join(str(part) for part in e['loc'])}: {e['msg']}" for e in error.errors()
+        )
+    return str(error)
+
 # ============ توابع اضافه شده ============
 def get_user_by_uuid(db: Session, uuid: str) -> Optional[User]:  # ADDED
     """دریافت کاربر بر اساس UUID"""
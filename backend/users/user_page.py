@@ -6,11 +6,12 @@ from backend.models import User, Inbound, Subscription
 from backend.database import get_db
 from backend.utils import (
     generate_subscription_link,
-    generate_qr_code,
     calculate_remaining_days,
     calculate_traffic_usage
 )
 from backend.config import settings
+from backend.qr_cache import qr_url
+from .user_subscription import get_latest_subscription
 import logging
 
 logger = logging.getLogger(__name__)
@@ -22,7 +23,7 @@ def get_user_page(db: Session, user_id: int) -> Dict:
     - وضعیت ترافیک
     - لینک‌های اشتراک‌گذاری
     - کانفیگ‌های فعال
-    - QR Code
+    - آدرس تصاویر QR Code (رندر در اولین درخواست /qr/...، نه داخل پاسخ)
     
     Args:
         db: Session دیتابیس
@@ -32,7 +33,7 @@ def get_user_page(db: Session, user_id: int) -> Dict:
         Dict: اطلاعات کامل صفحه کاربر
         
     Raises:
-        HTTPException: اگر کاربر یافت نشد
+        HTTPException: اگر کاربر یافت نشد یا PANEL_DOMAIN و SERVER_IP هیچ‌کدام تنظیم نشده باشند
     """
     try:
         # 1. دریافت اطلاعات کاربر
@@ -45,10 +46,7 @@ def get_user_page(db: Session, user_id: int) -> Dict:
             )
 
         # 2. دریافت سابسکریپشن‌های فعال
-        subscription = db.query(Subscription)\
-                        .filter(Subscription.user_id == user_id)\
-                        .order_by(Subscription.created_at.desc())\
-                        .first()
+        subscription = get_latest_subscription(db, user_id)
 
         # 3. دریافت اینباندهای مرتبط
         inbounds = db.query(Inbound)\
@@ -61,14 +59,30 @@ def get_user_page(db: Session, user_id: int) -> Dict:
             db_user.traffic_used
         ) if db_user.traffic_limit > 0 else 0
 
-        # 5. تولید لینک‌ها و QR Code
+        # 5. تولید لینک‌ها و آدرس QR Code
+        domain = settings.PANEL_DOMAIN or settings.SERVER_IP
+        if not domain:
+            # بدون آدرس پنل لینک‌ها (و QRهای کش شده آنها) به https://None اشاره می‌کردند
+            logger.error("PANEL_DOMAIN and SERVER_IP are not configured; cannot build user links")
+            raise HTTPException(
+                status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+                detail="PANEL_DOMAIN یا SERVER_IP تنظیم نشده است"
+            )
         subscription_link = generate_subscription_link(
-            domain=settings.DOMAIN,
-            uuid=db_user.uuid,
-            protocol=subscription.protocol if subscription else "vmess"
+            domain=domain,
+            uuid=db_user.uuid
         )
-        
-        subscription_qr = generate_qr_code(subscription_link)
+        panel_url = f"https://{domain}"
+
+        configs = []
+        for inbound in inbounds:
+            config_link = f"{panel_url}/config/{inbound.protocol}/{db_user.uuid}"
+            configs.append({
+                "protocol": inbound.protocol,
+                "port": inbound.port,
+                "config_link": config_link,
+                "qr_code_url": qr_url(config_link)
+            })
 
         # 6. آماده‌سازی پاسخ
         return {
@@ -92,21 +106,14 @@ def get_user_page(db: Session, user_id: int) -> Dict:
             },
             "connection_info": {
                 "subscription_link": subscription_link,
-                "subscription_qr": subscription_qr,
-                "configs": [
-                    {
-                        "protocol": inbound.protocol,
-                        "port": inbound.port,
-                        "config_link": f"{settings.PANEL_URL}/config/{inbound.protocol}/{db_user.uuid}",
-                        "qr_code": generate_qr_code(
-                            f"{settings.PANEL_URL}/config/{inbound.protocol}/{db_user.uuid}"
-                        )
-                    }
-                    for inbound in inbounds
-                ]
+                "subscription_qr_url": qr_url(subscription_link),
+                "subscription_qr_svg_url": qr_url(subscription_link, "svg"),
+                "configs": configs
             }
         }
 
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"خطا در دریافت اطلاعات صفحه کاربر {user_id}: {str(e)}")
         raise HTTPException(
@@ -0,0 +1,169 @@
+from typing import Dict, List, Set, Tuple
+from bisect import bisect_left
+from collections import defaultdict
+import threading
+from sqlalchemy import select, func, or_, case, literal
+from sqlalchemy.orm import Session
+from backend.models import User
+import logging
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_SEARCH_LIMIT = 20
+MAX_SEARCH_LIMIT = 100
+# حداقل شباهت trigram برای تطبیق‌های تقریبی (مقدار پیش‌فرض pg_trgm)
+MIN_SIMILARITY = 0.3
+
+def _escape_like(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+
+def _trigrams(value: str) -> Set[str]:
+    """trigramهای یک رشته به روش pg_trgm (با دو فاصله در ابتدا و یکی در انتها)"""
+    padded = f"  {value.lower()} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+def _similarity(a: Set[str], b: Set[str]) -> float:
+    if not a or not b:
+        return 0.0
+    return len(a & b) / len(a | b)
+
+# -------------------- PostgreSQL (pg_trgm) --------------------
+def _search_postgres(db: Session, query: str, limit: int) -> List[Tuple[User, float]]:
+    """
+    جستجو با ایندکس‌های GIN trigram روی username و email و ایندکس الگویی روی uuid
+
+    ترتیب نتایج: تطابق کامل، سپس پیشوند، سپس شباهت trigram
+    """
+    pattern = _escape_like(query)
+    lowered = query.lower()
+    similarity = func.greatest(
+        func.similarity(User.username, query),
+        func.similarity(func.coalesce(User.email, ""), query)
+    )
+    rank = case(
+        (or_(func.lower(User.username) == lowered, User.uuid == lowered), literal(3.0)),
+        (or_(User.username.ilike(f"{pattern}%"), User.uuid.like(f"{pattern}%")), literal(2.0)),
+        else_=similarity
+    )
+    stmt = (
+        select(User, rank.label("score"))
+        .where(or_(
+            User.username.ilike(f"%{pattern}%"),
+            User.email.ilike(f"%{pattern}%"),
+            User.uuid.like(f"{pattern}%"),
+            User.username.op("%")(query)
+        ))
+        .order_by(rank.desc(), User.id)
+        .limit(limit)
+    )
+    return [(user, float(score)) for user, score in db.execute(stmt).all()]
+
+# -------------------- حافظه (fallback برای تست و دیتابیس‌های غیر Postgres) --------------------
+class TrigramIndex:
+    """
+    ایندکس trigram در حافظه روی username، email و uuid
+
+    برای دیتابیس‌هایی که pg_trgm ندارند (مثل SQLite در تست‌ها) استفاده می‌شود.
+    ایندکس با تغییر امضای جدول کاربران (تعداد، بیشترین آیدی و آخرین به‌روزرسانی) بازسازی می‌شود.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._signature = None
+        self._postings: Dict[str, Set[int]] = defaultdict(set)
+        self._grams: Dict[int, Set[str]] = {}
+        self._fields: Dict[int, Tuple[str, str, str]] = {}
+        self._sorted_keys: List[Tuple[str, int]] = []
+
+    def _table_signature(self, db: Session):
+        return db.execute(
+            select(func.count(User.id), func.max(User.id), func.max(User.updated_at))
+        ).one()
+
+    def _rebuild(self, db: Session) -> None:
+        postings: Dict[str, Set[int]] = defaultdict(set)
+        grams: Dict[int, Set[str]] = {}
+        fields: Dict[int, Tuple[str, str, str]] = {}
+        keys: List[Tuple[str, int]] = []
+
+        rows = db.execute(select(User.id, User.username, User.email, User.uuid))
+        for user_id, username, email, uuid in rows:
+            username, email, uuid = (username or "").lower(), (email or "").lower(), (uuid or "").lower()
+            user_grams = _trigrams(username) | _trigrams(email)
+            for gram in user_grams:
+                postings[gram].add(user_id)
+            grams[user_id] = user_grams
+            fields[user_id] = (username, email, uuid)
+            keys.append((username, user_id))
+            keys.append((uuid, user_id))
+
+        keys.sort()
+        self._postings, self._grams, self._fields, self._sorted_keys = postings, grams, fields, keys
+
+    def ensure_fresh(self, db: Session) -> None:
+        signature = tuple(self._table_signature(db))
+        with self._lock:
+            if signature != self._signature:
+                self._rebuild(db)
+                self._signature = signature
+
+    def search(self, query: str, limit: int) -> List[Tuple[int, float]]:
+        lowered = query.lower()
+        scores: Dict[int, float] = {}
+
+        # پیشوند username و uuid با جستجوی دودویی روی کلیدهای مرتب
+        start = bisect_left(self._sorted_keys, (lowered, -1))
+        for key, user_id in self._sorted_keys[start:]:
+            if not key.startswith(lowered):
+                break
+            scores[user_id] = 3.0 if key == lowered else 2.0
+
+        # زیررشته و شباهت trigram
+        query_grams = _trigrams(lowered)
+        if len(lowered) < 3:
+            # عبارت کوتاه trigram داخلی ندارد و وسط رشته پیدا نمی‌شد (برخلاف ILIKE در Postgres)؛
+            # پیمایش ساده زیررشته روی همه کاربران
+            candidates = {
+                user_id for user_id, (username, email, _) in self._fields.items()
+                if lowered in username or lowered in email
+            }
+        else:
+            candidates = set()
+            for gram in query_grams:
+                candidates |= self._postings.get(gram, set())
+        for user_id in candidates:
+            if user_id in scores:
+                continue
+            username, email, _ = self._fields[user_id]
+            similarity = _similarity(query_grams, self._grams[user_id])
+            if lowered in username or lowered in email or similarity >= MIN_SIMILARITY:
+                scores[user_id] = similarity
+
+        ranked = sorted(scores.items(), key=lambda item: (-item[1], item[0]))
+        return ranked[:limit]
+
+_memory_index = TrigramIndex()
+
+def _search_memory(db: Session, query: str, limit: int) -> List[Tuple[User, float]]:
+    _memory_index.ensure_fresh(db)
+    ranked = _memory_index.search(query, limit)
+    if not ranked:
+        return []
+    users = {u.id: u for u in db.execute(select(User).where(User.id.in_([i for i, _ in ranked]))).scalars()}
+    return [(users[user_id], score) for user_id, score in ranked if user_id in users]
+
+def search_users(db: Session, query: str, limit: int = DEFAULT_SEARCH_LIMIT) -> List[Tuple[User, float]]:
+    """
+    جستجوی پیشوندی/زیررشته‌ای روی username، email و UUID با رتبه‌بندی
+
+    Returns:
+        List[Tuple[User, float]]: کاربران به همراه امتیاز (۳ تطابق کامل، ۲ پیشوند، کمتر از ۱ شباهت)
+    """
+    query = query.strip()
+    if not query:
+        return []
+    limit = min(max(limit, 1), MAX_SEARCH_LIMIT)
+
+    if db.get_bind().dialect.name == "postgresql":
+        return _search_postgres(db, query, limit)
+    return _search_memory(db, query, limit)
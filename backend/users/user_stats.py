@@ -10,6 +10,7 @@ from backend.utils import (
     format_bytes
 )
 from backend.config import settings
+from .user_subscription import get_latest_subscription, get_latest_subscriptions
 import logging
 
 logger = logging.getLogger(__name__)
@@ -42,10 +43,7 @@ def get_user_stats(db: Session, user_id: int) -> Dict:
                 detail="کاربر مورد نظر یافت نشد"
             )
 
-        subscription = db.query(Subscription)\
-                        .filter(Subscription.user_id == user_id)\
-                        .order_by(Subscription.created_at.desc())\
-                        .first()
+        subscription = get_latest_subscription(db, user_id)
 
         # 2. محاسبات ترافیک
         traffic_percentage = calculate_traffic_usage(
@@ -101,13 +99,12 @@ def get_all_users_stats(db: Session) -> List[Dict]:
     """
     try:
         users = db.query(User).all()
+        # آخرین سابسکریپشن تمام کاربران با یک کوئری (به جای یک کوئری برای هر کاربر)
+        latest_subscriptions = get_latest_subscriptions(db)
         stats_list = []
         
         for user in users:
-            subscription = db.query(Subscription)\
-                            .filter(Subscription.user_id == user.id)\
-                            .order_by(Subscription.created_at.desc())\
-                            .first()
+            subscription = latest_subscriptions.get(user.id)
             
             stats_list.append({
                 "id": user.id,
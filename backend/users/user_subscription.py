@@ -1,6 +1,9 @@
-from typing import Dict, Optional
+from typing import Dict, Iterable, Optional
 from fastapi import HTTPException, status
-from sqlalchemy.orm import Session
+from sqlalchemy import select, func
+from sqlalchemy.orm import Session, aliased
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.sql import Select
 from backend.models import User, Subscription
 from backend.database import get_db
 from backend.utils import (
@@ -9,10 +12,69 @@ from backend.utils import (
     format_bytes
 )
 from backend.config import settings
+from .user_cache import get_user_record
 import logging
 
 logger = logging.getLogger(__name__)
 
+def latest_subscriptions_query(user_ids: Optional[Iterable[int]] = None, dialect: str = "postgresql") -> Select:
+    """
+    کوئری set-based «آخرین سابسکریپشن هر کاربر»
+
+    روی Postgres از DISTINCT ON استفاده می‌شود که با ایندکس
+    (user_id, created_at DESC) بدون مرتب‌سازی جداگانه اجرا می‌شود؛
+    برای سایر دیتابیس‌ها از row_number() استفاده می‌شود.
+    """
+    if dialect == "postgresql":
+        stmt = (
+            select(Subscription)
+            .distinct(Subscription.user_id)
+            .order_by(Subscription.user_id, Subscription.created_at.desc(), Subscription.id.desc())
+        )
+        if user_ids is not None:
+            stmt = stmt.where(Subscription.user_id.in_(list(user_ids)))
+        return stmt
+
+    ranked = select(
+        Subscription,
+        func.row_number().over(
+            partition_by=Subscription.user_id,
+            order_by=(Subscription.created_at.desc(), Subscription.id.desc())
+        ).label("rank")
+    )
+    if user_ids is not None:
+        ranked = ranked.where(Subscription.user_id.in_(list(user_ids)))
+    ranked = ranked.subquery()
+    latest = aliased(Subscription, ranked)
+    return select(latest).where(ranked.c.rank == 1)
+
+def get_latest_subscriptions(db: Session, user_ids: Optional[Iterable[int]] = None) -> Dict[int, Subscription]:
+    """
+    آخرین سابسکریپشن کاربران با یک کوئری
+
+    Args:
+        db: Session دیتابیس
+        user_ids: آیدی کاربران (None یعنی همه کاربران)
+
+    Returns:
+        Dict[int, Subscription]: نگاشت آیدی کاربر به آخرین سابسکریپشن
+    """
+    stmt = latest_subscriptions_query(user_ids, db.get_bind().dialect.name)
+    return {sub.user_id: sub for sub in db.execute(stmt).scalars()}
+
+def get_latest_subscription(db: Session, user_id: int) -> Optional[Subscription]:
+    """آخرین سابسکریپشن یک کاربر"""
+    return get_latest_subscriptions(db, [user_id]).get(user_id)
+
+async def get_latest_subscriptions_async(
+    db: AsyncSession,
+    user_ids: Optional[Iterable[int]] = None
+) -> Dict[int, Subscription]:
+    """نسخه async از get_latest_subscriptions"""
+    stmt = latest_subscriptions_query(user_ids, db.bind.dialect.name)
+    result = await db.execute(stmt)
+    return {sub.user_id: sub for sub in result.scalars()}
+
 def get_user_subscription_link(db: Session, user_id: int) -> Optional[str]:
     """
     دریافت لینک اشتراک‌گذاری کاربر
@@ -25,21 +87,14 @@ def get_user_subscription_link(db: Session, user_id: int) -> Optional[str]:
         str: لینک اشتراک‌گذاری یا None اگر کاربر وجود نداشت
     """
     try:
-        db_user = db.query(User).filter(User.id == user_id).first()
-        if not db_user:
+        record = get_user_record(db, user_id)
+        if not record:
             logger.warning(f"لینک سابسکریپشن - کاربر {user_id} یافت نشد")
             return None
 
-        subscription = db.query(Subscription)\
-                       .filter(Subscription.user_id == user_id)\
-                       .order_by(Subscription.created_at.desc())\
-                       .first()
-
-        protocol = subscription.protocol if subscription else "vmess"
         return generate_subscription_link(
-            domain=settings.DOMAIN,
-            uuid=db_user.uuid,
-            protocol=protocol
+            domain=settings.PANEL_DOMAIN or settings.SERVER_IP,
+            uuid=record.uuid
         )
 
     except Exception as e:
@@ -64,38 +119,35 @@ def get_user_subscription_info(db: Session, user_id: int) -> Dict:
         HTTPException: اگر کاربر یافت نشد
     """
     try:
-        db_user = db.query(User).filter(User.id == user_id).first()
-        if not db_user:
+        record = get_user_record(db, user_id)
+        if not record or not record.subscription:
             raise HTTPException(
                 status_code=status.HTTP_404_NOT_FOUND,
                 detail="کاربر مورد نظر یافت نشد"
             )
 
-        subscription = db.query(Subscription)\
-                       .filter(Subscription.user_id == user_id)\
-                       .order_by(Subscription.created_at.desc())\
-                       .first()
+        subscription = record.subscription
+        # مصرف در سطح کاربر ثبت می‌شود
+        used_data = record.traffic_used
+        remaining_days = calculate_remaining_days(subscription.expiry_date)
 
         return {
             "user": {
-                "username": db_user.username,
-                "uuid": db_user.uuid
+                "username": record.username,
+                "uuid": record.uuid
             },
             "subscription": {
                 "data_limit": format_bytes(subscription.data_limit),
-                "used_data": format_bytes(subscription.used_data),
+                "used_data": format_bytes(used_data),
                 "remaining_data": format_bytes(
-                    subscription.data_limit - subscription.used_data
+                    max(subscription.data_limit - used_data, 0)
                 ),
                 "expiry_date": subscription.expiry_date,
-                "remaining_days": calculate_remaining_days(
-                    subscription.expiry_date
-                ),
+                "remaining_days": remaining_days,
                 "max_connections": subscription.max_connections,
                 "status": "active" if (
-                    subscription and 
                     subscription.is_active and
-                    calculate_remaining_days(subscription.expiry_date) > 0
+                    remaining_days > 0
                 ) else "inactive"
             }
         }
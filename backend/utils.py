@@ -1,28 +1,27 @@
 from passlib.context import CryptContext
 from jose import jwt, JWTError
 from datetime import datetime, timedelta
-from typing import Optional, Callable, Any, Coroutine
+from typing import Optional, Callable, Any, Coroutine, List
 import secrets
 import string
-import qrcode
-import io
 import base64
 import subprocess
 from pathlib import Path
 import logging
 import asyncio
 from functools import wraps
-from fastapi import Depends, HTTPException, status
+from fastapi import Depends, HTTPException, Request, status
 from fastapi.security import OAuth2PasswordBearer
 from sqlalchemy import text
 from backend.config import settings
 from backend import schemas
 
-# Password hashing
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+# Password hashing (shared context; cost factor comes from BCRYPT_ROUNDS)
+from backend.hashing import pwd_context, password_hasher
 
 # Authentication
-oauth2_scheme = OAuth2PasswordBearer(tokenUrl="token")
+# auto_error=False: اگر هدر Authorization نباشد کوکی access_token صفحات پنل بررسی می‌شود
+oauth2_scheme = OAuth2PasswordBearer(tokenUrl="token", auto_error=False)
 
 # Logger setup
 logger = logging.getLogger(__name__)
@@ -54,6 +53,10 @@ def get_password_hash(password: str) -> str:
     """Hash a password using bcrypt"""
     return pwd_context.hash(password)
 
+def hash_passwords(passwords: List[str]) -> List[str]:
+    """Hash a batch of passwords in the shared password hashing process pool"""
+    return password_hasher.hash_many(passwords)
+
 def verify_password(plain_password: str, hashed_password: str) -> bool:
     """Verify a password against its hash"""
     return pwd_context.verify(plain_password, hashed_password)
@@ -81,13 +84,19 @@ def verify_token(token: str) -> Optional[str]:
     except JWTError:
         return None
 
-async def get_current_user(token: str = Depends(oauth2_scheme)):
-    """Get current user from JWT token"""
+async def get_current_user(request: Request, token: Optional[str] = Depends(oauth2_scheme)):
+    """Get current user from JWT token (Authorization header or the panel's access_token cookie)"""
     credentials_exception = HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
         detail="Could not validate credentials",
         headers={"WWW-Authenticate": "Bearer"},
     )
+    if token is None:
+        scheme, _, value = request.cookies.get("access_token", "").partition(" ")
+        if scheme.lower() == "bearer" and value:
+            token = value
+    if not token:
+        raise credentials_exception
     try:
         payload = jwt.decode(
             token, 
@@ -97,7 +106,8 @@ async def get_current_user(token: str = Depends(oauth2_scheme)):
         username: str = payload.get("sub")
         if username is None:
             raise credentials_exception
-        return schemas.User(username=username)
+        # توکن فقط نام کاربری دارد؛ بقیه فیلدهای اجباری schemas.User بدون اعتبارسنجی خالی می‌مانند
+        return schemas.User.model_construct(username=username)
     except JWTError:
         raise credentials_exception
 
@@ -123,20 +133,9 @@ def generate_random_password(length: int = 12) -> str:
     return ''.join(secrets.choice(chars) for _ in range(length))
 
 def generate_qr_code(data: str) -> str:
-    """Generate base64 encoded QR code"""
-    qr = qrcode.QRCode(
-        version=1,
-        error_correction=qrcode.constants.ERROR_CORRECT_L,
-        box_size=10,
-        border=4,
-    )
-    qr.add_data(data)
-    qr.make(fit=True)
-    
-    img = qr.make_image(fill_color="black", back_color="white")
-    buffered = io.BytesIO()
-    img.save(buffered, format="PNG")
-    return base64.b64encode(buffered.getvalue()).decode()
+    """Generate base64 encoded QR code (served from the shared QR cache)"""
+    from backend.qr_cache import qr_cache
+    return base64.b64encode(qr_cache.get_or_render(data, "png")).decode()
 
 def setup_ssl(domain: str, email: str = "admin@example.com") -> bool:
     """Setup SSL certificate using certbot"""
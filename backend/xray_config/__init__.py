@@ -1,5 +1,7 @@
 # backend/xray_config/__init__.py
 
+from contextlib import contextmanager
+
 # ابتدا ایمپورت تنظیمات پایه
 from .settings import xray_settings
 from .tls_http import http_settings, tls_settings
@@ -33,18 +35,24 @@ from .subscription import (
 # ایمپورت اصلی کلاس XrayManager
 from .xray_manager import XrayManager
 
-# مدیریت Singleton
-_xray_manager_instance = None
+def get_xray_manager(db_session):
+    """
+    XrayManager روی session فراخواننده
 
-def get_xray_manager(db_session=None):
-    """تابع برای دریافت نمونه XrayManager با الگوی Singleton"""
-    global _xray_manager_instance
-    
-    if _xray_manager_instance is None:
-        from backend.database import SessionLocal
-        _xray_manager_instance = XrayManager(db_session or SessionLocal())
-    
-    return _xray_manager_instance
+    نمونه سراسری با session دائمی حذف شد چون یک اتصال pool را برای همیشه نگه می‌داشت؛
+    session توسط فراخواننده (مثلاً وابستگی get_db) بسته می‌شود.
+    """
+    return XrayManager(db_session)
+
+@contextmanager
+def xray_manager_scope():
+    """XrayManager با session کوتاه‌مدت برای کارهای پس‌زمینه؛ اتصال در پایان بلوک آزاد می‌شود"""
+    from backend.database import SessionLocal
+    db = SessionLocal()
+    try:
+        yield XrayManager(db)
+    finally:
+        db.close()
 
 # لیست صادرات ماژول
 __all__ = [
@@ -84,5 +92,6 @@ __all__ = [
     
     # مدیریت Xray
     'XrayManager',
-    'get_xray_manager'
+    'get_xray_manager',
+    'xray_manager_scope'
 ]
@@ -0,0 +1,212 @@
+"""
+تولید لینک‌های اشتراک‌گذاری (vless://، vmess://، trojan://، ss://) از اینباندها
+
+تنظیمات اینباند می‌تواند به شکل ساده ({"network": "ws", "path": "/x"}) یا به شکل
+کانفیگ Xray ({"streamSettings": {"network": "ws", "wsSettings": {"path": "/x"}}}) ذخیره شده باشد.
+"""
+import base64
+import json
+from dataclasses import dataclass
+from typing import Dict, Iterable, List, Optional, Tuple
+from urllib.parse import quote, urlencode
+
+from backend.config import settings
+
+# پروتکل‌هایی که برای کلاینت‌ها لینک اشتراک‌گذاری دارند
+SHAREABLE_PROTOCOLS = ("vless", "vmess", "trojan", "shadowsocks")
+
+# انتقال‌هایی که از پشت CDN (پروکسی HTTP) عبور می‌کنند
+CDN_NETWORKS = ("ws", "grpc", "httpupgrade", "xhttp", "splithttp")
+# انتقال‌های HTTP که path و host دارند
+HTTP_PATH_NETWORKS = ("ws", "httpupgrade", "xhttp", "splithttp")
+
+@dataclass(frozen=True)
+class Host:
+    """
+    مقصد اتصال کلاینت‌ها برای یک دامنه
+
+    name: نام دامنه (Host و SNI)
+    addresses: آدرس‌های اتصال؛ برای دامنه پشت CDN آی‌پی/هاست‌های edge و در غیر این صورت خود دامنه
+    port: پورت اتصال روی CDN (None یعنی پورت اینباند)
+    """
+    name: str
+    addresses: Tuple[str, ...]
+    port: Optional[int] = None
+    cdn: bool = False
+
+def domain_host(name: str, config: Optional[Dict] = None) -> Host:
+    """Host یک دامنه از روی domain.config (تنظیمات CDN در config["cdn"])"""
+    cdn = (config or {}).get("cdn")
+    if not cdn:
+        return Host(name=name, addresses=(name,))
+    options = {**(cdn.get("config") or cdn.get("settings") or {}), **cdn}
+    addresses = options.get("addresses") or options.get("address") or [name]
+    if isinstance(addresses, str):
+        addresses = [addresses]
+    port = options.get("port")
+    return Host(name=name, addresses=tuple(addresses), port=int(port) if port else None, cdn=True)
+
+def _first(value) -> Optional[str]:
+    if isinstance(value, (list, tuple)):
+        return value[0] if value else None
+    return value
+
+def stream_options(inbound_settings: Optional[Dict]) -> Dict:
+    """یکسان‌سازی تنظیمات انتقال اینباند (network، security، path، sni و ...)"""
+    data = inbound_settings or {}
+    stream = data.get("streamSettings") or {}
+    network = data.get("network") or stream.get("network") or "tcp"
+    security = data.get("security") or stream.get("security") or "none"
+    ws = stream.get("wsSettings") or {}
+    http_upgrade = stream.get("httpupgradeSettings") or {}
+    xhttp = stream.get("xhttpSettings") or stream.get("splithttpSettings") or {}
+    grpc = stream.get("grpcSettings") or {}
+    tls = stream.get("tlsSettings") or {}
+    reality = stream.get("realitySettings") or {}
+    clients = data.get("clients") or []
+
+    return {
+        "network": network,
+        "security": security,
+        "path": (
+            data.get("path") or ws.get("path") or http_upgrade.get("path") or xhttp.get("path")
+            or (settings.XRAY_PATH if network == "ws" else None)
+        ),
+        "host": data.get("host") or (ws.get("headers") or {}).get("Host") or http_upgrade.get("host") or xhttp.get("host"),
+        "service_name": data.get("serviceName") or grpc.get("serviceName"),
+        "sni": data.get("sni") or tls.get("serverName") or _first(reality.get("serverNames")),
+        "fingerprint": data.get("fingerprint") or reality.get("fingerprint") or ("chrome" if security == "reality" else None),
+        "flow": data.get("flow") or (clients[0].get("flow") if clients and isinstance(clients[0], dict) else None),
+        "public_key": data.get("publicKey") or (settings.REALITY_PUBLIC_KEY if security == "reality" else None),
+        "short_id": data.get("shortId") or _first(reality.get("shortIds")) or (settings.REALITY_SHORT_ID if security == "reality" else None),
+        "method": data.get("method"),
+        "password": data.get("password")
+    }
+
+def compile_templates(inbounds: Iterable[Dict], hosts: Iterable[Host]) -> List[Dict]:
+    """
+    قالب اتصال‌ها (هر اینباند روی هر مقصد) بدون اطلاعات کاربر
+
+    قالب‌ها فقط به اینباندها و دامنه‌ها وابسته‌اند و برای همه کاربران با همان دامنه‌ها
+    یک بار ساخته می‌شوند؛ expand_templates فقط UUID و نام کاربر را اضافه می‌کند.
+    inbounds: دیکشنری‌هایی با protocol، port، tag و settings
+    """
+    hosts = list(hosts)
+    multiple = sum(len(host.addresses) for host in hosts) > 1
+    templates = []
+    for inbound in inbounds:
+        protocol = inbound["protocol"]
+        if protocol not in SHAREABLE_PROTOCOLS or not inbound.get("port"):
+            continue
+        options = stream_options(inbound.get("settings"))
+        if protocol == "shadowsocks" and not (options["method"] and options["password"]):
+            continue
+        if protocol == "trojan" and options["security"] == "none":
+            options["security"] = "tls"
+        for host in hosts:
+            host_options = options
+            if host.cdn:
+                # CDN فقط انتقال‌های HTTP با TLS خودش را عبور می‌دهد
+                if options["network"] not in CDN_NETWORKS or options["security"] == "reality":
+                    continue
+                host_options = {**options, "security": "tls", "host": host.name, "sni": host.name}
+            for address in host.addresses:
+                label = inbound.get("tag") or protocol
+                if multiple:
+                    label += f"-{host.name}"
+                    if host.cdn:
+                        label += "-cdn" if address == host.name else f"-{address}"
+                templates.append({
+                    **host_options,
+                    "protocol": protocol,
+                    "label": label,
+                    "domain": host.name,
+                    "address": address,
+                    "port": host.port or inbound["port"]
+                })
+    return templates
+
+def expand_templates(templates: Iterable[Dict], uuid: str, username: str) -> List[Dict]:
+    """مدل یکسان اتصال‌های کاربر که همه فرمت‌ها از آن ساخته می‌شوند"""
+    endpoints = []
+    for template in templates:
+        endpoint = {**template, "uuid": uuid, "remark": f"{username}-{template['label']}"}
+        if template["protocol"] == "trojan":
+            # رمز trojan هر کاربر همان UUID اوست
+            endpoint["password"] = uuid
+        endpoints.append(endpoint)
+    return endpoints
+
+def build_endpoints(uuid: str, username: str, inbounds: Iterable[Dict], addresses: Iterable[str]) -> List[Dict]:
+    """اتصال‌های کاربر روی آدرس‌های مستقیم (بدون CDN)"""
+    hosts = [Host(name=address, addresses=(address,)) for address in addresses]
+    return expand_templates(compile_templates(inbounds, hosts), uuid, username)
+
+def _query(endpoint: Dict) -> str:
+    address = endpoint["address"]
+    params = {"type": endpoint["network"], "security": endpoint["security"]}
+    if endpoint["network"] in HTTP_PATH_NETWORKS:
+        params["path"] = endpoint["path"] or "/"
+        params["host"] = endpoint["host"] or address
+    elif endpoint["network"] == "grpc" and endpoint["service_name"]:
+        params["serviceName"] = endpoint["service_name"]
+    if endpoint["security"] in ("tls", "reality"):
+        params["sni"] = endpoint["sni"] or address
+        if endpoint["fingerprint"]:
+            params["fp"] = endpoint["fingerprint"]
+    if endpoint["security"] == "reality":
+        params["pbk"] = endpoint["public_key"]
+        params["sid"] = endpoint["short_id"]
+    return urlencode({key: value for key, value in params.items() if value}, quote_via=quote)
+
+def _target(endpoint: Dict) -> str:
+    return f"{endpoint['address']}:{endpoint['port']}"
+
+def vless_link(endpoint: Dict) -> str:
+    query = "encryption=none&" + _query(endpoint)
+    if endpoint["flow"] and endpoint["network"] == "tcp":
+        query += f"&flow={quote(endpoint['flow'])}"
+    return f"vless://{endpoint['uuid']}@{_target(endpoint)}?{query}#{quote(endpoint['remark'])}"
+
+def vmess_link(endpoint: Dict) -> str:
+    network = endpoint["network"]
+    payload = {
+        "v": "2",
+        "ps": endpoint["remark"],
+        "add": endpoint["address"],
+        "port": str(endpoint["port"]),
+        "id": endpoint["uuid"],
+        "aid": "0",
+        "scy": "auto",
+        "net": network,
+        "type": "none",
+        "host": endpoint["host"] or (endpoint["address"] if network == "ws" else ""),
+        "path": endpoint["path"] or endpoint["service_name"] or "",
+        "tls": "tls" if endpoint["security"] == "tls" else "",
+        "sni": endpoint["sni"] or ""
+    }
+    encoded = base64.b64encode(json.dumps(payload, separators=(",", ":"), ensure_ascii=False).encode()).decode()
+    return f"vmess://{encoded}"
+
+def trojan_link(endpoint: Dict) -> str:
+    password = quote(endpoint["password"], safe="")
+    return f"trojan://{password}@{_target(endpoint)}?{_query(endpoint)}#{quote(endpoint['remark'])}"
+
+def shadowsocks_link(endpoint: Dict) -> str:
+    user_info = base64.urlsafe_b64encode(f"{endpoint['method']}:{endpoint['password']}".encode()).decode().rstrip("=")
+    return f"ss://{user_info}@{_target(endpoint)}#{quote(endpoint['remark'])}"
+
+_LINK_RENDERERS = {
+    "vless": vless_link,
+    "vmess": vmess_link,
+    "trojan": trojan_link,
+    "shadowsocks": shadowsocks_link,
+}
+
+def render_link(endpoint: Dict) -> str:
+    """لینک اشتراک‌گذاری یک اتصال از مدل یکسان"""
+    return _LINK_RENDERERS[endpoint["protocol"]](endpoint)
+
+def render_links(uuid: str, username: str, inbounds: Iterable[Dict], addresses: Iterable[str]) -> List[str]:
+    """لینک‌های همه اینباندها روی همه آدرس‌ها"""
+    return [render_link(endpoint) for endpoint in build_endpoints(uuid, username, inbounds, addresses)]
@@ -0,0 +1,222 @@
+"""
+فرمت‌های خروجی سابسکریپشن برای کلاینت‌های مختلف
+
+همه فرمت‌ها از مدل یکسان اتصال‌ها (share_links.expand_templates) ساخته می‌شوند:
+- v2rayn: لیست لینک‌ها به صورت base64 (v2rayN، v2rayNG، Hiddify، Streisand و ...)
+- clash: YAML برای Clash/Mihomo/Stash
+- singbox: JSON برای sing-box (SFA/SFI)
+
+انتقال‌هایی که کلاینت یک فرمت پشتیبانی نمی‌کند (مثل xhttp در Clash و sing-box) از آن فرمت
+حذف می‌شوند و یک بار در لاگ ثبت می‌شوند؛ لینک‌های v2rayn همه انتقال‌ها را دارند.
+"""
+import base64
+import json
+import logging
+import threading
+from typing import Dict, List, Optional, Set, Tuple
+
+import yaml
+
+from .share_links import render_link
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_FORMAT = "v2rayn"
+
+# انتقال‌های قابل بیان در هر فرمت (httpupgrade در Clash همان ws با v2ray-http-upgrade است)
+CLASH_NETWORKS = ("tcp", "ws", "grpc", "httpupgrade")
+SINGBOX_NETWORKS = ("tcp", "ws", "grpc", "httpupgrade")
+
+_skipped_lock = threading.Lock()
+_skipped: Set[Tuple[str, str]] = set()
+
+def _supported(fmt: str, networks: Tuple[str, ...], endpoint: Dict) -> bool:
+    """آیا اتصال در این فرمت قابل بیان است؛ حذف هر انتقال فقط یک بار در هر پردازه لاگ می‌شود"""
+    if endpoint["protocol"] == "shadowsocks" or endpoint["network"] in networks:
+        return True
+    with _skipped_lock:
+        first = (fmt, endpoint["network"]) not in _skipped
+        _skipped.add((fmt, endpoint["network"]))
+    if first:
+        logger.warning(
+            f"{fmt} subscriptions do not support the {endpoint['network']} transport; "
+            f"omitting those connections (e.g. {endpoint['label']})"
+        )
+    return False
+
+# نام‌های جایگزین در پارامتر format
+FORMAT_ALIASES = {
+    "v2rayn": "v2rayn",
+    "base64": "v2rayn",
+    "v2ray": "v2rayn",
+    "clash": "clash",
+    "mihomo": "clash",
+    "clash-meta": "clash",
+    "singbox": "singbox",
+    "sing-box": "singbox",
+}
+
+# تشخیص کلاینت از User-Agent (به ترتیب)
+USER_AGENT_FORMATS = (
+    ("sing-box", "singbox"),
+    ("sfa/", "singbox"),
+    ("sfi/", "singbox"),
+    ("sfm/", "singbox"),
+    ("mihomo", "clash"),
+    ("clash", "clash"),
+    ("stash", "clash"),
+)
+
+def negotiate_format(requested: Optional[str], user_agent: Optional[str]) -> str:
+    """
+    فرمت پاسخ از پارامتر format یا در نبود آن از User-Agent
+
+    Raises:
+        ValueError: اگر فرمت درخواست شده پشتیبانی نشود
+    """
+    if requested:
+        fmt = FORMAT_ALIASES.get(requested.lower())
+        if fmt is None:
+            raise ValueError(f"فرمت نامعتبر. باید یکی از این موارد باشد: {', '.join(FORMAT_ALIASES)}")
+        return fmt
+    agent = (user_agent or "").lower()
+    for marker, fmt in USER_AGENT_FORMATS:
+        if marker in agent:
+            return fmt
+    return DEFAULT_FORMAT
+
+# -------------------- v2rayN --------------------
+def render_v2rayn(endpoints: List[Dict]) -> bytes:
+    return base64.b64encode("\n".join(render_link(endpoint) for endpoint in endpoints).encode())
+
+# -------------------- Clash / Mihomo --------------------
+def _clash_proxy(endpoint: Dict) -> Dict:
+    protocol = endpoint["protocol"]
+    proxy = {
+        "name": endpoint["remark"],
+        "type": "ss" if protocol == "shadowsocks" else protocol,
+        "server": endpoint["address"],
+        "port": endpoint["port"],
+        "udp": True
+    }
+    if protocol == "shadowsocks":
+        proxy.update({"cipher": endpoint["method"], "password": endpoint["password"]})
+        return proxy
+    if protocol == "trojan":
+        proxy["password"] = endpoint["password"]
+    else:
+        proxy["uuid"] = endpoint["uuid"]
+    if protocol == "vmess":
+        proxy.update({"alterId": 0, "cipher": "auto"})
+
+    proxy["network"] = endpoint["network"]
+    if endpoint["security"] in ("tls", "reality"):
+        if protocol != "trojan":
+            proxy["tls"] = True
+        proxy["sni" if protocol == "trojan" else "servername"] = endpoint["sni"] or endpoint["address"]
+        if endpoint["fingerprint"]:
+            proxy["client-fingerprint"] = endpoint["fingerprint"]
+    if endpoint["security"] == "reality":
+        proxy["reality-opts"] = {"public-key": endpoint["public_key"], "short-id": endpoint["short_id"] or ""}
+    if protocol == "vless" and endpoint["flow"] and endpoint["network"] == "tcp":
+        proxy["flow"] = endpoint["flow"]
+    if endpoint["network"] in ("ws", "httpupgrade"):
+        proxy["network"] = "ws"
+        proxy["ws-opts"] = {
+            "path": endpoint["path"] or "/",
+            "headers": {"Host": endpoint["host"] or endpoint["address"]}
+        }
+        if endpoint["network"] == "httpupgrade":
+            proxy["ws-opts"]["v2ray-http-upgrade"] = True
+    elif endpoint["network"] == "grpc" and endpoint["service_name"]:
+        proxy["grpc-opts"] = {"grpc-service-name": endpoint["service_name"]}
+    return proxy
+
+def render_clash(endpoints: List[Dict]) -> bytes:
+    proxies = [_clash_proxy(endpoint) for endpoint in endpoints if _supported("clash", CLASH_NETWORKS, endpoint)]
+    names = [proxy["name"] for proxy in proxies]
+    config = {
+        "proxies": proxies,
+        "proxy-groups": [
+            {"name": "Proxy", "type": "select", "proxies": names or ["DIRECT"]}
+        ],
+        "rules": ["MATCH,Proxy"]
+    }
+    return yaml.safe_dump(config, allow_unicode=True, sort_keys=False).encode()
+
+# -------------------- sing-box --------------------
+def _singbox_outbound(endpoint: Dict) -> Dict:
+    protocol = endpoint["protocol"]
+    outbound = {
+        "type": protocol,
+        "tag": endpoint["remark"],
+        "server": endpoint["address"],
+        "server_port": endpoint["port"]
+    }
+    if protocol == "shadowsocks":
+        outbound.update({"method": endpoint["method"], "password": endpoint["password"]})
+        return outbound
+    if protocol == "trojan":
+        outbound["password"] = endpoint["password"]
+    else:
+        outbound["uuid"] = endpoint["uuid"]
+    if protocol == "vmess":
+        outbound.update({"security": "auto", "alter_id": 0})
+    if protocol == "vless" and endpoint["flow"] and endpoint["network"] == "tcp":
+        outbound["flow"] = endpoint["flow"]
+
+    if endpoint["security"] in ("tls", "reality"):
+        tls = {"enabled": True, "server_name": endpoint["sni"] or endpoint["address"]}
+        if endpoint["fingerprint"]:
+            tls["utls"] = {"enabled": True, "fingerprint": endpoint["fingerprint"]}
+        if endpoint["security"] == "reality":
+            tls["reality"] = {
+                "enabled": True,
+                "public_key": endpoint["public_key"],
+                "short_id": endpoint["short_id"] or ""
+            }
+        outbound["tls"] = tls
+    if endpoint["network"] == "ws":
+        outbound["transport"] = {
+            "type": "ws",
+            "path": endpoint["path"] or "/",
+            "headers": {"Host": endpoint["host"] or endpoint["address"]}
+        }
+    elif endpoint["network"] == "httpupgrade":
+        outbound["transport"] = {
+            "type": "httpupgrade",
+            "path": endpoint["path"] or "/",
+            "host": endpoint["host"] or endpoint["address"]
+        }
+    elif endpoint["network"] == "grpc" and endpoint["service_name"]:
+        outbound["transport"] = {"type": "grpc", "service_name": endpoint["service_name"]}
+    return outbound
+
+def render_singbox(endpoints: List[Dict]) -> bytes:
+    outbounds = [
+        _singbox_outbound(endpoint) for endpoint in endpoints
+        if _supported("singbox", SINGBOX_NETWORKS, endpoint)
+    ]
+    tags = [outbound["tag"] for outbound in outbounds]
+    config = {
+        "outbounds": [
+            {"type": "selector", "tag": "proxy", "outbounds": tags or ["direct"]},
+            *outbounds,
+            {"type": "direct", "tag": "direct"}
+        ],
+        "route": {"final": "proxy"}
+    }
+    return json.dumps(config, ensure_ascii=False, indent=2).encode()
+
+# فرمت → (نوع محتوا، تابع رندر)
+FORMATS = {
+    "v2rayn": ("text/plain", render_v2rayn),
+    "clash": ("text/yaml", render_clash),
+    "singbox": ("application/json", render_singbox),
+}
+
+def render_format(fmt: str, endpoints: List[Dict]) -> bytes:
+    return FORMATS[fmt][1](endpoints)
+
+def media_type(fmt: str) -> str:
+    return FORMATS[fmt][0]
@@ -33,42 +33,60 @@ class XrayManager:
         self.config_path = Path("/etc/xray/config.json")
         self.backup_path = Path("/etc/xray/config.json.bak")
 
+    @staticmethod
+    def _inbound_config(inbound: Inbound) -> Dict[str, Any]:
+        """کانفیگ Xray یک اینباند؛ streamSettings ذخیره شده در settings جدا می‌شود"""
+        inbound_settings = dict(inbound.settings or {})
+        stream = inbound_settings.pop("streamSettings", None)
+        protocol = inbound.protocol or inbound_settings.pop("protocol", None) or "vmess"
+        inbound_settings.pop("protocol", None)
+        config = {
+            "tag": inbound.tag or inbound.name,
+            "port": inbound.port,
+            "protocol": protocol,
+            "settings": inbound_settings
+        }
+        if stream:
+            config["streamSettings"] = stream
+        return config
+
+    def build_config(self) -> Dict[str, Any]:
+        """ساختار کامل کانفیگ Xray از اینباندهای فعال (برای سرور پنل و نودها)"""
+        # ترتیب ثابت تا نسخه کانفیگ (هش محتوا) بین اجراها یکسان بماند
+        active_inbounds = [
+            self._inbound_config(inbound)
+            for inbound in self.db.query(Inbound).filter(Inbound.is_active != False).order_by(Inbound.id)
+        ]
+        return {
+            "log": {
+                "loglevel": xray_settings.log_level
+            },
+            "inbounds": active_inbounds,
+            "outbounds": [
+                {
+                    "protocol": "freedom",
+                    "tag": "direct"
+                }
+            ],
+            "routing": {
+                "domainStrategy": "AsIs",
+                "rules": []
+            }
+        }
+
     def update_xray_config(self) -> bool:
         """به‌روزرسانی پیکربندی Xray"""
         try:
-            # 1. جمع‌آوری تمام اینباندهای فعال
-            active_inbounds = [
-                inbound.to_config_dict() 
-                for inbound in get_inbounds(self.db)
-                if inbound.is_active
-            ]
-
-            # 2. ساخت ساختار کانفیگ نهایی
-            config = {
-                "log": {
-                    "loglevel": xray_settings.log_level
-                },
-                "inbounds": active_inbounds,
-                "outbounds": [
-                    {
-                        "protocol": "freedom",
-                        "tag": "direct"
-                    }
-                ],
-                "routing": {
-                    "domainStrategy": "AsIs",
-                    "rules": []
-                }
-            }
+            config = self.build_config()
 
-            # 3. ایجاد پشتیبان
+            # ایجاد پشتیبان
             self._create_backup()
 
-            # 4. ذخیره فایل کانفیگ
+            # ذخیره فایل کانفیگ
             with open(self.config_path, 'w') as f:
                 json.dump(config, f, indent=4, ensure_ascii=False)
 
-            # 5. ریستارت سرویس (با بررسی وجود ویژگی restart_on_update)
+            # ریستارت سرویس (با بررسی وجود ویژگی restart_on_update)
             if hasattr(xray_settings, 'restart_on_update') and xray_settings.restart_on_update:
                 return self.restart_service()
             
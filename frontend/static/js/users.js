@@ -1,6 +1,7 @@
 document.addEventListener('DOMContentLoaded', function () {
     const userList = document.getElementById('user-list');
     const searchInput = document.getElementById('search');
+    const statusFilter = document.getElementById('status-filter');
     const prevPageButton = document.getElementById('prev-page');
     const nextPageButton = document.getElementById('next-page');
     const header = document.getElementById('header');
@@ -38,8 +39,13 @@ document.addEventListener('DOMContentLoaded', function () {
         }
     };
 
-    let currentPage = 1;
     let usersPerPage = 50;
+    // cursorهای صفحات قبلی برای دکمه «قبلی»؛ آخرین عنصر cursor صفحه فعلی است
+    let cursorStack = [null];
+    let nextCursor = null;
+    let searchTimer = null;
+    let searchController = null;
+    const SEARCH_DEBOUNCE_MS = 250;
     let currentLang = 'fa'; // Default language is Persian
 
     // Function to change language
@@ -73,29 +79,65 @@ document.addEventListener('DOMContentLoaded', function () {
         changeLanguage('fa');
     });
 
-    // Function to fetch users data (existing code)
-    function fetchUsers(page = 1, searchTerm = '') {
-        fetch(`/api/users?page=${page}&limit=${usersPerPage}&search=${searchTerm}`)
+    // Fetch one page of users (cursor pagination, server-side filters)
+    function fetchUsers(cursor = null) {
+        const params = new URLSearchParams({ limit: usersPerPage });
+        if (cursor) params.set('cursor', cursor);
+        if (statusFilter.value) params.set('status', statusFilter.value);
+
+        fetch(`/users/?${params.toString()}`)
             .then(response => response.json())
             .then(data => {
                 renderUsers(data.users);
-                handlePagination(data.totalUsers);
+                nextCursor = data.next_cursor;
+                handlePagination();
             })
             .catch(error => console.error('Error fetching users:', error));
     }
 
+    // Search as you type (debounced; stale responses are aborted)
+    function searchUsers(term) {
+        if (searchController) searchController.abort();
+        searchController = new AbortController();
+
+        fetch(`/users/search?q=${encodeURIComponent(term)}&limit=${usersPerPage}`, { signal: searchController.signal })
+            .then(response => response.json())
+            .then(data => {
+                renderUsers(data.users);
+                prevPageButton.disabled = true;
+                nextPageButton.disabled = true;
+            })
+            .catch(error => {
+                if (error.name !== 'AbortError') console.error('Error searching users:', error);
+            });
+    }
+
+    searchInput.addEventListener('input', function () {
+        clearTimeout(searchTimer);
+        const term = searchInput.value.trim();
+        searchTimer = setTimeout(() => {
+            if (term) {
+                searchUsers(term);
+            } else {
+                if (searchController) searchController.abort();
+                cursorStack = [null];
+                fetchUsers();
+            }
+        }, SEARCH_DEBOUNCE_MS);
+    });
+
     // Function to render users in the table (existing code)
     function renderUsers(users) {
         userList.innerHTML = '';
         users.forEach(user => {
             const row = document.createElement('tr');
             row.innerHTML = `
-                <td>${user.name}</td>
+                <td>${user.username}</td>
                 <td>${user.uuid}</td>
-                <td>${user.online ? (currentLang === 'fa' ? 'آنلاین' : 'Online') : (currentLang === 'fa' ? 'آفلاین' : 'Offline')}</td>
-                <td>${user.usedData} از ${user.totalData} گیگ</td>
-                <td>${user.connections}</td>
-                <td>${user.lastConnection}</td>
+                <td>${user.is_online ? (currentLang === 'fa' ? 'آنلاین' : 'Online') : (currentLang === 'fa' ? 'آفلاین' : 'Offline')}</td>
+                <td>${(user.traffic_used / 1024 ** 3).toFixed(2)} از ${(user.traffic_limit / 1024 ** 3).toFixed(2)} گیگ</td>
+                <td>${user.simultaneous_connections}</td>
+                <td>${user.last_activity || '-'}</td>
                 <td>
                     <button onclick="viewUser(${user.id})">${currentLang === 'fa' ? 'مشاهده' : 'View'}</button>
                     <button onclick="editUser(${user.id})">${currentLang === 'fa' ? 'ویرایش' : 'Edit'}</button>
@@ -106,15 +148,41 @@ document.addEventListener('DOMContentLoaded', function () {
         });
     }
 
-    // Handle pagination (existing code)
-    function handlePagination(totalUsers) {
-        const totalPages = Math.ceil(totalUsers / usersPerPage);
-        prevPageButton.disabled = currentPage === 1;
-        nextPageButton.disabled = currentPage === totalPages;
+    // Handle pagination
+    function handlePagination() {
+        prevPageButton.disabled = cursorStack.length === 1;
+        nextPageButton.disabled = !nextCursor;
     }
 
-    // Fetch users initially
-    fetchUsers(currentPage);
+    nextPageButton.addEventListener('click', function () {
+        if (!nextCursor) return;
+        cursorStack.push(nextCursor);
+        fetchUsers(nextCursor);
+    });
+
+    prevPageButton.addEventListener('click', function () {
+        if (cursorStack.length === 1) return;
+        cursorStack.pop();
+        fetchUsers(cursorStack[cursorStack.length - 1]);
+    });
+
+    statusFilter.addEventListener('change', function () {
+        cursorStack = [null];
+        fetchUsers();
+    });
+
+    // The server streams only the first page and renders its next cursor after the rows
+    if (userList.children.length === 0) {
+        fetchUsers();
+    } else {
+        nextCursor = document.getElementById('pagination').dataset.nextCursor || null;
+        handlePagination();
+    }
 
     // Additional functions (view, edit, delete) as before
 });
+
+// صفحه کاربر (لینک‌ها و QR codeها) سمت سرور رندر می‌شود
+function viewUser(userId) {
+    window.location.href = `/users/${userId}/page`;
+}
@@ -157,6 +157,7 @@ update_panel() {
     
     source $INSTALL_DIR/venv/bin/activate
     pip install -r $INSTALL_DIR/backend/requirements.txt || { echo -e "${RED}خطا در نصب نیازمندی‌ها${NC}"; return 1; }
+    python -m backend.migrations upgrade || { echo -e "${RED}خطا در اجرای migrationهای دیتابیس${NC}"; return 1; }
     deactivate
     
     systemctl restart zhina-panel
@@ -570,6 +571,8 @@ setup_python() {
             python-multipart \
             uvicorn==0.23.2 \
             psycopg2-binary==2.9.7 \
+            asyncpg==0.29.0 \
+            aiosqlite==0.19.0 \
             python-jose==3.3.0 \
             sqlalchemy==2.0.28 \
             python-dotenv==1.0.0 \
@@ -577,6 +580,7 @@ setup_python() {
             cryptography==41.0.7 \
             psutil==5.9.5 \
             httpx==0.25.2 \
+            PyYAML==6.0.1 \
             python-dateutil==2.8.2 \
             pyotp==2.9.0 \
             jq \
@@ -1058,8 +1062,9 @@ Group=$SERVICE_USER
 WorkingDirectory=$BACKEND_DIR
 Environment="PATH=$INSTALL_DIR/venv/bin"
 Environment="PYTHONPATH=$BACKEND_DIR"
+Environment="WEB_CONCURRENCY=4"
 ExecStart=$INSTALL_DIR/venv/bin/uvicorn app:app --host 0.0.0.0 --port 8001 \
-  --workers 4 --log-level info --access-log --no-server-header \
+  --workers \${WEB_CONCURRENCY} --log-level info --access-log --no-server-header \
   --ssl-keyfile "$SSL_KEY" --ssl-certfile "$SSL_CERT"
 
 Restart=always
@@ -1072,6 +1077,10 @@ WantedBy=multi-user.target
 EOF
 
     chmod 644 /etc/systemd/system/zhina-panel.service
+    # اعمال migrationهای دیتابیس (یک بار، پیش از بالا آمدن workerها)
+    (cd "$INSTALL_DIR" && sudo -u "$SERVICE_USER" "$INSTALL_DIR/venv/bin/python" -m backend.migrations upgrade) \
+        || error "خطا در اجرای migrationهای دیتابیس"
+
     systemctl daemon-reload
     systemctl enable --now zhina-panel || error "خطا در راه‌اندازی سرویس پنل"
 
@@ -0,0 +1,56 @@
+"""
+تنظیمات مشترک تست‌ها
+
+متغیرهای محیطی قبل از اولین ایمپورت backend تنظیم می‌شوند تا تست‌ها به دیتابیس و مسیرهای
+/opt/zhina سرور دست نزنند؛ دیتابیس SQLite موقت است و بعد از هر تست خالی می‌شود.
+"""
+import os
+import tempfile
+from pathlib import Path
+
+_TMP = Path(tempfile.mkdtemp(prefix="zhina-tests-"))
+
+os.environ.update({
+    "DATABASE_URL": f"sqlite:///{_TMP / 'test.db'}",
+    "REALITY_PUBLIC_KEY": "A" * 43,
+    "REALITY_PRIVATE_KEY": "B" * 43,
+    "ZHINA_SECRET_KEY": "test-secret-key",
+    "BCRYPT_ROUNDS": "4",
+    "XRAY_CONFIG_PATH": str(_TMP / "xray.json"),
+    "METRICS_HISTORY_PATH": str(_TMP / "metrics.ring"),
+    "SUBSCRIPTION_STORE_PATH": str(_TMP / "subscriptions.store"),
+    "QR_CACHE_DIR": str(_TMP / "qr"),
+    "NODE_HEALTH_LOCK_PATH": str(_TMP / "node-health.lock"),
+    "NODE_HEALTH_STATE_PATH": str(_TMP / "node-health.json"),
+})
+
+import pytest
+
+@pytest.fixture(scope="session")
+def engine():
+    from backend.database import Base, get_engine
+    import backend.models  # noqa: F401  ثبت جداول روی Base
+
+    engine = get_engine()
+    Base.metadata.create_all(engine)
+    return engine
+
+@pytest.fixture
+def db(engine):
+    """session روی دیتابیس تست؛ همه جداول بعد از تست خالی می‌شوند"""
+    from backend.database import Base, SessionLocal
+
+    session = SessionLocal()
+    try:
+        yield session
+    finally:
+        session.close()
+        with engine.begin() as conn:
+            for table in reversed(Base.metadata.sorted_tables):
+                conn.execute(table.delete())
+
+@pytest.fixture
+def auth_headers():
+    from backend.utils import create_access_token
+
+    return {"Authorization": f"Bearer {create_access_token({'sub': 'admin'})}"}
@@ -0,0 +1,40 @@
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from backend.dashboard.dashboard_manager import router as dashboard_router
+from backend.dashboard.metrics_history import router as metrics_history_router
+
+@pytest.fixture
+def client(db):
+    app = FastAPI()
+    app.include_router(dashboard_router)
+    app.include_router(metrics_history_router)
+    return TestClient(app)
+
+@pytest.mark.parametrize("path", [
+    "/api/dashboard/users?detailed=true",
+    "/api/dashboard/server-stats",
+    "/api/dashboard/traffic-stats",
+    "/api/dashboard/user-stats",
+    "/api/dashboard/full-report",
+    "/api/dashboard/history",
+])
+def test_dashboard_routes_require_token(client, path):
+    assert client.get(path).status_code == 401
+
+def test_user_list_with_token(client, db, auth_headers):
+    from backend.models import User
+
+    db.add(User(username="alice", email="alice@example.com", hashed_password="x", uuid="u-alice"))
+    db.commit()
+    response = client.get("/api/dashboard/users?detailed=true", headers=auth_headers)
+    assert response.status_code == 200
+    assert [user["uuid"] for user in response.json()["users"]] == ["u-alice"]
+
+def test_panel_cookie_is_accepted(client, db, auth_headers):
+    client.cookies.set("access_token", auth_headers["Authorization"])
+    assert client.get("/api/dashboard/users").status_code == 200
+
+def test_invalid_token_is_rejected(client):
+    assert client.get("/api/dashboard/users", headers={"Authorization": "Bearer nope"}).status_code == 401
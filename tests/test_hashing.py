@@ -0,0 +1,61 @@
+import asyncio
+import os
+import time
+from concurrent.futures.process import BrokenProcessPool
+
+import pytest
+
+from backend.hashing import PasswordHasher, PasswordHasherBusy
+
+@pytest.fixture
+def hasher():
+    hasher = PasswordHasher(workers=1, max_pending=1)
+    yield hasher
+    hasher.shutdown()
+
+def test_hash_and_verify_round_trip(hasher):
+    async def scenario():
+        hashed = await hasher.hash("Str0ngP@ss")
+        return await hasher.verify("Str0ngP@ss", hashed), await hasher.verify("wrong", hashed)
+
+    assert asyncio.run(scenario()) == (True, False)
+    assert hasher.stats()["completed"] == 3
+    assert hasher.stats()["queue_depth"] == 0
+
+def test_pool_does_not_use_fork(hasher):
+    assert hasher._get_executor()._mp_context.get_start_method() in ("forkserver", "spawn")
+
+def test_cancelled_job_stays_pending_until_it_finishes(hasher):
+    async def scenario():
+        await hasher._run(time.sleep, 0)  # راه‌اندازی pool
+        task = asyncio.ensure_future(hasher._run(time.sleep, 0.5))
+        await asyncio.sleep(0.1)
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+        # کار هنوز در pool اجرا می‌شود و جای صف را نگه داشته است
+        assert hasher.stats()["queue_depth"] == 1
+        with pytest.raises(PasswordHasherBusy):
+            await hasher._run(time.sleep, 0)
+        await asyncio.sleep(0.8)
+        assert hasher.stats()["queue_depth"] == 0
+        await hasher._run(time.sleep, 0)
+
+    asyncio.run(scenario())
+    assert hasher.stats()["rejected"] == 1
+
+def test_broken_pool_is_replaced(hasher):
+    async def scenario():
+        with pytest.raises(BrokenProcessPool):
+            await hasher._run(os._exit, 1)
+        return await hasher.verify("x", await hasher.hash("x"))
+
+    assert asyncio.run(scenario()) is True
+    assert hasher.stats()["pool_restarts"] >= 1
+    assert hasher.stats()["queue_depth"] == 0
+
+def test_hash_many(hasher):
+    hashed = hasher.hash_many(["a", "b", "c"])
+    assert len(hashed) == 3
+    assert asyncio.run(hasher.verify("b", hashed[1])) is True
+    assert hasher.stats()["queue_depth"] == 0
@@ -0,0 +1,72 @@
+import argparse
+import asyncio
+
+import pytest
+
+from fastapi import APIRouter, Depends, FastAPI, Form, Request, Response
+from fastapi.responses import RedirectResponse
+
+from backend.benchmarks import loadtest
+from backend.utils import create_access_token, get_current_user
+
+events = []
+app = FastAPI()
+dashboard = APIRouter(prefix="/api/dashboard", dependencies=[Depends(get_current_user)])
+
+@app.on_event("startup")
+async def startup():
+    events.append("startup")
+
+@app.on_event("shutdown")
+async def shutdown():
+    events.append("shutdown")
+
+@app.post("/login")
+async def login(username: str = Form(...), password: str = Form(...)):
+    if password != loadtest.SEED_PASSWORD:
+        return Response(status_code=200)
+    response = RedirectResponse(url="/dashboard", status_code=303)
+    response.set_cookie(key="access_token", value=f"Bearer {create_access_token({'sub': username})}", httponly=True)
+    return response
+
+@app.get("/sub/{uuid}")
+async def sub(uuid: str, request: Request):
+    # مسیرهای عمومی فقط پس از startup در دسترس‌اند (مانند موتورهای دیتابیس برنامه واقعی)
+    if "startup" not in events:
+        return Response(status_code=500)
+    return Response(content=uuid, headers={"ETag": f'"{uuid}"'})
+
+@dashboard.get("/users")
+async def dashboard_users():
+    return []
+
+@dashboard.get("/full-report")
+async def full_report():
+    return {}
+
+app.include_router(dashboard)
+
+def _args(**overrides):
+    values = dict(
+        base_url=None, app=f"{__name__}:app", users=3, prime=2, endpoints=None, concurrency=2, clients=1,
+        duration=5.0, requests=6, keep_rate_limits=True, username=None, password=loadtest.SEED_PASSWORD
+    )
+    values.update(overrides)
+    return argparse.Namespace(**values)
+
+def test_in_process_run_uses_lifespan_and_authenticates(monkeypatch):
+    monkeypatch.setattr(loadtest, "seeded_uuids", lambda limit: ["u1", "u2", "u3"])
+    events.clear()
+    report = asyncio.run(loadtest.run(_args(endpoints=["subscription", "dashboard_users", "dashboard_report"])))
+
+    assert events == ["startup", "shutdown"]
+    for name in ("subscription", "dashboard_users", "dashboard_report"):
+        assert report["endpoints"][name]["statuses"] == {"200": 6}
+
+def test_failed_login_stops_the_run(monkeypatch):
+    monkeypatch.setattr(loadtest, "seeded_uuids", lambda limit: ["u1"])
+    events.clear()
+    with pytest.raises(SystemExit, match="Login as 'loadtest-0' failed"):
+        asyncio.run(loadtest.run(_args(endpoints=["dashboard_users"], password="wrong")))
+    # shutdown حتی در صورت خطا اجرا می‌شود
+    assert events == ["startup", "shutdown"]
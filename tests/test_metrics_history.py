@@ -0,0 +1,61 @@
+import pytest
+
+from backend.dashboard.metrics_history import MetricsRing, lttb, parse_range
+
+def test_parse_range():
+    assert parse_range("30s") == 30
+    assert parse_range("30m") == 1800
+    assert parse_range("24h") == 86400
+    assert parse_range("7d") == 604800
+    assert parse_range("2w") == 1209600
+    for value in ("", "24", "h", "1.5h", "-1h", "10y"):
+        with pytest.raises(ValueError):
+            parse_range(value)
+
+def test_lttb_keeps_short_series():
+    points = [(i, float(i)) for i in range(10)]
+    assert lttb(points, 10) == points
+    assert lttb(points, 50) == points
+    assert lttb(points, 2) == points
+
+def test_lttb_keeps_endpoints_and_peaks():
+    points = [(i, 0.0) for i in range(1000)]
+    points[500] = (500, 100.0)
+    sampled = lttb(points, 20)
+    assert len(sampled) == 20
+    assert sampled[0] == points[0] and sampled[-1] == points[-1]
+    assert (500, 100.0) in sampled
+    assert [ts for ts, _ in sampled] == sorted(ts for ts, _ in sampled)
+
+def _sample(value):
+    return {"cpu": value, "memory": 0, "disk": 0, "net_sent": 0, "net_recv": 0}
+
+def test_ring_wraparound_keeps_latest(tmp_path):
+    ring = MetricsRing(tmp_path / "metrics.ring", capacity=5)
+    for i in range(12):
+        assert ring.append(1000.0 + i, _sample(i))
+    assert ring.read("cpu", 0) == [(1000.0 + i, float(i)) for i in range(7, 12)]
+    # جستجوی دودویی بعد از چرخش هم از نقطه درست شروع می‌کند
+    assert ring.read("cpu", 1009.5) == [(1010.0, 10.0), (1011.0, 11.0)]
+    ring.close()
+
+def test_ring_persists_and_keeps_existing_capacity(tmp_path):
+    path = tmp_path / "metrics.ring"
+    ring = MetricsRing(path, capacity=4)
+    for i in range(3):
+        ring.append(100.0 + i, _sample(i))
+    ring.close()
+
+    reopened = MetricsRing(path, capacity=10)
+    assert [value for _, value in reopened.read("cpu", 0)] == [0.0, 1.0, 2.0]
+    assert reopened.capacity == 4
+    reopened.close()
+
+def test_ring_min_gap_and_counter_rate(tmp_path):
+    ring = MetricsRing(tmp_path / "metrics.ring", capacity=10)
+    assert ring.append(100.0, {"net_sent": 0})
+    assert not ring.append(100.5, {"net_sent": 50}, min_gap=1.0)
+    assert ring.append(110.0, {"net_sent": 1000}, min_gap=1.0)
+    assert ring.append(120.0, {"net_sent": 10})  # ریست شمارنده نادیده گرفته می‌شود
+    assert ring.read("net_sent", 0) == [(110.0, 100.0)]
+    ring.close()
@@ -0,0 +1,93 @@
+import sys
+from types import SimpleNamespace
+
+import pytest
+from sqlalchemy import create_engine, event, inspect, text
+
+from backend import migrations
+from backend.migrations import (
+    SchemaVersionError,
+    check_schema_version,
+    current_version,
+    latest_version,
+    load_migrations,
+    upgrade,
+)
+
+@pytest.fixture
+def engine(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'migrations.db'}")
+    yield engine
+    engine.dispose()
+
+def test_versions_are_sorted_and_contiguous():
+    versions = [module.VERSION for module in load_migrations()]
+    assert versions == list(range(1, len(versions) + 1))
+    assert latest_version() == versions[-1]
+
+def test_gap_in_versions_is_rejected(tmp_path, monkeypatch):
+    package = tmp_path / "fake_versions"
+    package.mkdir()
+    for name, version in (("v0001_first", 1), ("v0003_third", 3)):
+        (package / f"{name}.py").write_text(f"VERSION = {version}\nDESCRIPTION = '{name}'\ndef upgrade(conn): pass\n")
+    from backend.migrations import versions
+    monkeypatch.setattr(versions, "__path__", [str(package)])
+    try:
+        with pytest.raises(RuntimeError, match="contiguous"):
+            load_migrations()
+    finally:
+        for name in ("v0001_first", "v0003_third"):
+            sys.modules.pop(f"{versions.__name__}.{name}", None)
+
+def test_upgrade_fresh_database_in_order(engine):
+    applied = upgrade(engine)
+    assert applied == list(range(1, latest_version() + 1))
+    with engine.connect() as conn:
+        assert current_version(conn) == latest_version()
+        rows = conn.execute(text("SELECT version FROM schema_version ORDER BY applied_at, version")).scalars().all()
+    assert rows == applied
+    assert {"users", "domains", "nodes"} <= set(inspect(engine).get_table_names())
+    assert any(column["name"] == "config" for column in inspect(engine).get_columns("domains"))
+    assert check_schema_version(engine) == latest_version()
+    # اجرای دوباره کاری انجام نمی‌دهد
+    assert upgrade(engine) == []
+
+def test_partial_upgrade_fails_boot_check(engine):
+    assert upgrade(engine, target=2) == [1, 2]
+    with pytest.raises(SchemaVersionError):
+        check_schema_version(engine)
+    assert upgrade(engine) == list(range(3, latest_version() + 1))
+
+def test_sqlite_skips_advisory_lock(engine):
+    statements = []
+    event.listen(engine, "before_cursor_execute", lambda conn, cursor, sql, *args: statements.append(sql))
+    upgrade(engine)
+    assert statements and not any("pg_advisory" in sql for sql in statements)
+
+def _fake_migration(version, action):
+    return SimpleNamespace(VERSION=version, DESCRIPTION=f"fake {version}", upgrade=action)
+
+def test_advisory_lock_released_when_migration_fails(engine, monkeypatch):
+    calls = []
+
+    @event.listens_for(engine, "connect")
+    def register(dbapi_connection, _):
+        dbapi_connection.create_function("pg_advisory_lock", 1, lambda key: calls.append(("lock", key)))
+        dbapi_connection.create_function("pg_advisory_unlock", 1, lambda key: calls.append(("unlock", key)))
+
+    def broken(conn):
+        raise RuntimeError("boom")
+
+    monkeypatch.setattr(engine.dialect, "name", "postgresql")
+    monkeypatch.setattr(migrations, "load_migrations", lambda: [
+        _fake_migration(1, lambda conn: conn.execute(text("CREATE TABLE first (id INTEGER)"))),
+        _fake_migration(2, broken),
+    ])
+    with pytest.raises(RuntimeError, match="boom"):
+        upgrade(engine)
+
+    key = migrations.ADVISORY_LOCK_KEY
+    assert calls == [("lock", key), ("unlock", key)]
+    with engine.connect() as conn:
+        # نسخه ۱ در تراکنش خودش ثبت شده و نسخه ناموفق ۲ ثبت نشده است
+        assert current_version(conn) == 1
@@ -0,0 +1,145 @@
+import asyncio
+
+import httpx
+import pytest
+
+from backend.models import Node
+from backend.nodes import health as health_module
+from backend.nodes.health import HealthTarget, LeaderLock, NodeHealthProber, ProbeResult
+
+def _prober(**kwargs):
+    options = dict(interval=10, timeout=1, failure_threshold=3, max_backoff=100, concurrency=4, history=5)
+    options.update(kwargs)
+    return NodeHealthProber(**options)
+
+def _target(node_id=1, active=True, health_disabled=False, host="127.0.0.1"):
+    return HealthTarget(id=node_id, name=f"n{node_id}", host=host, port=443, active=active, health_disabled=health_disabled)
+
+def _ok(now=0.0):
+    return ProbeResult(ok=True, checked_at=now, tcp_ms=1.0)
+
+def _failed(now=0.0):
+    return ProbeResult(ok=False, checked_at=now, error="tcp: refused")
+
+@pytest.fixture
+def prober():
+    prober = _prober()
+    prober._nodes[1] = health_module.NodeHealth(name="n1", active=True)
+    return prober
+
+def test_failures_disable_at_threshold_with_backoff(prober):
+    target = _target()
+    delays, changes = [], []
+    for _ in range(7):
+        changes.append(prober._record(target, _failed(), now=1000))
+        delays.append(prober._nodes[1].next_probe - 1000)
+    assert changes == [None, None, False, None, None, None, None]
+    # تا آستانه فاصله عادی، سپس دو برابر شدن تا سقف max_backoff
+    assert delays == [10, 10, 20, 40, 80, 100, 100]
+    assert prober._nodes[1].health_disabled
+
+    assert prober._record(target, _ok(), now=2000) is True
+    health = prober._nodes[1]
+    assert health.active and not health.health_disabled
+    assert health.failures == 0 and health.next_probe == 2010
+    assert prober._record(target, _ok(), now=2010) is None
+
+def test_success_resets_failures_below_threshold(prober):
+    target = _target()
+    prober._record(target, _failed(), now=0)
+    prober._record(target, _failed(), now=10)
+    assert prober._record(target, _ok(), now=20) is None
+    assert prober._nodes[1].failures == 0
+    assert prober._record(target, _failed(), now=30) is None
+
+def test_admin_disabled_node_is_never_enabled(prober):
+    prober._nodes[1] = health_module.NodeHealth(name="n1", active=False)
+    target = _target(active=False)
+    assert prober._record(target, _ok(), now=0) is None
+    for _ in range(5):
+        assert prober._record(target, _failed(), now=0) is None
+    assert prober._record(target, _ok(), now=0) is None
+    assert not prober._nodes[1].active
+
+def test_history_is_bounded(prober):
+    for i in range(8):
+        prober._record(_target(), _ok(now=i) if i % 2 else _failed(now=i), now=i)
+    assert [checked_at for checked_at, _ in prober._nodes[1].history] == [3, 4, 5, 6, 7]
+
+def _fake_network(monkeypatch, prober, down=()):
+    async def connect(host, port, context=None):
+        if host in down:
+            raise ConnectionRefusedError("refused")
+
+    def handler(request):
+        assert request.headers[health_module.TOKEN_HEADER] == "node-token"
+        return httpx.Response(200, json={"status": "ok", "version": "v1"})
+
+    monkeypatch.setattr(prober, "_connect", connect)
+    monkeypatch.setattr(health_module.settings, "NODE_AGENT_TOKEN", "node-token")
+    monkeypatch.setattr(health_module.settings, "NODE_AGENT_SCHEME", "http")
+    prober.transport = httpx.MockTransport(handler)
+
+def test_run_once_probes_due_nodes(monkeypatch):
+    prober = _prober(failure_threshold=1)
+    _fake_network(monkeypatch, prober, down={"127.0.0.2"})
+    targets = [
+        _target(1),
+        _target(2, host="127.0.0.2"),
+        _target(3, active=False),  # غیرفعال توسط ادمین
+        _target(4, active=False, health_disabled=True)
+    ]
+
+    changes = asyncio.run(prober.run_once(targets, now=0))
+    assert changes == {2: False, 4: True}
+    snapshot = {node["id"]: node for node in prober.snapshot()["nodes"]}
+    assert snapshot[1]["last"]["version"] == "v1" and snapshot[1]["last"]["agent_ms"] is not None
+    assert snapshot[2]["last"]["error"] == "tcp: refused" and snapshot[2]["health_disabled"]
+    assert not snapshot[3]["active"] and snapshot[3]["last"]["ok"]
+
+    # تغییرات در دیتابیس ثبت شده‌اند؛ نود خراب با backoff دیرتر بررسی می‌شود
+    targets[1] = _target(2, active=False, health_disabled=True, host="127.0.0.2")
+    targets[3] = _target(4)
+    assert asyncio.run(prober.run_once(targets, now=10)) == {}
+    assert prober._nodes[2].failures == 1 and prober._nodes[2].next_probe == 20
+    # نود سالم در نوبت عادی دوباره بررسی شده است
+    assert prober._nodes[1].next_probe == 20
+
+def test_run_once_follows_admin_changes(monkeypatch):
+    prober = _prober(failure_threshold=1)
+    _fake_network(monkeypatch, prober, down={"127.0.0.1"})
+    assert asyncio.run(prober.run_once([_target(1)], now=0)) == {1: False}
+
+    # ادمین نود را دستی غیرفعال کرده است: بعد از برگشت نود هم غیرفعال می‌ماند
+    _fake_network(monkeypatch, prober)
+    assert asyncio.run(prober.run_once([_target(1, active=False)], now=100)) == {}
+    assert not prober._nodes[1].active
+
+def test_apply_changes_respects_admin_intent(db):
+    db.add_all([
+        Node(id=1, name="up", ip_address="10.0.0.1", port=443, protocol="vless", is_active=True),
+        Node(id=2, name="admin-off", ip_address="10.0.0.2", port=443, protocol="vless", is_active=False),
+        Node(id=3, name="probe-off", ip_address="10.0.0.3", port=443, protocol="vless",
+             is_active=False, health_disabled=True),
+    ])
+    db.commit()
+    targets = {target.id: target for target in health_module._load_targets()}
+    assert not targets[2].health_disabled and targets[3].health_disabled
+
+    health_module._apply_changes({1: False, 2: True, 3: True})
+    db.expire_all()
+    nodes = {node.id: node for node in db.query(Node)}
+    assert (nodes[1].is_active, nodes[1].health_disabled) == (False, True)
+    assert (nodes[2].is_active, nodes[2].health_disabled) == (False, False)
+    assert (nodes[3].is_active, nodes[3].health_disabled) == (True, False)
+
+def test_leader_lock_is_exclusive(tmp_path):
+    path = tmp_path / "locks" / "node-health.lock"
+    first, second = LeaderLock(path), LeaderLock(path)
+    assert first.acquire()
+    assert first.acquire()
+    assert not second.acquire()
+    first.release()
+    assert second.acquire()
+    assert not first.acquire()
+    second.release()
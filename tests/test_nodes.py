@@ -0,0 +1,131 @@
+import asyncio
+import json
+
+import httpx
+import pytest
+
+from backend.nodes import distributor as distributor_module
+from backend.nodes.agent import apply_diff, config_version, diff_configs, start_local_agent
+from backend.nodes.distributor import NodeDistributor, NodeTarget, cleartext_refused
+
+TOKEN = "node-token"
+
+def _config(*tags, log="warning"):
+    return {
+        "log": {"loglevel": log},
+        "inbounds": [{"tag": tag, "port": 1000 + i, "protocol": "vless"} for i, tag in enumerate(tags)],
+        "outbounds": [{"protocol": "freedom"}]
+    }
+
+@pytest.fixture
+def agent():
+    server, url = start_local_agent(TOKEN)
+    yield server, url
+    server.shutdown()
+    server.server_close()
+
+def _push(distributor, config, targets):
+    return asyncio.run(distributor.push(config, targets))
+
+@pytest.mark.parametrize("old, new", [
+    (_config("a", "b"), _config("a", "b", log="debug")),
+    (_config("a", "b", "c"), _config("c", "a")),
+    (_config("a"), _config("a", "b")),
+    (_config("a", "b"), {"log": {"loglevel": "none"}}),
+    ({}, _config("a")),
+])
+def test_diff_round_trip(old, new):
+    diff = diff_configs(old, new)
+    assert apply_diff(old, diff) == new
+    assert config_version(apply_diff(old, diff)) == config_version(new)
+    # diff از طریق JSON منتقل می‌شود
+    assert apply_diff(old, json.loads(json.dumps(diff))) == new
+
+def test_diff_only_carries_changed_inbounds():
+    old = _config("a", "b", "c")
+    new = dict(old, inbounds=[old["inbounds"][0], old["inbounds"][2]])
+    diff = diff_configs(old, new)
+    assert diff["remove"] == ["inbounds/b"]
+    assert set(diff["set"]) == {"inbounds/#order"}
+
+def test_push_full_diff_and_unchanged(agent):
+    server, url = agent
+    distributor = NodeDistributor(TOKEN, concurrency=2, timeout=5)
+    targets = [NodeTarget(id=1, name="n1", url=url)]
+
+    first = _config("a", "b")
+    [result] = _push(distributor, first, targets)
+    assert result.ok and result.mode == "full" and result.version == config_version(first)
+    assert server.RequestHandlerClass.state.config == first
+
+    second = _config("b", "a", log="debug")
+    [result] = _push(distributor, second, targets)
+    assert result.ok and result.mode == "diff"
+    assert server.RequestHandlerClass.state.config == second
+
+    [result] = _push(distributor, second, targets)
+    assert result.ok and result.mode == "unchanged"
+
+def test_patch_conflict_falls_back_to_full(agent):
+    server, url = agent
+    distributor = NodeDistributor(TOKEN, concurrency=2, timeout=5)
+    targets = [NodeTarget(id=1, name="n1", url=url)]
+    _push(distributor, _config("a"), targets)
+
+    # کانفیگ نود خارج از پنل عوض شده است: PATCH با 409 رد و کانفیگ کامل فرستاده می‌شود
+    other = _config("x")
+    server.RequestHandlerClass.state.apply(other, config_version(other))
+    new = _config("a", "b")
+    [result] = _push(distributor, new, targets)
+    assert result.ok and result.mode == "full"
+    assert server.RequestHandlerClass.state.config == new
+
+    # پنل نسخه نود را نمی‌داند ولی نود همان نسخه را دارد
+    fresh = NodeDistributor(TOKEN, concurrency=2, timeout=5)
+    [result] = _push(fresh, new, targets)
+    assert result.ok and result.mode == "unchanged"
+
+def test_wrong_token_is_an_error(agent):
+    _, url = agent
+    distributor = NodeDistributor("wrong", concurrency=1, timeout=5)
+    [result] = _push(distributor, _config("a"), [NodeTarget(id=1, name="n1", url=url)])
+    assert not result.ok and result.mode == "error"
+    assert result.error == "401: invalid token"
+
+def test_push_concurrency_is_bounded():
+    active = peak = 0
+
+    async def handler(request):
+        nonlocal active, peak
+        active += 1
+        peak = max(peak, active)
+        await asyncio.sleep(0.01)
+        active -= 1
+        if request.method == "GET":
+            return httpx.Response(200, json={"version": "other"})
+        return httpx.Response(200, json={"version": "new", "changed": True})
+
+    distributor = NodeDistributor(TOKEN, concurrency=3, timeout=5, transport=httpx.MockTransport(handler))
+    targets = [NodeTarget(id=i, name=f"n{i}", url=f"http://127.0.0.1:{9000 + i}") for i in range(12)]
+    results = _push(distributor, _config("a"), targets)
+    assert all(result.ok and result.mode == "full" for result in results)
+    assert peak == 3
+
+def test_plain_http_to_remote_node_is_refused(monkeypatch):
+    requests = []
+
+    def handler(request):
+        requests.append(request)
+        return httpx.Response(200, json={"version": None})
+
+    distributor = NodeDistributor(TOKEN, concurrency=1, timeout=5, transport=httpx.MockTransport(handler))
+    remote = [NodeTarget(id=1, name="n1", url="http://203.0.113.5:62050")]
+    [result] = _push(distributor, _config("a"), remote)
+    assert not result.ok and result.error == distributor_module.INSECURE_ERROR
+    assert requests == []
+
+    assert not cleartext_refused("https://203.0.113.5:62050")
+    assert not cleartext_refused("http://[::1]:62050")
+    monkeypatch.setattr(distributor_module.settings, "NODE_AGENT_ALLOW_INSECURE", True)
+    [result] = _push(distributor, _config("a"), remote)
+    assert result.ok and requests
@@ -0,0 +1,84 @@
+import os
+import re
+from pathlib import Path
+
+import pytest
+from fastapi import HTTPException
+from jinja2 import Environment, FileSystemLoader
+
+from backend.config import settings
+from backend.models import Inbound, User
+from backend.qr_cache import QRCache, qr_cache, qr_key
+from backend.users.user_page import get_user_page
+
+def _files(directory):
+    return sorted(path.name for path in Path(directory).glob("*/*"))
+
+def _age(cache, key, suffix, seconds_ago):
+    path = cache._path(key, suffix)
+    stamp = path.stat().st_mtime - seconds_ago
+    os.utime(path, (stamp, stamp))
+
+def test_prune_removes_least_recently_used_files_by_count(tmp_path):
+    cache = QRCache(tmp_path, max_entries=16, disk_max_bytes=10 ** 9, disk_max_files=4)
+    keys = [cache.register(f"https://example.com/{i}") for i in range(6)]
+    for i, key in enumerate(keys):
+        _age(cache, key, "txt", 100 - i)
+    # خواندن از دیسک زمان استفاده را به‌روز می‌کند
+    assert cache.text_for(keys[0]) is not None
+    cache.register("https://example.com/0")
+
+    assert cache.prune() == 2
+    remaining = _files(tmp_path)
+    assert f"{keys[1]}.txt" not in remaining and f"{keys[2]}.txt" not in remaining
+    assert f"{keys[0]}.txt" in remaining and len(remaining) == 4
+    assert cache.stats()["pruned_files"] == 2
+
+def test_prune_by_size_and_register_restores_text(tmp_path):
+    cache = QRCache(tmp_path, max_entries=16, disk_max_bytes=1, disk_max_files=1000)
+    cache.get_or_render("https://example.com/sub")
+    key = qr_key("https://example.com/sub")
+    assert cache.prune() == 2
+    assert _files(tmp_path) == []
+
+    # صفحه دوباره کلید را ثبت می‌کند تا workerهای دیگر هم تصویر را بشناسند
+    assert cache.register("https://example.com/sub") == key
+    other_worker = QRCache(tmp_path, max_entries=16, disk_max_bytes=10 ** 9, disk_max_files=1000)
+    assert other_worker.render(key, "png").startswith(b"\x89PNG")
+
+def test_user_page_template_uses_qr_urls(db, monkeypatch):
+    monkeypatch.setattr(settings, "PANEL_DOMAIN", "panel.example.com")
+    user = User(username="alice", email="alice@example.com", uuid="0f1e2d3c-aaaa", traffic_limit=0, traffic_used=0)
+    db.add(user)
+    db.commit()
+    db.add(Inbound(name="vless", tag=f"user_{user.id}", protocol="vless", port=443, settings={}))
+    db.commit()
+
+    page = get_user_page(db, user.id)
+    template = Environment(
+        loader=FileSystemLoader(Path(__file__).parents[1] / "frontend" / "templates")
+    ).get_template("user_page.html")
+    html = template.render(request=None, page=page)
+
+    urls = re.findall(r'(?:src|srcset)="(/qr/[0-9a-f]{32}\.(?:png|svg))"', html)
+    assert len(urls) == 3  # لینک اشتراک (PNG و SVG) و یک کانفیگ
+    assert "qr-placeholder" not in html
+    assert page["connection_info"]["subscription_link"] in html
+    assert "panel.example.com" in page["connection_info"]["subscription_link"]
+    key, fmt = urls[0][len("/qr/"):].split(".")
+    assert qr_cache.render(key, fmt) is not None
+
+def test_user_page_requires_panel_address(db, monkeypatch):
+    monkeypatch.setattr(settings, "PANEL_DOMAIN", None)
+    monkeypatch.setattr(settings, "SERVER_IP", None)
+    user = User(username="bob", email="bob@example.com", uuid="1a2b3c4d-bbbb", traffic_limit=0, traffic_used=0)
+    db.add(user)
+    db.commit()
+
+    with pytest.raises(HTTPException) as error:
+        get_user_page(db, user.id)
+    assert error.value.status_code == 500 and "PANEL_DOMAIN" in error.value.detail
+    # کاربر ناموجود همچنان 404 است
+    with pytest.raises(HTTPException) as error:
+        get_user_page(db, user.id + 1)
+    assert error.value.status_code == 404
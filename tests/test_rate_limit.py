@@ -0,0 +1,58 @@
+import types
+
+import pytest
+from fastapi import Depends, FastAPI
+from fastapi.testclient import TestClient
+
+from backend import rate_limit
+from backend.rate_limit import TokenBucketLimiter
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(rate_limit, "time", types.SimpleNamespace(monotonic=lambda: now[0]))
+    return now
+
+def test_burst_then_retry_after(clock):
+    limiter = TokenBucketLimiter("test", rate_per_minute=60, burst=3)
+    assert [limiter.acquire("ip") for _ in range(3)] == [None, None, None]
+    assert limiter.acquire("ip") == pytest.approx(1.0)
+    clock[0] += 0.25
+    assert limiter.acquire("ip") == pytest.approx(0.75)
+    # کلیدهای دیگر سطل جداگانه دارند
+    assert limiter.acquire("other") is None
+    assert limiter.stats()["allowed"] == 4 and limiter.stats()["rejected"] == 2
+
+def test_refill_is_capped_at_burst(clock):
+    limiter = TokenBucketLimiter("test", rate_per_minute=30, burst=2)
+    limiter.acquire("ip")
+    limiter.acquire("ip")
+    clock[0] += 2.0  # یک توکن با نرخ ۰.۵ در ثانیه
+    assert limiter.acquire("ip") is None
+    assert limiter.acquire("ip") is not None
+
+    clock[0] += 3600
+    assert [limiter.acquire("ip") for _ in range(3)] == [None, None, pytest.approx(2.0)]
+
+def test_oldest_keys_are_evicted(clock):
+    limiter = TokenBucketLimiter("test", rate_per_minute=1, burst=1, max_keys=2)
+    limiter.acquire("a")
+    limiter.acquire("b")
+    limiter.acquire("c")
+    assert limiter.stats()["keys"] == 2
+    # سطل حذف شده دوباره پر شروع می‌شود
+    assert limiter.acquire("a") is None
+
+def test_dependency_returns_429_with_retry_after(clock):
+    limiter = TokenBucketLimiter("test", rate_per_minute=6, burst=1)
+    app = FastAPI()
+
+    @app.get("/limited", dependencies=[Depends(rate_limit.rate_limit(limiter))])
+    def limited():
+        return {"ok": True}
+
+    client = TestClient(app)
+    assert client.get("/limited").status_code == 200
+    response = client.get("/limited")
+    assert response.status_code == 429
+    assert response.headers["retry-after"] == "10"
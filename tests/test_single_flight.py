@@ -0,0 +1,78 @@
+import asyncio
+
+import pytest
+
+from backend.single_flight import SingleFlight
+
+def test_concurrent_callers_share_one_call():
+    async def scenario():
+        flight = SingleFlight()
+        calls = 0
+        release = asyncio.Event()
+
+        async def load():
+            nonlocal calls
+            calls += 1
+            await release.wait()
+            return "value"
+
+        tasks = [asyncio.create_task(flight.run("key", load)) for _ in range(5)]
+        await asyncio.sleep(0)
+        release.set()
+        results = await asyncio.gather(*tasks)
+        return calls, results, flight.stats()
+
+    calls, results, stats = asyncio.run(scenario())
+    assert calls == 1 and results == ["value"] * 5
+    assert stats == {"in_flight": 0, "leaders": 1, "followers": 4}
+
+def test_error_propagates_to_all_waiters_and_is_not_cached():
+    async def scenario():
+        flight = SingleFlight()
+        release = asyncio.Event()
+
+        async def failing():
+            await release.wait()
+            raise ValueError("boom")
+
+        tasks = [asyncio.create_task(flight.run("key", failing)) for _ in range(3)]
+        await asyncio.sleep(0)
+        release.set()
+        results = await asyncio.gather(*tasks, return_exceptions=True)
+
+        async def ok():
+            return "recovered"
+
+        return results, await flight.run("key", ok)
+
+    results, retried = asyncio.run(scenario())
+    assert all(isinstance(result, ValueError) and str(result) == "boom" for result in results)
+    assert retried == "recovered"
+
+def test_cancelled_leader_hands_over_to_a_waiter():
+    async def scenario():
+        flight = SingleFlight()
+        calls = 0
+        started = asyncio.Event()
+
+        async def load():
+            nonlocal calls
+            calls += 1
+            if calls == 1:
+                started.set()
+                await asyncio.sleep(3600)
+            return calls
+
+        leader = asyncio.create_task(flight.run("key", load))
+        await started.wait()
+        follower = asyncio.create_task(flight.run("key", load))
+        await asyncio.sleep(0)
+        leader.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await leader
+        return await follower, flight.stats()
+
+    result, stats = asyncio.run(scenario())
+    # منتظر لغو نمی‌شود و خودش دوباره اجرا می‌کند
+    assert result == 2
+    assert stats["in_flight"] == 0 and stats["leaders"] == 2
@@ -0,0 +1,54 @@
+import base64
+import json
+import logging
+
+import yaml
+
+from backend.xray_config import subscription_formats
+from backend.xray_config.share_links import build_endpoints
+from backend.xray_config.subscription_formats import render_clash, render_singbox, render_v2rayn
+
+def _endpoints():
+    inbounds = [
+        {"id": 1, "tag": "ws", "protocol": "vless", "port": 443,
+         "settings": {"streamSettings": {"network": "ws", "security": "tls", "wsSettings": {"path": "/ws"}}}},
+        {"id": 2, "tag": "upgrade", "protocol": "vless", "port": 8443,
+         "settings": {"streamSettings": {"network": "httpupgrade", "security": "tls",
+                                         "httpupgradeSettings": {"path": "/up", "host": "cdn.example.com"}}}},
+        {"id": 3, "tag": "xhttp", "protocol": "vless", "port": 2053,
+         "settings": {"streamSettings": {"network": "xhttp", "security": "tls", "xhttpSettings": {"path": "/xh"}}}},
+    ]
+    return build_endpoints("0f1e2d3c-aaaa", "alice", inbounds, ["panel.example.com"])
+
+def test_httpupgrade_is_mapped_in_clash_and_singbox():
+    clash = yaml.safe_load(render_clash(_endpoints()))
+    upgrade = next(proxy for proxy in clash["proxies"] if proxy["name"] == "alice-upgrade")
+    assert upgrade["network"] == "ws"
+    assert upgrade["ws-opts"] == {
+        "path": "/up", "headers": {"Host": "cdn.example.com"}, "v2ray-http-upgrade": True
+    }
+
+    singbox = json.loads(render_singbox(_endpoints()))
+    outbound = next(item for item in singbox["outbounds"] if item["tag"] == "alice-upgrade")
+    assert outbound["transport"] == {"type": "httpupgrade", "path": "/up", "host": "cdn.example.com"}
+
+def test_unsupported_transport_is_omitted_and_logged_once(caplog, monkeypatch):
+    monkeypatch.setattr(subscription_formats, "_skipped", set())
+    with caplog.at_level(logging.WARNING, logger=subscription_formats.__name__):
+        clash = yaml.safe_load(render_clash(_endpoints()))
+        render_clash(_endpoints())
+        singbox = json.loads(render_singbox(_endpoints()))
+
+    assert [proxy["name"] for proxy in clash["proxies"]] == ["alice-ws", "alice-upgrade"]
+    assert clash["proxy-groups"][0]["proxies"] == ["alice-ws", "alice-upgrade"]
+    assert "alice-xhttp" not in [item["tag"] for item in singbox["outbounds"]]
+    assert "alice-xhttp" not in singbox["outbounds"][0]["outbounds"]
+    warnings = [record.getMessage() for record in caplog.records]
+    assert len(warnings) == 2
+    assert all("xhttp" in message for message in warnings)
+
+def test_v2rayn_keeps_all_transports_with_paths():
+    links = base64.b64decode(render_v2rayn(_endpoints())).decode().splitlines()
+    assert len(links) == 3
+    assert "type=httpupgrade" in links[1] and "path=%2Fup" in links[1] and "host=cdn.example.com" in links[1]
+    assert "type=xhttp" in links[2] and "path=%2Fxh" in links[2]
@@ -0,0 +1,193 @@
+import hashlib
+import json
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+import pytest
+
+from backend.users import subscription_bundle
+from backend.users.subscription_store import MAX_LOAD_FACTOR, SubscriptionStore
+from backend.users.user_cache import UserRecord
+
+@pytest.fixture
+def store(tmp_path):
+    store = SubscriptionStore(tmp_path / "subscriptions.bin", slots=64, data_capacity=64 * 1024)
+    yield store
+    store.close()
+
+def _record(uuid="u-1", username="alice"):
+    return UserRecord(
+        id=1, uuid=uuid, username=username, email=None, is_active=True, traffic_limit=0,
+        traffic_used=0, simultaneous_connections=0, expiry_date=None, subscription=None
+    )
+
+def test_index_sized_for_load_factor(tmp_path):
+    store = SubscriptionStore(tmp_path / "s.bin", slots=100, data_capacity=1024)
+    assert store.slots == 256
+    assert store.max_entries == int(256 * MAX_LOAD_FACTOR) >= 100
+
+def test_overwrite_reuses_space(store):
+    store.put("a", b"x" * 100, '"1"', True)
+    assert store.stats()["data_used_bytes"] == 100
+    for size in (80, 100, 1):
+        store.put("a", b"y" * size, '"2"', True)
+        assert store.get("a").body == b"y" * size
+    assert store.stats()["data_used_bytes"] == 100
+    # بزرگ‌تر از ناحیه قبلی: در انتهای ناحیه داده
+    store.put("a", b"z" * 150, '"3"', True)
+    assert store.stats()["data_used_bytes"] == 250
+    assert store.stats()["entries"] == 1
+
+def test_discard_frees_space_on_reuse(store):
+    store.put("a", b"x" * 100, '"1"', True)
+    store.discard("a")
+    store.put("a", b"y" * 60, '"2"', True)
+    assert store.get("a").body == b"y" * 60
+    assert store.stats()["data_used_bytes"] == 100
+
+def test_full_data_area_compacts_instead_of_reset(tmp_path):
+    store = SubscriptionStore(tmp_path / "s.bin", slots=16, data_capacity=1000)
+    for i in range(5):
+        store.put(f"k{i}", bytes([i]) * 200, f'"{i}"', True)
+    store.discard("k1")
+    store.put("k0", b"\xff" * 300, '"0b"', True)
+
+    stats = store.stats()
+    assert stats["compactions"] == 1 and stats["resets"] == 0
+    assert store.get("k0").body == b"\xff" * 300
+    assert store.get("k1") is None
+    for i in range(2, 5):
+        assert store.get(f"k{i}").body == bytes([i]) * 200
+    assert stats["data_used_bytes"] == 900
+    store.close()
+
+def test_full_index_drops_discarded_then_resets(tmp_path):
+    store = SubscriptionStore(tmp_path / "s.bin", slots=8, data_capacity=4096)
+    limit = store.max_entries
+    for i in range(limit):
+        store.put(f"k{i}", b"body", '"1"', True)
+    for i in range(3):
+        store.discard(f"k{i}")
+    assert store.stats()["entries"] == limit
+
+    store.put("new", b"body", '"1"', True)
+    stats = store.stats()
+    assert stats["resets"] == 0 and stats["entries"] == limit - 2
+    assert all(store.get(f"k{i}") is not None for i in range(3, limit))
+    assert store.get("new") is not None
+
+    # index پر از بسته‌های زنده: فقط reset جا باز می‌کند
+    store.put("extra-1", b"body", '"1"', True)
+    store.put("extra-2", b"body", '"1"', True)
+    assert store.stats()["entries"] <= limit
+    store.put("overflow", b"body", '"1"', True)
+    stats = store.stats()
+    assert stats["resets"] == 1 and stats["entries"] == 1
+    assert store.get("overflow").body == b"body"
+    store.close()
+
+_WRITER = """
+import hashlib, json, random, sys, time
+from backend.users.subscription_store import SubscriptionStore
+
+store = SubscriptionStore(sys.argv[1], slots=16, data_capacity=8192)
+deadline = time.time() + float(sys.argv[2])
+rng = random.Random(1)
+while time.time() < deadline:
+    name = f"k{rng.randrange(8)}"
+    body = bytes([rng.randrange(256)]) * rng.randrange(1, 1000)
+    store.put(name, body, hashlib.blake2b(body, digest_size=8).hexdigest(), True)
+    if rng.random() < 0.1:
+        store.discard(name)
+print(json.dumps(store.stats()))
+"""
+
+def test_concurrent_readers_never_see_torn_bundles(tmp_path):
+    path = tmp_path / "s.bin"
+    reader = SubscriptionStore(path, slots=16, data_capacity=8192)
+    reader.put("k0", b"seed", hashlib.blake2b(b"seed", digest_size=8).hexdigest(), True)
+    writer = subprocess.Popen(
+        [sys.executable, "-c", _WRITER, str(path), "2"],
+        cwd=Path(__file__).resolve().parents[1],
+        stdout=subprocess.PIPE
+    )
+    seen = 0
+    try:
+        while writer.poll() is None:
+            for i in range(8):
+                stored = reader.get(f"k{i}")
+                if stored is not None:
+                    assert stored.etag == hashlib.blake2b(stored.body, digest_size=8).hexdigest()
+                    seen += 1
+    finally:
+        output, _ = writer.communicate(timeout=30)
+    assert writer.returncode == 0
+    stats = json.loads(output)
+    # نوشتن‌ها هم درجا، هم در انتها و هم با compaction انجام شده‌اند
+    assert seen > 0 and stats["compactions"] > 0 and stats["resets"] == 0
+    reader.close()
+
+def test_put_rejected_after_clear(store):
+    epoch = store.epoch()
+    assert store.put("a", b"old", '"1"', True, epoch=epoch)
+
+    # worker دیگری اینباندها را تغییر داده است
+    store.clear()
+    assert store.epoch() == epoch + 1
+    assert not store.put("a", b"stale", '"1"', True, epoch=epoch)
+    assert store.get("a") is None
+    assert store.stats()["stale_writes"] == 1
+
+    assert store.put("a", b"fresh", '"2"', True, epoch=store.epoch())
+    assert store.get("a").body == b"fresh"
+
+def test_put_rejects_older_inputs_than_stored(store):
+    started = time.time()
+    assert store.put("a", b"new", '"2"', True, loaded_at=started)
+    assert not store.put("a", b"old", '"1"', True, loaded_at=started - 5)
+    assert store.get("a").body == b"new"
+    # ورودی‌های هم‌زمان (مثلاً فرمت رندر شده از همان مدل) پذیرفته می‌شوند
+    assert store.put("a", b"same", '"2"', True, loaded_at=started)
+
+def test_discard_blocks_older_writes(store):
+    store.put("a", b"body", '"1"', True, loaded_at=time.time() - 10)
+    store.discard("a")
+    assert store.get("a") is None
+    assert not store.put("a", b"body", '"1"', True, loaded_at=time.time() - 5)
+    assert store.put("a", b"body", '"2"', True)
+
+def test_header_survives_reopen(tmp_path):
+    path = tmp_path / "subscriptions.bin"
+    first = SubscriptionStore(path, slots=8, data_capacity=4096)
+    first.clear()
+    first.put("a", b"body", '"1"', True)
+    first.close()
+    second = SubscriptionStore(path, slots=64, data_capacity=1024)
+    assert second.epoch() == 1
+    assert second.slots == first.slots and second.get("a").body == b"body"
+    second.close()
+
+def test_stale_inbound_snapshot_is_not_written(store, monkeypatch):
+    monkeypatch.setattr(subscription_bundle, "subscription_store", store)
+    snapshot = subscription_bundle._InboundSnapshot(ttl=60)
+    inbounds = [{"id": 1, "tag": "a", "protocol": "vless", "port": 443, "settings": {}}]
+
+    epoch, loaded_at = store.epoch(), time.time()
+    version = snapshot.store(inbounds, epoch)[1]
+    store.clear()
+    # snapshot این worker با epoch جدید دیگر استفاده نمی‌شود
+    assert snapshot.current(store.epoch()) is None
+    assert snapshot.current(epoch) == (inbounds, version)
+
+    model = subscription_bundle.build_model(_record(), inbounds, version, [], epoch, loaded_at)
+    assert model.epoch == epoch
+    assert store.get("u-1:model") is None and store.get("u-1:info") is None
+    subscription_bundle._store_format("u-1", "v2rayn", model)
+    assert store.get("u-1:v2rayn") is None
+
+    fresh = subscription_bundle.build_model(_record(), inbounds, version, [], store.epoch(), time.time())
+    subscription_bundle._store_format("u-1", "v2rayn", fresh)
+    assert store.get("u-1:model").etag == fresh.etag
+    assert store.get("u-1:v2rayn") is not None
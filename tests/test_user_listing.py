@@ -0,0 +1,140 @@
+from datetime import datetime, timedelta
+
+import pytest
+from sqlalchemy import insert
+
+from backend.models import User
+from backend.users.user_listing import decode_cursor, encode_cursor, paginate_users
+
+def _add_users(db, count, **overrides):
+    base = datetime(2024, 1, 1)
+    for i in range(count):
+        db.add(User(
+            username=f"user{i:03d}",
+            email=f"user{i:03d}@example.com",
+            hashed_password="x",
+            uuid=f"uuid-{i:03d}",
+            created_at=base + timedelta(minutes=i // 2),  # هر دو کاربر زمان ایجاد یکسان دارند
+            **overrides
+        ))
+    db.commit()
+
+def _walk(db, limit, **kwargs):
+    pages, cursor = [], None
+    while True:
+        users, cursor = paginate_users(db, limit, cursor, **kwargs)
+        pages.append([user.id for user in users])
+        if cursor is None:
+            return pages
+
+def test_cursor_round_trip():
+    stamp = datetime(2024, 5, 6, 7, 8, 9, 123456)
+    assert decode_cursor(encode_cursor("created_at", stamp, 42), "created_at") == (stamp, 42)
+    assert decode_cursor(encode_cursor("created_at", None, 7), "created_at") == (None, 7)
+    assert decode_cursor(encode_cursor("username", "ali", 3), "username") == ("ali", 3)
+
+@pytest.mark.parametrize("cursor", ["not-base64!", encode_cursor("id", 1, 1)])
+def test_invalid_or_foreign_cursor(cursor):
+    with pytest.raises(ValueError):
+        decode_cursor(cursor, "created_at")
+
+@pytest.mark.parametrize("sort", ["id", "username", "created_at"])
+@pytest.mark.parametrize("order", ["asc", "desc"])
+def test_pages_cover_every_row_once(db, sort, order):
+    _add_users(db, 23)
+    pages = _walk(db, 5, sort=sort, order=order)
+    ids = [user_id for page in pages for user_id in page]
+    assert len(ids) == 23 and len(set(ids)) == 23
+    assert [len(page) for page in pages] == [5, 5, 5, 5, 3]
+
+@pytest.mark.parametrize("order", ["asc", "desc"])
+def test_null_created_at_is_neither_skipped_nor_repeated(db, engine, order):
+    _add_users(db, 7)
+    # ردیف‌های درج شده با Core بدون server default
+    with engine.begin() as conn:
+        conn.execute(insert(User), [
+            {"username": f"legacy{i}", "email": f"legacy{i}@example.com", "uuid": f"legacy-{i}", "created_at": None}
+            for i in range(6)
+        ])
+    assert db.query(User).filter(User.created_at.is_(None)).count() == 6
+
+    pages = _walk(db, 4, sort="created_at", order=order)
+    ids = [user_id for page in pages for user_id in page]
+    assert sorted(ids) == sorted(user.id for user in db.query(User))
+    assert len(ids) == len(set(ids))
+
+    nulls = [user.id for user in db.query(User).filter(User.created_at.is_(None)).order_by(User.id)]
+    if order == "asc":
+        assert ids[-6:] == nulls
+    else:
+        assert ids[:6] == list(reversed(nulls))
+
+def test_status_filters(db):
+    now = datetime.utcnow()
+    db.add_all([
+        User(username="active", email="a@example.com", uuid="a", is_active=True),
+        User(username="inactive", email="i@example.com", uuid="i", is_active=False),
+        User(username="expired", email="e@example.com", uuid="e", is_active=False, expiry_date=now - timedelta(days=1)),
+        User(username="online", email="o@example.com", uuid="o", is_active=False, is_online=True),
+        User(username="quota", email="q@example.com", uuid="q", is_active=False, traffic_limit=10, traffic_used=10),
+        User(username="unlimited", email="u@example.com", uuid="u", is_active=False, traffic_limit=0, traffic_used=99),
+    ])
+    db.commit()
+
+    def names(status):
+        users, _ = paginate_users(db, 50, status=status)
+        return {user.username for user in users}
+
+    assert names("active") == {"active"}
+    assert names("expired") == {"expired"}
+    assert names("online") == {"online"}
+    assert names("over_quota") == {"quota"}
+    with pytest.raises(ValueError):
+        names("deleted")
+
+def test_filtered_pages_keep_filter(db):
+    _add_users(db, 10, is_active=True)
+    db.add_all([
+        User(username=f"off{i}", email=f"off{i}@example.com", uuid=f"off-{i}", is_active=False)
+        for i in range(5)
+    ])
+    db.commit()
+    pages = _walk(db, 3, status="active", sort="created_at")
+    assert sum(len(page) for page in pages) == 10
+
+def test_page_stream_stops_at_limit_and_exposes_cursor(db):
+    from pathlib import Path
+    from jinja2 import Environment, FileSystemLoader
+    from backend.users.user_listing import PageStream, build_user_page_query
+
+    _add_users(db, 7)
+    page = PageStream(db.execute(build_user_page_query(5)).scalars(), 5)
+    template = Environment(loader=FileSystemLoader(Path(__file__).parents[1] / "frontend" / "templates")).get_template("users.html")
+    html = "".join(template.generate(request=None, users=page))
+
+    assert html.count("<tr>") == 1 + 5  # سرستون و ردیف‌های صفحه اول
+    assert f'data-next-cursor="{page.next_cursor}"' in html
+    rest, cursor = paginate_users(db, 5, page.next_cursor)
+    assert [user.username for user in rest] == ["user005", "user006"] and cursor is None
+
+def test_page_stream_last_page_has_no_cursor(db):
+    from backend.users.user_listing import PageStream, build_user_page_query
+
+    _add_users(db, 3)
+    page = PageStream(db.execute(build_user_page_query(5)).scalars(), 5)
+    assert len(list(page)) == 3 and page.next_cursor is None
+
+def test_async_pagination_on_sqlite(db):
+    import asyncio
+    from backend.database import AsyncSessionLocal
+    from backend.users.user_listing import paginate_users_async
+
+    _add_users(db, 4)
+
+    async def first_page():
+        async with AsyncSessionLocal() as session:
+            return await paginate_users_async(session, 3)
+
+    users, cursor = asyncio.run(first_page())
+    assert [user.username for user in users] == ["user000", "user001", "user002"]
+    assert cursor is not None
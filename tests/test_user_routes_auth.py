@@ -0,0 +1,55 @@
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+# backend.routers همه روترها (از جمله xray) را ایمپورت می‌کند
+user_routes = pytest.importorskip("backend.routers.user_routes")
+
+@pytest.fixture
+def client(db):
+    app = FastAPI()
+    app.include_router(user_routes.router)
+    return TestClient(app)
+
+@pytest.fixture
+def alice(db):
+    from backend.models import User
+
+    user = User(username="alice", email="alice@example.com", hashed_password="x", uuid="u-alice")
+    db.add(user)
+    db.commit()
+    return user
+
+@pytest.mark.parametrize("method, path", [
+    ("get", "/users/"),
+    ("get", "/users/?limit=10&sort=username"),
+    ("get", "/users/1"),
+    ("put", "/users/1"),
+    ("delete", "/users/1"),
+    ("post", "/users/"),
+])
+def test_user_routes_require_token(client, alice, method, path):
+    assert client.request(method, path).status_code == 401
+
+def test_user_list_with_token(client, alice, auth_headers):
+    response = client.get("/users/", headers=auth_headers)
+    assert response.status_code == 200
+    assert [user["uuid"] for user in response.json()["users"]] == ["u-alice"]
+
+def test_user_list_accepts_panel_cookie(client, alice, auth_headers):
+    client.cookies.set("access_token", auth_headers["Authorization"])
+    assert client.get("/users/").status_code == 200
+
+def test_search_requires_token(client, alice, auth_headers):
+    # UUID کاربران با هر زیررشته کوتاهی پیدا می‌شود
+    assert client.get("/users/search?q=a").status_code == 401
+    response = client.get("/users/search?q=a", headers=auth_headers)
+    assert response.status_code == 200
+    assert [user["uuid"] for user in response.json()["users"]] == ["u-alice"]
+
+def test_bulk_create_requires_token(client, db):
+    from backend.models import User
+
+    payload = {"users": [{"username": "bob", "email": "bob@example.com", "password": "secret123"}]}
+    assert client.post("/users/bulk", json=payload).status_code == 401
+    assert db.query(User).count() == 0
@@ -0,0 +1,61 @@
+import pytest
+
+from backend.models import User
+from backend.users.user_search import TrigramIndex, _trigrams, search_users
+
+@pytest.fixture
+def users(db):
+    db.add_all([
+        User(username="alice", email="alice@example.com", uuid="0f1e2d3c-aaaa"),
+        User(username="alicia", email="al@mail.org", uuid="9a8b7c6d-bbbb"),
+        User(username="malik", email="malik@example.com", uuid="5e5e5e5e-cccc"),
+        User(username="bob", email="bob@lipsum.net", uuid="1234abcd-dddd"),
+    ])
+    db.commit()
+    return {user.username: user.id for user in db.query(User)}
+
+def _names(db, query, limit=20):
+    return [user.username for user, _ in search_users(db, query, limit)]
+
+def test_exact_then_prefix_then_substring(db, users):
+    results = search_users(db, "alice")
+    assert [user.username for user, _ in results][0] == "alice"
+    assert results[0][1] == 3.0
+
+    ranked = search_users(db, "ali")
+    names = [user.username for user, _ in ranked]
+    assert names[:2] == ["alice", "alicia"]
+    assert [score for _, score in ranked[:2]] == [2.0, 2.0]
+    assert "malik" in names and ranked[names.index("malik")][1] < 1.0
+
+def test_uuid_prefix_and_case(db, users):
+    assert _names(db, "9A8B") == ["alicia"]
+    assert _names(db, "ALICE")[0] == "alice"
+
+@pytest.mark.parametrize("query, expected", [
+    ("li", {"alice", "alicia", "malik", "bob"}),  # bob از طریق ایمیل lipsum
+    ("ik", {"malik"}),
+    ("c", {"alice", "alicia", "malik"}),  # malik از طریق example.com
+    ("mail", {"alicia"}),
+])
+def test_short_and_middle_substrings_match_like_ilike(db, users, query, expected):
+    assert set(_names(db, query)) == expected
+
+def test_limit_and_empty_query(db, users):
+    assert len(search_users(db, "li", limit=2)) == 2
+    assert search_users(db, "   ") == []
+
+def test_index_refreshes_after_insert(db, users):
+    assert _names(db, "zed") == []
+    db.add(User(username="zed", email="z@example.com", uuid="ffff"))
+    db.commit()
+    assert _names(db, "zed") == ["zed"]
+
+def test_trigram_similarity_for_typos():
+    index = TrigramIndex()
+    index._fields = {1: ("jonathan", "", "")}
+    index._grams = {1: _trigrams("jonathan")}
+    index._postings = {gram: {1} for gram in index._grams[1]}
+    index._sorted_keys = [("jonathan", 1)]
+    assert [user_id for user_id, _ in index.search("jonathon", 5)] == [1]
+    assert index.search("xyzxyz", 5) == []